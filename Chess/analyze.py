@@ -0,0 +1,202 @@
+"""
+This module analyzes a file of positions with all
+the processor cores. The file has one position in
+FEN on each line; blank lines, lines starting with #
+and anything after a ; are left out. For every
+position it finds the number of legal moves, whether
+the side to move is in check, checkmated or
+stalemated, and the score and best move from a
+search by the Engine in search.py. The results are
+written as JSON, one line per position with the line
+number of its FEN, so they can be read back one at a
+time. The positions are read a chunk at a time and
+each chunk is analyzed by one worker process, with
+only a few chunks waiting at once, so a file of
+millions of positions is never held in memory. The
+results can be written in the order of the file, or
+as soon as each chunk is done. With --checkpoint the
+first line of every finished chunk is added to a
+file once its results are written, so a run that is
+stopped can be started again with the same command
+and carries on where it left off. Run it with
+
+    python3 analyze.py positions.fen --output results.jsonl
+    python3 analyze.py positions.fen --output results.jsonl --checkpoint results.done --depth 4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from rules import ChessBoard, opposite_color
+from bitboard import BitboardChessBoard
+from search import Engine
+from perft import move_name
+
+# The Engine and board of a worker process, made when the process starts.
+worker_engine = None
+worker_board = None
+
+def start_worker(hash_mb, board_class):
+    global worker_engine, worker_board
+    worker_engine = Engine(hash_mb)
+    worker_board = board_class()
+
+"""
+This function returns the analysis of one position as a
+dictionary. The search stops at depth or after time_limit
+seconds, whichever comes first; either may be None. A FEN
+that cannot be read, or that gives a position no game could
+reach, gives a dictionary with an error.
+"""
+def analyze_position(board, engine, fen, depth, time_limit):
+    try:
+        board.load_fen(fen)
+    except (ValueError, IndexError, KeyError):
+        return {"fen": fen, "error": "cannot read FEN"}
+    if not board.is_legal_position():
+        return {"fen": fen, "error": "illegal position"}
+    moves = list(board.generate_legal_moves(board.turn))
+    king = board.find_king(board.turn)
+    in_check = king is not None and board.is_square_attacked(king[0], king[1], opposite_color(board.turn))
+    if not moves:
+        status = "checkmate" if in_check else "stalemate"
+    else:
+        status = "check" if in_check else "ongoing"
+    record = {"fen": fen, "legal_moves": len(moves), "status": status}
+    if moves:
+        result = engine.search(board, time_limit, depth)
+        record.update({"score": result.score, "best_move": move_name(result.move), "depth": result.depth, "nodes": result.nodes})
+    return record
+
+"""
+This function runs in a worker process. It analyzes a chunk,
+a list of (line number, FEN) pairs, and returns the first
+line number of the chunk with the list of its results.
+"""
+def analyze_chunk(chunk, depth, time_limit):
+    records = []
+    for line_number, fen in chunk:
+        record = analyze_position(worker_board, worker_engine, fen, depth, time_limit)
+        record["line"] = line_number
+        records.append(record)
+    return chunk[0][0], records
+
+"""
+This generator reads the positions of a file and gives them
+back in lists of chunk_size (line number, FEN) pairs.
+"""
+def read_chunks(stream, chunk_size):
+    chunk = []
+    for line_number, line in enumerate(stream, 1):
+        fen = line.split(";")[0].strip()
+        if not fen or fen.startswith("#"):
+            continue
+        chunk.append((line_number, fen))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+"""
+This function reads a checkpoint file and returns the set of
+first line numbers of the chunks it lists as finished. Its
+first line is the chunk size of the run that wrote it, and a
+different chunk size would split the file differently, so
+that is an error.
+"""
+def read_checkpoint(path, chunk_size):
+    with open(path) as stream:
+        lines = stream.read().split()
+    if not lines:
+        return set()
+    if int(lines[0]) != chunk_size:
+        raise ValueError("checkpoint %s was written with --chunk-size %s" % (path, lines[0]))
+    return set(int(line) for line in lines[1:])
+
+"""
+This generator analyzes the chunks with a pool of worker
+processes and gives back each chunk's first line number and
+results when it is done. At most two chunks per worker are
+waiting at once. If ordered is True the chunks come back in
+the order they were read, otherwise as soon as they finish.
+Chunks whose first line number is in skip are not analyzed.
+"""
+def analyze_chunks(chunks, workers, depth, time_limit, ordered=True, skip=(), hash_mb=16, board_class=ChessBoard):
+    with ProcessPoolExecutor(workers, initializer=start_worker, initargs=(hash_mb, board_class)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            if chunk[0][0] in skip:
+                continue
+            pending.append(pool.submit(analyze_chunk, chunk, depth, time_limit))
+            while len(pending) >= 2 * workers:
+                for done in finished_futures(pending, ordered):
+                    yield done.result()
+        while pending:
+            for done in finished_futures(pending, ordered):
+                yield done.result()
+
+"""
+This function waits for and takes off the pending deque the
+first future if ordered is True, or every finished future if
+not, and returns them.
+"""
+def finished_futures(pending, ordered):
+    if ordered:
+        return [pending.popleft()]
+    done, not_done = wait(pending, return_when=FIRST_COMPLETED)
+    pending.clear()
+    pending.extend(not_done)
+    return done
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze a file of FEN positions with every processor core.")
+    parser.add_argument("path", help="the file of positions, one FEN per line")
+    parser.add_argument("--output", help="the file to write the JSON results to, instead of the screen")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="how many processes to analyze with")
+    parser.add_argument("--chunk-size", type=int, default=256, help="how many positions each process is given at a time")
+    parser.add_argument("--depth", type=int, default=3, help="how deep to search each position")
+    parser.add_argument("--movetime", type=float, help="the most seconds to search each position")
+    parser.add_argument("--unordered", action="store_true", help="write each chunk as soon as it is done")
+    parser.add_argument("--checkpoint", help="the file that records finished chunks, to resume a stopped run")
+    parser.add_argument("--hash", type=int, default=16, help="transposition table megabytes per process")
+    parser.add_argument("--bitboard", action="store_true", help="use BitboardChessBoard")
+    args = parser.parse_args(argv)
+    resume = args.checkpoint is not None and os.path.exists(args.checkpoint) and os.path.getsize(args.checkpoint) > 0
+    skip = read_checkpoint(args.checkpoint, args.chunk_size) if resume else set()
+    if args.output:
+        output = open(args.output, "a" if resume else "w")
+    else:
+        output = sys.stdout
+    checkpoint = None
+    if args.checkpoint:
+        checkpoint = open(args.checkpoint, "a")
+        if not resume:
+            checkpoint.write("%d\n" % args.chunk_size)
+    board_class = BitboardChessBoard if args.bitboard else ChessBoard
+    positions = 0
+    start = time.perf_counter()
+    with open(args.path) as stream:
+        chunks = read_chunks(stream, args.chunk_size)
+        for first_line, records in analyze_chunks(chunks, args.workers, args.depth, args.movetime, not args.unordered, skip, args.hash, board_class):
+            for record in records:
+                output.write(json.dumps(record) + "\n")
+            output.flush()
+            if checkpoint is not None:
+                checkpoint.write("%d\n" % first_line)
+                checkpoint.flush()
+            positions += len(records)
+    if checkpoint is not None:
+        checkpoint.close()
+    if output is not sys.stdout:
+        output.close()
+    seconds = time.perf_counter() - start
+    print("%d positions  %.2fs  %.1f positions/s" % (positions, seconds, positions / seconds if seconds > 0 else 0.0), file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""
+This module scores many positions at once with NumPy,
+for generating training data and for scoring large
+sets of positions, where calling evaluate from
+evaluation.py once per position is too slow. The
+BatchEvaluator class turns a batch of ChessBoard
+objects into a stack of piece planes, an array of
+shape N x 12 x 8 x 8 with a 1 wherever a piece stands:
+planes 0 to 5 hold white's pawns, knights, bishops,
+rooks, queens and king, and planes 6 to 11 black's,
+each indexed by row and col like the board. Every
+term of the score is then worked out for the whole
+batch with array operations, with no Python loop over
+the positions:
+
+    material and the piece-square tables, the same
+    score evaluate gives, as one matrix product;
+    mobility, the squares each knight, bishop, rook
+    and queen attacks that its own pieces do not hold,
+    found by packing each plane into a 64-bit integer
+    (a bitboard) and shifting it along every line
+    until a piece blocks it;
+    king safety, a penalty for each attack on the
+    squares around a king and a bonus for each pawn
+    of its own just in front of it.
+
+The planes are written into one array that is made
+when the evaluator is and used again for every batch,
+so a batch allocates no new position buffer, and
+fill returns a view of it rather than a copy. Planes
+made elsewhere, such as a training set saved with
+numpy.save, can be scored with evaluate_planes.
+NumPy is only needed by this module; the rest of the
+program runs without it. Run it with
+
+    python3 batch.py --positions 20000
+    python3 batch.py positions.fen --output scores.txt
+
+to score random positions, or the FENs of a file, and
+print how many positions a second each way scores.
+"""
+import argparse
+import random
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from rules import ChessBoard, PIECE_CODES, KIND_MASK, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, KNIGHT_OFFSETS, KING_OFFSETS, ROOK_DIRECTIONS, BISHOP_DIRECTIONS
+from evaluation import CODE_SQUARE_TABLES, evaluate
+
+PLANES = 12
+# The centipawns each attacked square is worth to a piece of
+# each kind, and the lines it moves along.
+MOBILITY_WEIGHTS = {KNIGHT: 4, BISHOP: 5, ROOK: 2, QUEEN: 1}
+SLIDER_DIRECTIONS = {BISHOP: BISHOP_DIRECTIONS, ROOK: ROOK_DIRECTIONS, QUEEN: ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+# The penalty for each attack on a square next to the king,
+# and the bonus for each pawn on the three squares in front
+# of it.
+KING_ZONE_ATTACK = 8
+PAWN_SHIELD = 10
+
+"""
+This function returns the plane of a piece code: the kind
+less one for white, and six more for black.
+"""
+def code_plane(code):
+    return (code & KIND_MASK) - 1 + (6 if code & BLACK else 0)
+
+"""
+This code makes the masks for moving bitboards. FILE_MASKS[d]
+has the squares a piece can reach by moving d cols, to the
+right if d is positive, so that after such a move the squares
+that wrapped round from the other side of the board are taken
+out.
+"""
+def file_mask(d_col):
+    mask = 0
+    for square in range(64):
+        if 0 <= square % 8 - d_col < 8:
+            mask |= 1 << square
+    return mask
+
+FILE_MASKS = {d_col: file_mask(d_col) for d_col in range(-2, 3)}
+
+"""
+This function returns bitboards, an array of uint64 with a
+bit set for each square, moved d_row rows and d_col cols.
+Squares moved off the board are lost.
+"""
+def shift(bitboards, d_row, d_col):
+    offset = 8 * d_row + d_col
+    if offset >= 0:
+        moved = bitboards << np.uint64(offset)
+    else:
+        moved = bitboards >> np.uint64(-offset)
+    return moved & np.uint64(FILE_MASKS[d_col])
+
+"""
+This function returns the number of bits set in each of the
+bitboards, with numpy.bitwise_count where NumPy has it and
+else by adding up the bits of each byte from a table.
+"""
+def popcount(bitboards):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bitboards).astype(np.int32)
+    return BYTE_COUNTS[bitboards[..., None].view(np.uint8)].sum(axis=-1, dtype=np.int32)
+
+BYTE_COUNTS = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.int32) if np is not None else None
+# The plane of each piece code.
+CODE_PLANES = np.array([code_plane(code) if code & KIND_MASK else 0 for code in range(16)], dtype=np.int64) if np is not None else None
+
+"""
+This code defines the BatchEvaluator class. capacity is the
+most positions a batch can hold, and batches of more are
+scored capacity at a time. fill writes a batch of boards
+into the planes, evaluate_planes scores planes and returns
+the score of each from the side to move, and terms returns
+each term of the score separately, from white's side.
+"""
+class BatchEvaluator:
+    def __init__(self, capacity=4096):
+        if np is None:
+            raise ImportError("batch evaluation needs NumPy, which can be installed with pip install numpy")
+        self.capacity = capacity
+        self.planes = np.zeros((capacity, PLANES, 8, 8), dtype=np.float32)
+        self.turns = np.zeros(capacity, dtype=np.float32)
+        # the piece-square values of every plane, black's negative
+        self.weights = np.zeros((PLANES, 64), dtype=np.float32)
+        for kind in PIECE_CODES.values():
+            for code in (kind, kind | BLACK):
+                self.weights[code_plane(code)] = CODE_SQUARE_TABLES[code]
+        self.weights = self.weights.reshape(PLANES * 64)
+
+    """
+    This method writes the positions of at most capacity
+    boards into the planes and returns a view of the planes
+    and turns they fill, with 1 for white to move and -1 for
+    black. The squares bytearrays of the boards are joined
+    and read as one array of piece codes, and only the planes
+    of the batch are cleared before the pieces are written
+    with one indexed assignment.
+    """
+    def fill(self, boards):
+        count = len(boards)
+        if count > self.capacity:
+            raise ValueError("a batch of %d positions is more than the capacity of %d" % (count, self.capacity))
+        codes = np.frombuffer(b"".join([board.squares for board in boards]), dtype=np.uint8).reshape(count, 64)
+        positions, squares = np.nonzero(codes)
+        planes = self.planes[:count]
+        planes.fill(0)
+        # a reshape of the whole buffer is a view, so this writes
+        # into the planes in place
+        self.planes.reshape(-1)[(positions * PLANES + CODE_PLANES[codes[positions, squares]]) * 64 + squares] = 1
+        self.turns[:count] = [1 if board.turn == "white" else -1 for board in boards]
+        return planes, self.turns[:count]
+
+    """
+    This method packs planes into bitboards, an array of
+    shape N x 12 of uint64 whose bit row * 8 + col is set
+    where the plane has a piece.
+    """
+    def bitboards(self, planes):
+        bits = np.packbits(planes.reshape(len(planes), PLANES, 64) != 0, axis=-1, bitorder="little")
+        return bits.view("<u8").reshape(len(planes), PLANES)
+
+    """
+    This method returns a dictionary of the terms of the
+    score of each position from white's side: material with
+    the piece-square tables, mobility and king safety.
+    Mobility and king safety are worked out on the planes
+    packed into bitboards, one uint64 a plane, so each step
+    moves every piece of a kind in every position at once.
+    Along one direction no two pieces of a kind can reach
+    the same square, since the nearer one blocks the line,
+    so counting the squares reached in each direction
+    counts every piece's moves.
+    """
+    def terms(self, planes):
+        count = len(planes)
+        material = planes.reshape(count, PLANES * 64) @ self.weights
+        boards = self.bitboards(planes)
+        sides = (np.bitwise_or.reduce(boards[:, :6], axis=1), np.bitwise_or.reduce(boards[:, 6:], axis=1))
+        empty = ~(sides[0] | sides[1])
+        kings = (boards[:, KING - 1], boards[:, 6 + KING - 1])
+        zones = []
+        for king in kings:
+            zone = king.copy()
+            for d_row, d_col in KING_OFFSETS:
+                zone |= shift(king, d_row, d_col)
+            zones.append(zone)
+        mobility = np.zeros(count, dtype=np.int32)
+        king_safety = np.zeros(count, dtype=np.int32)
+        for side, sign in ((0, 1), (1, -1)):
+            own = sides[side]
+            enemy_zone = zones[1 - side]
+            zone_attacks = np.zeros(count, dtype=np.int32)
+            for kind, weight in MOBILITY_WEIGHTS.items():
+                pieces = boards[:, 6 * side + kind - 1]
+                if kind == KNIGHT:
+                    for d_row, d_col in KNIGHT_OFFSETS:
+                        targets = shift(pieces, d_row, d_col)
+                        mobility += sign * weight * popcount(targets & ~own)
+                        zone_attacks += popcount(targets & enemy_zone)
+                    continue
+                for d_row, d_col in SLIDER_DIRECTIONS[kind]:
+                    targets = np.zeros_like(pieces)
+                    ray = shift(pieces, d_row, d_col)
+                    while ray.any():
+                        targets |= ray
+                        # a line goes on only through empty squares
+                        ray = shift(ray & empty, d_row, d_col)
+                    mobility += sign * weight * popcount(targets & ~own)
+                    zone_attacks += popcount(targets & enemy_zone)
+            pawns = boards[:, 6 * side + PAWN - 1]
+            forward = 1 if side == 0 else -1
+            for d_col in (1, -1):
+                zone_attacks += popcount(shift(pawns, forward, d_col) & enemy_zone)
+            zone_attacks += popcount(zones[side] & ~kings[side] & enemy_zone)
+            king = kings[side]
+            shield = shift(king, forward, 0) | shift(king, forward, 1) | shift(king, forward, -1)
+            king_safety += sign * (PAWN_SHIELD * popcount(shield & pawns) + KING_ZONE_ATTACK * zone_attacks)
+        return {"material": material, "mobility": mobility.astype(np.float32), "king_safety": king_safety.astype(np.float32)}
+
+    """
+    This method returns the scores of planes whose sides to
+    move are given by turns, in centipawns from the side to
+    move, as evaluate gives them. If out is given the scores
+    are written into it.
+    """
+    def evaluate_planes(self, planes, turns, out=None):
+        terms = self.terms(planes)
+        return np.multiply(terms["material"] + terms["mobility"] + terms["king_safety"], turns, out=out)
+
+    """
+    This method returns the scores of any number of boards
+    as an array, filling and scoring capacity at a time.
+    """
+    def evaluate(self, boards):
+        scores = np.empty(len(boards), dtype=np.float32)
+        for start in range(0, len(boards), self.capacity):
+            batch = boards[start:start + self.capacity]
+            planes, turns = self.fill(batch)
+            self.evaluate_planes(planes, turns, scores[start:start + len(batch)])
+        return scores
+
+"""
+This function returns count boards of random positions, the
+positions of games of random legal moves from the starting
+position, each played until it ends or max_plies moves have
+been made.
+"""
+def random_boards(count, rng, max_plies=80):
+    fens = []
+    while len(fens) < count:
+        board = ChessBoard()
+        for _ in range(max_plies):
+            moves = list(board.generate_legal_moves(board.turn))
+            if not moves:
+                break
+            board.make_move(rng.choice(moves))
+            fens.append(board.to_fen())
+    boards = []
+    for fen in fens[:count]:
+        board = ChessBoard()
+        board.load_fen(fen)
+        boards.append(board)
+    return boards
+
+def read_boards(path):
+    boards = []
+    with open(path) as stream:
+        for line in stream:
+            fen = line.split(";")[0].strip()
+            if fen and not fen.startswith("#"):
+                board = ChessBoard()
+                board.load_fen(fen)
+                boards.append(board)
+    return boards
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score many positions at once with NumPy.")
+    parser.add_argument("fens", nargs="?", help="a file of FENs, one per line; random positions if not given")
+    parser.add_argument("--positions", type=int, default=10000, help="how many random positions to score")
+    parser.add_argument("--batch", type=int, default=4096, help="how many positions to score at a time")
+    parser.add_argument("--seed", type=int, default=1, help="seed the random positions")
+    parser.add_argument("--output", help="write the score of each position to this file, one per line")
+    args = parser.parse_args(argv)
+    if np is None:
+        print("batch.py needs NumPy, which can be installed with pip install numpy", file=sys.stderr)
+        return 1
+    boards = read_boards(args.fens) if args.fens else random_boards(args.positions, random.Random(args.seed))
+    evaluator = BatchEvaluator(args.batch)
+    start = time.perf_counter()
+    scores = evaluator.evaluate(boards)
+    batch_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    single = [evaluate(board) for board in boards]
+    single_seconds = time.perf_counter() - start
+    planes, turns = evaluator.fill(boards[:args.batch])
+    material = evaluator.terms(planes)["material"] * turns
+    if np.any(material != np.array(single[:args.batch], dtype=np.float32)):
+        print("the batch material score differs from evaluate", file=sys.stderr)
+        return 1
+    print("%d positions  batch %.3fs %.0f positions/s  evaluate %.3fs %.0f positions/s" % (
+        len(boards), batch_seconds, len(boards) / batch_seconds, single_seconds, len(boards) / single_seconds))
+    if args.output:
+        with open(args.output, "w") as stream:
+            for score in scores:
+                stream.write("%d\n" % score)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+"""
+This module defines the BitboardChessBoard class, a
+ChessBoard that also keeps the position as 64-bit
+integers, one for each piece type of each color,
+where bit row*8+col is set when such a piece stands
+on that square. Knight, king and pawn attacks come
+from tables built once when the module is imported,
+and the squares a rook, bishop or queen attacks come
+from precomputed rays cut off at the first piece in
+the way. Attack tests and move generation then take
+a handful of integer operations per piece instead of
+walking the board square by square, and whether a
+move leaves its king in check is told from the
+bitboards without playing and taking back the move,
+which is where the ChessBoard spends most of its
+time generating legal moves. The 8x8 list of
+Piece objects is still kept up to date, so the class
+can be used anywhere a ChessBoard is, for example
+ChessGame(BitboardChessBoard()).
+"""
+from rules import ChessBoard, KNIGHT_OFFSETS, KING_OFFSETS, ROOK_DIRECTIONS, BISHOP_DIRECTIONS, PROMOTION_PIECES, COLOR_CODES
+from rules import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK, KIND_MASK
+
+"""
+This function returns a bitboard with a bit set for each
+of the squares reached from square by the given (row, col)
+offsets that are still on the board.
+"""
+def offsets_bitboard(square, offsets):
+    row, col = divmod(square, 8)
+    bitboard = 0
+    for d_row, d_col in offsets:
+        r, c = row + d_row, col + d_col
+        if 0 <= r < 8 and 0 <= c < 8:
+            bitboard |= 1 << (r * 8 + c)
+    return bitboard
+
+"""
+This function returns the bitboard of every square from
+square outward in one direction up to the edge of the
+board, not including square itself.
+"""
+def ray_bitboard(square, d_row, d_col):
+    row, col = divmod(square, 8)
+    bitboard = 0
+    r, c = row + d_row, col + d_col
+    while 0 <= r < 8 and 0 <= c < 8:
+        bitboard |= 1 << (r * 8 + c)
+        r += d_row
+        c += d_col
+    return bitboard
+
+KNIGHT_ATTACKS = [offsets_bitboard(square, KNIGHT_OFFSETS) for square in range(64)]
+KING_ATTACKS = [offsets_bitboard(square, KING_OFFSETS) for square in range(64)]
+# the squares a pawn of each color standing on a square attacks
+PAWN_ATTACKS = {
+    WHITE: [offsets_bitboard(square, ((1, -1), (1, 1))) for square in range(64)],
+    BLACK: [offsets_bitboard(square, ((-1, -1), (-1, 1))) for square in range(64)],
+}
+# For each direction, whether it goes towards higher square
+# numbers, and its ray from every square. Along a direction
+# going up the nearest piece is the lowest set bit, going
+# down it is the highest.
+ROOK_RAYS = [(d_row * 8 + d_col > 0, [ray_bitboard(square, d_row, d_col) for square in range(64)]) for d_row, d_col in ROOK_DIRECTIONS]
+BISHOP_RAYS = [(d_row * 8 + d_col > 0, [ray_bitboard(square, d_row, d_col) for square in range(64)]) for d_row, d_col in BISHOP_DIRECTIONS]
+RANK_1 = 0xFF
+RANK_8 = 0xFF << 56
+# The move tuple for every from and to square, built once so
+# that generating a move does not build a new tuple.
+MOVES = [[divmod(from_square, 8) + divmod(to_square, 8) + (None,) for to_square in range(64)] for from_square in range(64)]
+
+"""
+This function returns the squares attacked along the given
+rays from square when the pieces on the board are the
+occupied bitboard. Each ray is cut off after the first
+occupied square on it, which is found with a single bit
+operation.
+"""
+def sliding_attacks(square, occupied, rays):
+    attacks = 0
+    for upward, ray_table in rays:
+        ray = ray_table[square]
+        blockers = ray & occupied
+        if blockers:
+            if upward:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= ray_table[blocker]
+        attacks |= ray
+    return attacks
+
+def rook_attacks(square, occupied):
+    return sliding_attacks(square, occupied, ROOK_RAYS)
+
+def bishop_attacks(square, occupied):
+    return sliding_attacks(square, occupied, BISHOP_RAYS)
+
+"""
+This code defines the BitboardChessBoard class. It extends
+ChessBoard by keeping self.bitboards, a list of the
+bitboard of each piece code, and self.occupancy, the
+bitboards of all the white and all the black pieces
+indexed by WHITE and BLACK. The place_piece and
+remove_piece methods set and clear the bits as pieces come
+and go, so make_move and unmake_move keep them right. The
+is_square_attacked, find_king, leaves_king_in_check and
+generate_pseudo_legal_moves methods are rewritten to use
+the bitboards and attack tables, and return exactly what
+the ChessBoard versions return.
+"""
+class BitboardChessBoard(ChessBoard):
+    def populate_board(self):
+        ChessBoard.populate_board(self)
+        self.load_bitboards()
+
+    def load_fen(self, fen):
+        ChessBoard.load_fen(self, fen)
+        self.load_bitboards()
+
+    """
+    This method builds the bitboards from the pieces that are
+    on the 8x8 board.
+    """
+    def load_bitboards(self):
+        self.bitboards = [0] * 16
+        self.occupancy = [0] * 9
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece is not None:
+                    bit = 1 << (row * 8 + col)
+                    self.bitboards[piece.code] |= bit
+                    self.occupancy[piece.code & BLACK] |= bit
+
+    def place_piece(self, piece, row, col):
+        ChessBoard.place_piece(self, piece, row, col)
+        bit = 1 << (row * 8 + col)
+        self.bitboards[piece.code] |= bit
+        self.occupancy[piece.code & BLACK] |= bit
+
+    def remove_piece(self, row, col):
+        piece = ChessBoard.remove_piece(self, row, col)
+        mask = ~(1 << (row * 8 + col))
+        self.bitboards[piece.code] &= mask
+        self.occupancy[piece.code & BLACK] &= mask
+        return piece
+
+    def find_king(self, color):
+        kings = self.bitboards[COLOR_CODES[color] | KING]
+        if not kings:
+            return None
+        return divmod((kings & -kings).bit_length() - 1, 8)
+
+    """
+    This method checks whether the square at row, col is
+    attacked by the given color by looking up, from that
+    square, where a pawn of the other color, a knight, a king,
+    a rook and a bishop would attack, and testing those
+    squares against the attacker's bitboards.
+    """
+    def is_square_attacked(self, row, col, by_color):
+        square = row * 8 + col
+        side = COLOR_CODES[by_color]
+        bitboards = self.bitboards
+        if PAWN_ATTACKS[side ^ BLACK][square] & bitboards[side | PAWN]:
+            return True
+        if KNIGHT_ATTACKS[square] & bitboards[side | KNIGHT]:
+            return True
+        if KING_ATTACKS[square] & bitboards[side | KING]:
+            return True
+        occupied = self.occupancy[WHITE] | self.occupancy[BLACK]
+        straight = bitboards[side | ROOK] | bitboards[side | QUEEN]
+        if straight and rook_attacks(square, occupied) & straight:
+            return True
+        diagonal = bitboards[side | BISHOP] | bitboards[side | QUEEN]
+        if diagonal and bishop_attacks(square, occupied) & diagonal:
+            return True
+        return False
+
+    """
+    This method tells whether a move would leave the mover's
+    king attacked without playing it: the bitboards are
+    changed only in local variables, with the moving piece
+    taken off its square and put on the target, and the piece
+    it takes, or the pawn taken en passant, left out of the
+    attackers. Castling moves, whose squares were already
+    checked when they were generated, go through the
+    ChessBoard version.
+    """
+    def leaves_king_in_check(self, move):
+        from_row, from_col, to_row, to_col = move[0], move[1], move[2], move[3]
+        from_square = from_row * 8 + from_col
+        to_square = to_row * 8 + to_col
+        squares = self.squares
+        code = squares[from_square]
+        kind = code & KIND_MASK
+        if kind == KING and abs(to_col - from_col) == 2:
+            return ChessBoard.leaves_king_in_check(self, move)
+        side = code & BLACK
+        enemy = side ^ BLACK
+        bitboards = self.bitboards
+        to_bit = 1 << to_square
+        taken = to_bit
+        if kind == PAWN and from_col != to_col and not squares[to_square]:
+            taken |= 1 << (from_row * 8 + to_col)
+        occupied = ((self.occupancy[WHITE] | self.occupancy[BLACK]) & ~taken & ~(1 << from_square)) | to_bit
+        if kind == KING:
+            square = to_square
+        else:
+            kings = bitboards[side | KING]
+            if not kings:
+                return False
+            square = (kings & -kings).bit_length() - 1
+        alive = ~taken
+        if PAWN_ATTACKS[side][square] & bitboards[enemy | PAWN] & alive:
+            return True
+        if KNIGHT_ATTACKS[square] & bitboards[enemy | KNIGHT] & alive:
+            return True
+        if KING_ATTACKS[square] & bitboards[enemy | KING]:
+            return True
+        queens = bitboards[enemy | QUEEN]
+        straight = (bitboards[enemy | ROOK] | queens) & alive
+        if straight and rook_attacks(square, occupied) & straight:
+            return True
+        diagonal = (bitboards[enemy | BISHOP] | queens) & alive
+        if diagonal and bishop_attacks(square, occupied) & diagonal:
+            return True
+        return False
+
+    """
+    This method returns the same moves as the ChessBoard
+    version. For each piece the squares it attacks come from
+    the attack tables, and removing the squares of its own
+    color leaves the squares it can move to. Pawns are pushed
+    by shifting the whole pawn bitboard a row at a time.
+    Castling is left to add_castling_moves.
+    """
+    def generate_pseudo_legal_moves(self, color):
+        moves = []
+        side = COLOR_CODES[color]
+        own = self.occupancy[side]
+        enemy = self.occupancy[side ^ BLACK]
+        occupied = own | enemy
+        self.add_bitboard_pawn_moves(side, self.bitboards[side | PAWN], enemy, occupied, moves)
+        for kind in (KNIGHT, BISHOP, ROOK, QUEEN, KING):
+            bitboard = self.bitboards[side | kind]
+            while bitboard:
+                low_bit = bitboard & -bitboard
+                bitboard ^= low_bit
+                square = low_bit.bit_length() - 1
+                if kind == KNIGHT:
+                    targets = KNIGHT_ATTACKS[square]
+                elif kind == BISHOP:
+                    targets = bishop_attacks(square, occupied)
+                elif kind == ROOK:
+                    targets = rook_attacks(square, occupied)
+                elif kind == QUEEN:
+                    targets = rook_attacks(square, occupied) | bishop_attacks(square, occupied)
+                else:
+                    targets = KING_ATTACKS[square]
+                targets &= ~own
+                square_moves = MOVES[square]
+                while targets:
+                    target_bit = targets & -targets
+                    targets ^= target_bit
+                    moves.append(square_moves[target_bit.bit_length() - 1])
+                if kind == KING:
+                    row, col = divmod(square, 8)
+                    self.add_castling_moves(self.board[row][col], row, col, moves)
+        return moves
+
+    def add_bitboard_pawn_moves(self, side, pawns, enemy, occupied, moves):
+        empty = ~occupied & 0xFFFFFFFFFFFFFFFF
+        if side == WHITE:
+            step = 8
+            single = (pawns << 8) & empty
+            double = ((single & (0xFF << 16)) << 8) & empty
+            last_rank = RANK_8
+        else:
+            step = -8
+            single = (pawns >> 8) & empty
+            double = ((single & (0xFF << 40)) >> 8) & empty
+            last_rank = RANK_1
+        captures = enemy
+        # only the side that did not just push may capture en passant
+        if self.en_passant is not None and self.en_passant[0] == (5 if side == WHITE else 2):
+            captures |= 1 << (self.en_passant[0] * 8 + self.en_passant[1])
+        while single:
+            bit = single & -single
+            single ^= bit
+            square = bit.bit_length() - 1
+            self.add_bitboard_pawn_move(square - step, square, bit & last_rank, moves)
+        while double:
+            bit = double & -double
+            double ^= bit
+            square = bit.bit_length() - 1
+            self.add_bitboard_pawn_move(square - 2 * step, square, 0, moves)
+        while pawns:
+            bit = pawns & -pawns
+            pawns ^= bit
+            square = bit.bit_length() - 1
+            targets = PAWN_ATTACKS[side][square] & captures
+            while targets:
+                target_bit = targets & -targets
+                targets ^= target_bit
+                self.add_bitboard_pawn_move(square, target_bit.bit_length() - 1, target_bit & last_rank, moves)
+
+    def add_bitboard_pawn_move(self, from_square, to_square, promotes, moves):
+        if promotes:
+            move = MOVES[from_square][to_square]
+            for promotion in PROMOTION_PIECES:
+                moves.append(move[:4] + (promotion,))
+        else:
+            moves.append(MOVES[from_square][to_square])
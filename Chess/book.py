@@ -0,0 +1,277 @@
+"""
+This module builds and reads an opening book, a file
+of the moves played from each position in a set of
+games, so that the engine can play the first moves
+of a game at once instead of searching. The file has
+the layout of a Polyglot book: entries of 16 bytes,
+each a big-endian 64-bit position key, a 16-bit move,
+a 16-bit weight and a 32-bit learn value, sorted by
+key, so that the entries of one position are found by
+binary search. The keys are the Zobrist keys of
+rules.py rather than the Polyglot random numbers, so
+books built here are read here. The OpeningBook class
+maps the file into memory and searches it in place,
+with nothing read when it is opened, so opening even
+a book of hundreds of megabytes is instant, and the
+pages are shared by every process that opens it.
+The book is built from PGN with
+
+    python3 book.py build games.pgn book.bin --plies 20
+
+which counts each move played in the first plies of
+every game, weighted 2 for a win and 1 for a draw for
+the side that played it, and
+
+    python3 book.py probe book.bin --fen "<fen>"
+
+lists the book moves of a position.
+"""
+import argparse
+import heapq
+import mmap
+import os
+import random
+import struct
+import sys
+import tempfile
+
+from rules import ChessBoard, STARTING_FEN, KIND_MASK, KING
+from pgn import read_games
+from perft import move_name
+
+ENTRY = struct.Struct(">QHHI")
+# the entries of a sorted run while the book is being built,
+# with a weight that may pass 65535 until the runs are merged
+RUN_ENTRY = struct.Struct(">QHI")
+MAX_WEIGHT = 0xFFFF
+# how many (key, move) pairs are counted in memory before they
+# are sorted and written to a run file
+RUN_SIZE = 1000000
+# the promotion piece of a Polyglot move, from bit 12
+BOOK_PROMOTIONS = (None, "knight", "bishop", "rook", "queen")
+
+"""
+This function turns a move tuple into a Polyglot move: the
+to square in bits 0 to 5, the from square in bits 6 to 11
+and the promotion piece from bit 12, with each square
+numbered row * 8 + col. Castling is written as the king
+taking its own rook, as Polyglot does.
+"""
+def encode_book_move(board, move):
+    from_row, from_col, to_row, to_col, promotion = move
+    if (board.squares[from_row * 8 + from_col] & KIND_MASK) == KING and abs(to_col - from_col) == 2:
+        to_col = 7 if to_col > from_col else 0
+    code = (to_row * 8 + to_col) | ((from_row * 8 + from_col) << 6)
+    if promotion is not None:
+        code |= BOOK_PROMOTIONS.index(promotion) << 12
+    return code
+
+"""
+This function turns a Polyglot move back into a move tuple
+for the board's position, moving a king that takes its own
+rook two squares instead.
+"""
+def decode_book_move(board, code):
+    from_row, from_col = divmod(code >> 6 & 63, 8)
+    to_row, to_col = divmod(code & 63, 8)
+    promotion = BOOK_PROMOTIONS[code >> 12 & 7]
+    if (board.squares[from_row * 8 + from_col] & KIND_MASK) == KING and from_col == 4 and from_row == to_row and to_col in (0, 7):
+        to_col = 6 if to_col == 7 else 2
+    return (from_row, from_col, to_row, to_col, promotion)
+
+"""
+This generator gives back the (key, move, weight) of every
+book move in the games: each of the first plies moves of a
+game that was finished, with the Zobrist key of the position
+it was played from and a weight of 2 for the winner's moves,
+1 for both sides' moves in a draw and 0 for the loser's.
+"""
+def book_moves(games, plies):
+    board = ChessBoard()
+    for game in games:
+        if game.result not in ("1-0", "0-1", "1/2-1/2"):
+            continue
+        if game.result == "1/2-1/2":
+            weights = {"white": 1, "black": 1}
+        elif game.result == "1-0":
+            weights = {"white": 2, "black": 0}
+        else:
+            weights = {"white": 0, "black": 2}
+        board.load_fen(game.fen())
+        for move in game.moves[:plies]:
+            yield board.zobrist_key, encode_book_move(board, move), weights[board.turn]
+            board.make_move(move)
+
+"""
+This function writes the counts, a dictionary from (key,
+move) to weight, sorted to a new temporary run file and
+returns its path.
+"""
+def write_run(counts, directory):
+    handle, path = tempfile.mkstemp(suffix=".run", dir=directory)
+    with os.fdopen(handle, "wb") as stream:
+        for (key, move), weight in sorted(counts.items()):
+            stream.write(RUN_ENTRY.pack(key, move, weight))
+    return path
+
+def read_run(path):
+    with open(path, "rb") as stream:
+        while True:
+            data = stream.read(RUN_ENTRY.size)
+            if len(data) < RUN_ENTRY.size:
+                return
+            yield RUN_ENTRY.unpack(data)
+
+"""
+This function builds a book at path from the lines of a PGN
+file. The moves are counted in memory up to RUN_SIZE
+different (key, move) pairs at a time; each batch is written
+sorted to a run file, and the runs are then merged into the
+book, adding up the weights of the same move from different
+runs. Memory therefore stays the same however many games are
+read. Moves whose weight is less than min_weight are left
+out, and weights are capped at 65535. It returns the number
+of entries written.
+"""
+def build_book(lines, path, plies=20, min_weight=1, run_size=RUN_SIZE):
+    directory = os.path.dirname(os.path.abspath(path))
+    runs = []
+    counts = {}
+    try:
+        for key, move, weight in book_moves((game for game in read_games(lines) if game.error is None), plies):
+            counts[(key, move)] = counts.get((key, move), 0) + weight
+            if len(counts) >= run_size:
+                runs.append(write_run(counts, directory))
+                counts = {}
+        if counts:
+            runs.append(write_run(counts, directory))
+        entries = 0
+        with open(path, "wb") as stream:
+            current = None
+            total = 0
+            for key, move, weight in heapq.merge(*[read_run(run) for run in runs]):
+                if (key, move) != current:
+                    if current is not None and total >= min_weight:
+                        stream.write(ENTRY.pack(current[0], current[1], min(total, MAX_WEIGHT), 0))
+                        entries += 1
+                    current = (key, move)
+                    total = 0
+                total += weight
+            if current is not None and total >= min_weight:
+                stream.write(ENTRY.pack(current[0], current[1], min(total, MAX_WEIGHT), 0))
+                entries += 1
+    finally:
+        for run in runs:
+            os.remove(run)
+    return entries
+
+"""
+This code defines the OpeningBook class, which reads a book
+file. The file is mapped into memory when the book is made
+and is never read as a whole; entries looks up the entries
+of a key by binary search over the sorted keys, moves turns
+them into the legal moves of a board's position with their
+weights, and choose picks one of those moves at random in
+proportion to its weight, or the heaviest if best is True.
+"""
+class OpeningBook:
+    def __init__(self, path):
+        self.path = path
+        self.stream = open(path, "rb")
+        size = os.fstat(self.stream.fileno()).st_size
+        self.count = size // ENTRY.size
+        self.data = mmap.mmap(self.stream.fileno(), 0, access=mmap.ACCESS_READ) if self.count else b""
+
+    def close(self):
+        if self.count:
+            self.data.close()
+        self.stream.close()
+
+    def __len__(self):
+        return self.count
+
+    def key_at(self, index):
+        return struct.unpack_from(">Q", self.data, index * ENTRY.size)[0]
+
+    """
+    This method returns a list of the (move, weight, learn)
+    entries for the key, as they are stored in the file.
+    """
+    def entries(self, key):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        index = low
+        while index < self.count:
+            entry_key, move, weight, learn = ENTRY.unpack_from(self.data, index * ENTRY.size)
+            if entry_key != key:
+                break
+            found.append((move, weight, learn))
+            index += 1
+        return found
+
+    """
+    This method returns a list of (move, weight) pairs for the
+    legal book moves of the board's position, heaviest first.
+    A book move that is not legal, which could only happen if
+    two positions shared a key, is left out.
+    """
+    def moves(self, board):
+        legal = set(board.generate_legal_moves(board.turn))
+        found = []
+        for code, weight, learn in self.entries(board.zobrist_key):
+            move = decode_book_move(board, code)
+            if move in legal:
+                found.append((move, weight))
+        found.sort(key=lambda entry: entry[1], reverse=True)
+        return found
+
+    def choose(self, board, rng=random, best=False):
+        found = [(move, weight) for move, weight in self.moves(board) if weight > 0]
+        if not found:
+            return None
+        if best:
+            return found[0][0]
+        pick = rng.randrange(sum(weight for move, weight in found))
+        for move, weight in found:
+            pick -= weight
+            if pick < 0:
+                return move
+        return found[-1][0]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or look up an opening book.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a book from a PGN file")
+    build.add_argument("pgn", help="the PGN file of games")
+    build.add_argument("book", help="the book file to write")
+    build.add_argument("--plies", type=int, default=20, help="how many plies of each game to put in the book")
+    build.add_argument("--min-weight", type=int, default=1, help="leave out moves with a smaller total weight")
+    probe = commands.add_parser("probe", help="list the book moves of a position")
+    probe.add_argument("book", help="the book file to read")
+    probe.add_argument("--fen", default=STARTING_FEN, help="the position to look up")
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        with open(args.pgn, encoding="utf-8", errors="replace") as stream:
+            entries = build_book(stream, args.book, args.plies, args.min_weight)
+        print("%d entries written to %s" % (entries, args.book))
+        return 0
+    book = OpeningBook(args.book)
+    board = ChessBoard()
+    board.load_fen(args.fen)
+    found = book.moves(board)
+    total = sum(weight for move, weight in found)
+    for move, weight in found:
+        print("%s  %5d  %5.1f%%" % (move_name(move), weight, 100.0 * weight / total if total else 0.0))
+    if not found:
+        print("no book moves")
+    book.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+This module scores a position for the search in
+search.py. The score is in centipawns, a hundredth
+of a pawn, and is seen from the side to move, so a
+positive score means the side to move is better. It
+adds up the value of each piece and a bonus or
+penalty from a piece-square table for the square the
+piece stands on, which rewards things like knights
+in the centre and pawns that have advanced. The king
+uses a middlegame table that keeps it sheltered.
+"""
+from rules import PIECE_CODES, PIECE_MATERIAL, WHITE, BLACK
+
+PIECE_VALUES = {name: PIECE_MATERIAL[kind] for name, kind in PIECE_CODES.items()}
+
+# The piece-square tables are written from white's side of
+# the board, with the eighth rank on the first line, so that
+# they read like a diagram. PIECE_SQUARE_TABLES below turns
+# them into lists indexed by row * 8 + col for each color.
+PAWN_TABLE = (
+     0,   0,   0,   0,   0,   0,   0,   0,
+    50,  50,  50,  50,  50,  50,  50,  50,
+    10,  10,  20,  30,  30,  20,  10,  10,
+     5,   5,  10,  25,  25,  10,   5,   5,
+     0,   0,   0,  20,  20,   0,   0,   0,
+     5,  -5, -10,   0,   0, -10,  -5,   5,
+     5,  10,  10, -20, -20,  10,  10,   5,
+     0,   0,   0,   0,   0,   0,   0,   0,
+)
+KNIGHT_TABLE = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+)
+BISHOP_TABLE = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+)
+ROOK_TABLE = (
+     0,   0,   0,   0,   0,   0,   0,   0,
+     5,  10,  10,  10,  10,  10,  10,   5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+     0,   0,   0,   5,   5,   0,   0,   0,
+)
+QUEEN_TABLE = (
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+)
+KING_TABLE = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20,
+)
+DIAGRAM_TABLES = {"pawn": PAWN_TABLE, "knight": KNIGHT_TABLE, "bishop": BISHOP_TABLE, "rook": ROOK_TABLE, "queen": QUEEN_TABLE, "king": KING_TABLE}
+
+"""
+This function turns a table written as a diagram into a
+list indexed by row * 8 + col for a piece of the given
+color. White's first row is the last line of the diagram,
+and black sees the board the other way up.
+"""
+def square_table(diagram, color):
+    table = []
+    for row in range(8):
+        for col in range(8):
+            if color == "white":
+                table.append(diagram[(7 - row) * 8 + col])
+            else:
+                table.append(diagram[row * 8 + col])
+    return table
+
+# The value of each piece on each square, piece value and
+# table bonus together, by color and name.
+PIECE_SQUARE_TABLES = {color: {name: [PIECE_VALUES[name] + bonus for bonus in square_table(DIAGRAM_TABLES[name], color)] for name in PIECE_VALUES} for color in ("white", "black")}
+# The same by piece code, with black's values negative so that
+# the score from white's side is just their sum, and the value
+# of each piece code.
+CODE_SQUARE_TABLES = [None] * 16
+CODE_VALUES = [0] * 16
+for name, kind in PIECE_CODES.items():
+    CODE_SQUARE_TABLES[kind] = PIECE_SQUARE_TABLES["white"][name]
+    CODE_SQUARE_TABLES[kind | BLACK] = [-value for value in PIECE_SQUARE_TABLES["black"][name]]
+    CODE_VALUES[kind] = CODE_VALUES[kind | BLACK] = PIECE_VALUES[name]
+
+"""
+This function returns the score of the board's position in
+centipawns from the point of view of the side to move.
+"""
+def evaluate(board):
+    score = 0
+    tables = CODE_SQUARE_TABLES
+    squares = board.squares
+    for square in board.piece_squares[WHITE]:
+        score += tables[squares[square]][square]
+    for square in board.piece_squares[BLACK]:
+        score += tables[squares[square]][square]
+    if board.turn == "white":
+        return score
+    return -score
@@ -0,0 +1,296 @@
+"""
+This module measures where the time of a game goes.
+The Instrumentation class counts and times the calls
+to the methods of a ChessGame that a turn is spent
+in: is_valid_move and the is_valid_*_move method of
+each piece, is_in_check, is_checkmate, find_king and,
+in the graphical game, draw_pieces. It does this by
+wrapping the methods of one game object when attach is
+called, and nothing else, so a game that is not
+attached runs exactly the code it always did, and
+the instrumentation costs nothing until it is turned
+on. Each successful make_move ends a turn, and the
+counts and times of the turn are kept along with the
+totals over the game; report returns both as a
+dictionary that write_json saves as JSON. The times
+include the time spent in the methods each one calls,
+so is_valid_queen_move includes is_valid_rook_move.
+
+For a view of everything, not just these methods,
+run_profiled runs a function under cProfile and saves
+its statistics for pstats or snakeviz, and the
+StackSampler class records the call stack of the
+running thread every few milliseconds and writes the
+stacks in the folded format that flamegraph.pl and
+speedscope draw as a flame graph. Chess.py takes
+--instrument, --profile and --flamegraph, and
+
+    python3 instrumentation.py --games 5 --json stats.json
+
+plays random headless games and prints the report.
+"""
+import argparse
+import cProfile
+import json
+import random
+import sys
+import threading
+import time
+
+from rules import ChessGame, COLOR_CODES
+
+# The methods Instrumentation wraps when it is given no list.
+INSTRUMENTED_METHODS = ("is_valid_move", "is_valid_pawn_move", "is_valid_rook_move", "is_valid_knight_move", "is_valid_bishop_move",
+                        "is_valid_queen_move", "is_valid_king_move", "is_in_check", "is_checkmate", "find_king", "draw_pieces")
+
+"""
+This code defines the Instrumentation class. attach wraps the
+methods of a game, those of its class that it has, and detach
+puts them back. The counts of each method are kept as a list
+of [calls, seconds, longest call]. end_turn is called by the
+wrapped make_move after every move, or can be called directly,
+and calls on_turn, if given, with the statistics of the turn.
+"""
+class Instrumentation:
+    def __init__(self, methods=INSTRUMENTED_METHODS, on_turn=None):
+        self.methods = tuple(methods)
+        self.on_turn = on_turn
+        self.current = {}
+        self.totals = {}
+        self.turns = []
+        self.turn_start = time.perf_counter()
+        self.attached = []
+
+    def attach(self, game):
+        names = [name for name in self.methods if hasattr(game, name)]
+        for name in names:
+            setattr(game, name, self.timed(name, getattr(game, name)))
+        make_move = game.make_move
+        def counted_make_move(*args, **kwargs):
+            color = game.turn
+            moved = make_move(*args, **kwargs)
+            if moved:
+                self.end_turn(color)
+            return moved
+        game.make_move = counted_make_move
+        self.attached.append((game, names + ["make_move"]))
+        self.turn_start = time.perf_counter()
+        return game
+
+    def detach(self, game=None):
+        for attached_game, names in list(self.attached):
+            if game is None or attached_game is game:
+                for name in names:
+                    # the wrappers are attributes of the object, so
+                    # deleting them uncovers the class's methods
+                    delattr(attached_game, name)
+                self.attached.remove((attached_game, names))
+
+    def timed(self, name, method):
+        current = self.current
+        clock = time.perf_counter
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                entry = current.get(name)
+                if entry is None:
+                    entry = current[name] = [0, 0.0, 0.0]
+                entry[0] += 1
+                entry[1] += elapsed
+                if elapsed > entry[2]:
+                    entry[2] = elapsed
+        wrapper.__name__ = name
+        wrapper.__wrapped__ = method
+        return wrapper
+
+    """
+    This method closes the current turn: its counts are added
+    to the totals and kept, with the color that moved and the
+    seconds since the last turn ended, and counting starts
+    again from zero.
+    """
+    def end_turn(self, color=None):
+        now = time.perf_counter()
+        for name, (calls, seconds, longest) in self.current.items():
+            total = self.totals.get(name)
+            if total is None:
+                total = self.totals[name] = [0, 0.0, 0.0]
+            total[0] += calls
+            total[1] += seconds
+            total[2] = max(total[2], longest)
+        turn = {"turn": len(self.turns) + 1, "color": color, "seconds": now - self.turn_start, "methods": method_stats(self.current)}
+        self.turns.append(turn)
+        self.current.clear()
+        self.turn_start = now
+        if self.on_turn is not None:
+            self.on_turn(turn)
+
+    """
+    This method returns the statistics as a dictionary: every
+    finished turn, the calls of the turn still going on, and
+    the totals of every method over all the turns, each with
+    its calls, seconds, longest call and microseconds per call.
+    """
+    def report(self):
+        cumulative = {}
+        for name, counts in self.totals.items():
+            cumulative[name] = list(counts)
+        for name, (calls, seconds, longest) in self.current.items():
+            total = cumulative.setdefault(name, [0, 0.0, 0.0])
+            total[0] += calls
+            total[1] += seconds
+            total[2] = max(total[2], longest)
+        return {"turns": self.turns, "current_turn": method_stats(self.current), "cumulative": method_stats(cumulative),
+                "total_seconds": sum(turn["seconds"] for turn in self.turns)}
+
+    def write_json(self, path):
+        with open(path, "w") as stream:
+            json.dump(self.report(), stream, indent=1)
+
+    """
+    This method returns the cumulative statistics as a table,
+    the method taking the most time first.
+    """
+    def summary(self):
+        report = self.report()
+        lines = ["%-22s %10s %12s %12s %12s" % ("method", "calls", "seconds", "us/call", "longest ms")]
+        for name, stats in sorted(report["cumulative"].items(), key=lambda item: item[1]["seconds"], reverse=True):
+            lines.append("%-22s %10d %12.4f %12.2f %12.3f" % (name, stats["calls"], stats["seconds"], stats["us_per_call"], 1000 * stats["longest"]))
+        turns = report["turns"]
+        if turns:
+            slowest = max(turns, key=lambda turn: turn["seconds"])
+            lines.append("%d turns, %.3fs on average, slowest turn %d (%s) %.3fs" % (
+                len(turns), report["total_seconds"] / len(turns), slowest["turn"], slowest["color"], slowest["seconds"]))
+        return "\n".join(lines)
+
+"""
+This function writes the statistics of one turn on a line:
+its number, color and seconds, and the calls and milliseconds
+of each method, the slowest first.
+"""
+def turn_line(turn):
+    methods = sorted(turn["methods"].items(), key=lambda item: item[1]["seconds"], reverse=True)
+    calls = ", ".join("%s %d/%.2fms" % (name, stats["calls"], 1000 * stats["seconds"]) for name, stats in methods)
+    return "turn %d %s %.3fs: %s" % (turn["turn"], turn["color"], turn["seconds"], calls or "no calls")
+
+def method_stats(counts):
+    return {name: {"calls": calls, "seconds": seconds, "longest": longest, "us_per_call": 1e6 * seconds / calls if calls else 0.0}
+            for name, (calls, seconds, longest) in counts.items()}
+
+"""
+This code defines the StackSampler class, a sampling profiler
+for drawing flame graphs. Between start and stop a background
+thread looks at the call stack of the thread that called
+start every interval seconds and counts each stack it sees.
+write saves the counts in the folded format, one line per
+stack of function names from the outermost in, separated by
+semicolons, and its count.
+"""
+class StackSampler:
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.counts = {}
+        self.thread = None
+        self.running = False
+        self.target = None
+
+    def start(self):
+        self.target = threading.get_ident()
+        self.running = True
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def sample(self):
+        while self.running:
+            frame = sys._current_frames().get(self.target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append("%s (%s:%d)" % (code.co_name, code.co_filename.rsplit("/", 1)[-1], code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+            time.sleep(self.interval)
+
+    def write(self, path):
+        with open(path, "w") as stream:
+            for stack, count in sorted(self.counts.items()):
+                stream.write("%s %d\n" % (stack, count))
+
+"""
+This function calls function, under cProfile if profile_path
+is given, saving the statistics there, and with a
+StackSampler if flamegraph_path is given, saving the folded
+stacks there. It returns what function returns.
+"""
+def run_profiled(function, profile_path=None, flamegraph_path=None):
+    sampler = None
+    if flamegraph_path is not None:
+        sampler = StackSampler()
+        sampler.start()
+    profiler = None
+    if profile_path is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        return function()
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        if sampler is not None:
+            sampler.stop()
+            sampler.write(flamegraph_path)
+
+"""
+This function plays a headless game with random moves, the
+way a player clicking the board does: a piece of the side
+to move is picked, and make_move is tried on squares until
+one is legal. It stops when the game ends or after max_plies
+moves.
+"""
+def play_random_game(game, rng, max_plies=200):
+    board = game.board
+    while game.game_status() == "ongoing" and len(board.history) <= max_plies:
+        pieces = [divmod(square, 8) for square in board.piece_squares[COLOR_CODES[game.turn]]]
+        rng.shuffle(pieces)
+        for row, col in pieces:
+            targets = [(to_row, to_col) for to_row in range(8) for to_col in range(8)]
+            rng.shuffle(targets)
+            if any(game.make_move(row, col, to_row, to_col) for to_row, to_col in targets):
+                break
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play random headless games and report where their time goes.")
+    parser.add_argument("--games", type=int, default=3, help="how many games to play")
+    parser.add_argument("--max-plies", type=int, default=200, help="stop a game after this many moves")
+    parser.add_argument("--seed", type=int, default=1, help="seed the random moves")
+    parser.add_argument("--json", help="write the statistics to this file as JSON")
+    parser.add_argument("--profile", help="also run under cProfile and save its statistics to this file")
+    parser.add_argument("--flamegraph", help="also sample the call stacks and save them folded to this file")
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+    instrumentation = Instrumentation()
+    def play():
+        for _ in range(args.games):
+            game = instrumentation.attach(ChessGame())
+            play_random_game(game, rng, args.max_plies)
+            instrumentation.detach(game)
+    run_profiled(play, args.profile, args.flamegraph)
+    print(instrumentation.summary())
+    if args.json:
+        instrumentation.write_json(args.json)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+This module measures the game server in server.py by
+playing many games against it at once. It opens a
+number of connections, and on each one plays games
+one after another until the total has been played,
+choosing every move at random from the legal moves
+the server sends back. The games may have the server's
+engine play one side. Every request is timed from the
+moment it is sent until its reply arrives, and at the
+end the games and moves per second and the 50th, 90th,
+99th percentile and slowest latencies are printed for
+move requests and for all requests. Run it against a
+running server with
+
+    python3 loadgen.py --connections 200 --games 1000
+    python3 loadgen.py --connections 50 --games 200 --engine black --depth 1
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+"""
+This function returns the value below which the given
+percent of the sorted values lie, by the nearest rank.
+"""
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, int(round(percent / 100.0 * len(values))) - 1))
+    return values[rank]
+
+"""
+This code defines the Connection class, one client connection
+to the server. request sends a request, waits for its reply,
+and records how long it took under the request's op.
+"""
+class Connection:
+    def __init__(self, reader, writer, latencies):
+        self.reader = reader
+        self.writer = writer
+        self.latencies = latencies
+
+    async def request(self, **request):
+        start = time.perf_counter()
+        self.writer.write((json.dumps(request) + "\n").encode())
+        await self.writer.drain()
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("the server closed the connection")
+        self.latencies.setdefault(request["op"], []).append(time.perf_counter() - start)
+        reply = json.loads(line)
+        if "error" in reply:
+            raise RuntimeError("server error: %s" % reply["error"])
+        return reply
+
+    def close(self):
+        self.writer.close()
+
+"""
+This function plays one game on a connection with random
+moves, at most max_plies of them, and returns the number of
+moves the client made.
+"""
+async def play_game(connection, rng, max_plies, engine, depth):
+    request = {"op": "new", "legal": True}
+    if engine is not None:
+        request["engine"] = engine
+        request["depth"] = depth
+    state = await connection.request(**request)
+    moves = 0
+    while state["status"] == "ongoing" and state["moves"] < max_plies and state["legal"]:
+        state = await connection.request(op="move", game=state["game"], move=rng.choice(state["legal"]), legal=True)
+        moves += 1
+    await connection.request(op="close", game=state["game"])
+    return moves
+
+"""
+This function runs the whole test: connections clients that
+each play games until games have been started in all. It
+returns the games played, the moves made, the seconds taken
+and the latencies of each op.
+"""
+async def run_load(host, port, connections, games, max_plies, engine=None, depth=1, seed=None):
+    latencies = {}
+    remaining = [games]
+    totals = {"games": 0, "moves": 0}
+    async def client(number):
+        reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+        connection = Connection(reader, writer, latencies)
+        rng = random.Random(None if seed is None else seed + number)
+        try:
+            while remaining[0] > 0:
+                remaining[0] -= 1
+                moves = await play_game(connection, rng, max_plies, engine, depth)
+                totals["moves"] += moves
+                totals["games"] += 1
+        finally:
+            connection.close()
+    start = time.perf_counter()
+    await asyncio.gather(*[client(number) for number in range(connections)])
+    return totals["games"], totals["moves"], time.perf_counter() - start, latencies
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play many random games against server.py and report its speed.")
+    parser.add_argument("--host", default="127.0.0.1", help="the server's address")
+    parser.add_argument("--port", type=int, default=8765, help="the server's port")
+    parser.add_argument("--connections", type=int, default=100, help="how many clients play at once")
+    parser.add_argument("--games", type=int, default=500, help="how many games to play in all")
+    parser.add_argument("--max-plies", type=int, default=200, help="stop a game once this many moves have been played")
+    parser.add_argument("--engine", choices=("white", "black"), help="let the server's engine play this color")
+    parser.add_argument("--depth", type=int, default=1, help="how deep the server's engine searches")
+    parser.add_argument("--seed", type=int, help="seed the random moves, to repeat a run")
+    args = parser.parse_args(argv)
+    try:
+        games, moves, seconds, latencies = asyncio.run(run_load(args.host, args.port, args.connections, args.games, args.max_plies, args.engine, args.depth, args.seed))
+    except (OSError, RuntimeError) as error:
+        print(error, file=sys.stderr)
+        return 1
+    print("%d games  %d moves  %.2fs  %.1f games/s  %.1f moves/s" % (games, moves, seconds, games / seconds, moves / seconds))
+    every = sorted(value for values in latencies.values() for value in values)
+    for name, values in (("move", sorted(latencies.get("move", []))), ("all", every)):
+        print("%-5s latency ms  p50 %.2f  p90 %.2f  p99 %.2f  max %.2f  (%d requests)" % (
+            name, 1000 * percentile(values, 50), 1000 * percentile(values, 90), 1000 * percentile(values, 99), 1000 * (values[-1] if values else 0.0), len(values)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,367 @@
+"""
+This module solves mate puzzles: it finds the shortest
+forced mate from a position, or proves there is none
+within a number of moves. Instead of the alpha-beta
+search of search.py, which scores every line, it uses
+depth-first proof-number search (df-pn), which only
+asks whether the side to move can force mate. Every
+position has a proof number, how many positions at
+least must still be shown to be mates to prove it, and
+a disproof number, how many must be shown not to be
+to disprove it. The search always goes on with the
+move that looks cheapest to settle, so it heads
+straight for forcing lines: checks, and positions
+where the defender has few replies. The numbers found
+are kept in a transposition table keyed by the
+position's Zobrist key and the plies left, so a
+position reached again by another order of moves is
+not searched again. A budget of nodes stops a search
+that takes too long, whose answer is then unknown.
+
+Checkmate and check are decided by the rules of
+ChessGame in rules.py, with is_checkmate and
+is_in_check. A mate in n moves is looked for with
+n = 1, 2 and so on, so the first mate found is the
+shortest, and its line has the defender always
+choosing the reply that puts mate off longest. Run it
+with
+
+    python3 mate.py --fen "<fen>" --moves 3
+    python3 mate.py puzzles.epd --moves 5 --nodes 200000
+
+A puzzle file has a FEN or EPD position on each line,
+and may give the length of its mate after it as
+"dm 3" or "; 3", in which case the mate is looked for
+up to that length. The solve rate and nodes searched
+a second are printed at the end.
+"""
+import argparse
+import sys
+import time
+
+from rules import ChessGame, ChessBoard
+from pgn import move_to_san
+
+# A proof or disproof number that can never be reached: the
+# position is settled.
+INFINITY = 1 << 30
+# How many positions the transposition table holds at most
+# before it is emptied.
+TABLE_SIZE = 1 << 20
+
+"""
+This exception is raised inside the search when the node
+budget is spent.
+"""
+class BudgetExceeded(Exception):
+    pass
+
+"""
+This class holds the answer of MateSolver.solve: status is
+"mate", "none" if there is no mate within the moves asked
+for, or "unknown" if the node budget ran out first, moves is
+the length of the mate in moves, line its moves, nodes the
+positions searched for the proof and the line together and
+seconds the time taken.
+"""
+class MateResult:
+    def __init__(self, status, moves, line, nodes, seconds):
+        self.status = status
+        self.moves = moves
+        self.line = line
+        self.nodes = nodes
+        self.seconds = seconds
+
+"""
+This code defines the MateSolver class. Its constructor takes
+the node budget of each solve, which the proof and the
+finding of its line each have in full, and the size of the
+transposition table. The table holds, for a position and the
+plies left, the pair (phi, delta): the proof and disproof
+numbers seen from the side to move, so that phi is the proof
+number when the attacker is to move and the disproof number
+when the defender is, and the search is the same at every
+node. A position whose phi is 0 is won for the side to move,
+and one whose delta is 0 is lost.
+"""
+class MateSolver:
+    def __init__(self, max_nodes=1000000, table_size=TABLE_SIZE):
+        self.max_nodes = max_nodes
+        self.table_size = table_size
+        self.table = {}
+        self.nodes = 0
+        self.attacker = None
+
+    """
+    This method looks for the shortest mate for the side to
+    move of the game, in at most max_moves moves, and returns
+    a MateResult. The game's board is left as it was.
+    """
+    def solve(self, game, max_moves):
+        start = time.perf_counter()
+        self.table = {}
+        self.nodes = 0
+        self.attacker = game.board.turn
+        for moves in range(1, max_moves + 1):
+            proved = self.prove(game, 2 * moves - 1)
+            if proved is None:
+                return MateResult("unknown", None, [], self.nodes, time.perf_counter() - start)
+            if proved:
+                proof_nodes = self.nodes
+                self.nodes = 0
+                line = self.principal_line(game, 2 * moves - 1)
+                nodes = proof_nodes + self.nodes
+                if line is None:
+                    return MateResult("unknown", None, [], nodes, time.perf_counter() - start)
+                return MateResult("mate", moves, line, nodes, time.perf_counter() - start)
+        return MateResult("none", None, [], self.nodes, time.perf_counter() - start)
+
+    """
+    This method returns True if the attacker mates within the
+    given plies from the game's position, False if not, and
+    None if the node budget ran out.
+    """
+    def prove(self, game, plies):
+        board = game.board
+        undo_depth = len(board.undo_stack)
+        try:
+            phi, delta = self.search(game, plies, INFINITY, INFINITY)
+        except BudgetExceeded:
+            while len(board.undo_stack) > undo_depth:
+                board.unmake_move()
+            return None
+        if board.turn == self.attacker:
+            return phi == 0
+        return delta == 0
+
+    """
+    This method returns (phi, delta) for a position that is
+    settled without searching its moves, given as a list if
+    there are plies left, or None. With no plies left the
+    attacker has failed unless the defender is checkmated. A
+    side with no legal move has lost if it is in check, and a
+    stalemate is a failure for the attacker.
+    """
+    def settled(self, game, plies, moves=None):
+        turn = game.board.turn
+        if plies == 0:
+            if turn != self.attacker and game.is_checkmate(turn):
+                return INFINITY, 0
+            return (INFINITY, 0) if turn == self.attacker else (0, INFINITY)
+        if not moves:
+            if turn == self.attacker or game.is_in_check(turn):
+                return INFINITY, 0
+            return 0, INFINITY
+        return None
+
+    """
+    This method is the df-pn search of a position with plies
+    left. It searches until phi reaches the threshold
+    threshold_phi or delta reaches threshold_delta, always
+    going on with the move whose position has the smallest
+    delta, and stores and returns the position's (phi,
+    delta). The move is given thresholds that make it return
+    as soon as another move would look better. The Zobrist
+    keys of the positions after each move are worked out once
+    when the position is first searched, and positions with
+    no plies left are settled then too.
+    """
+    def search(self, game, plies, threshold_phi, threshold_delta):
+        board = game.board
+        table = self.table
+        key = (board.zobrist_key, plies)
+        found = table.get(key)
+        if found is not None and (found[0] >= threshold_phi or found[1] >= threshold_delta):
+            return found
+        moves = list(board.generate_legal_moves(board.turn)) if plies > 0 else None
+        result = self.settled(game, plies, moves)
+        if result is not None:
+            table[key] = result
+            return result
+        children = []
+        for move in moves:
+            if self.nodes >= self.max_nodes:
+                raise BudgetExceeded()
+            self.nodes += 1
+            board.make_move(move)
+            child_key = (board.zobrist_key, plies - 1)
+            initial = table.get(child_key)
+            if initial is None:
+                if plies == 1:
+                    initial = table[child_key] = self.settled(game, 0)
+                elif board.turn != self.attacker:
+                    # moves that check are tried first, since they
+                    # leave the defender few replies
+                    initial = (1, 1) if game.is_in_check(board.turn) else (1, 3)
+                else:
+                    initial = (1, 1)
+            board.unmake_move()
+            children.append((move, child_key, initial))
+        while True:
+            phi = INFINITY
+            delta = 0
+            best = None
+            second = INFINITY
+            for index, (move, child_key, initial) in enumerate(children):
+                child_phi, child_delta = table.get(child_key, initial)
+                if child_delta < phi:
+                    second = phi
+                    phi = child_delta
+                    best = index
+                    best_phi = child_phi
+                elif child_delta < second:
+                    second = child_delta
+                delta = min(delta + child_phi, INFINITY)
+            if phi >= threshold_phi or delta >= threshold_delta:
+                break
+            move = children[best][0]
+            board.make_move(move)
+            self.search(game, plies - 1, threshold_delta - delta + best_phi, min(threshold_phi, second + 1))
+            board.unmake_move()
+        if len(table) >= self.table_size:
+            table.clear()
+        table[key] = (phi, delta)
+        return phi, delta
+
+    """
+    This method returns the moves of a mate within the given
+    plies from the game's position: the attacker's move of
+    the shortest mate at each turn, and the defender's reply
+    that puts the mate off longest. It returns None if the
+    node budget runs out first, rather than a line that may
+    not be the shortest or may stop short of the mate.
+    """
+    def principal_line(self, game, plies):
+        board = game.board
+        line = []
+        while plies > 0:
+            turn = board.turn
+            moves = list(board.generate_legal_moves(turn))
+            choice = None
+            proved = False
+            if turn == self.attacker:
+                for length in range(1, plies + 1, 2):
+                    for move in moves:
+                        board.make_move(move)
+                        proved = self.prove(game, length - 1)
+                        board.unmake_move()
+                        if proved is None:
+                            break
+                        if proved:
+                            choice = (move, length - 1)
+                            break
+                    if proved is None or choice is not None:
+                        break
+            else:
+                for move in moves:
+                    board.make_move(move)
+                    length = None
+                    for plies_left in range(1, plies, 2):
+                        proved = self.prove(game, plies_left)
+                        if proved is None:
+                            break
+                        if proved:
+                            length = plies_left
+                            break
+                    board.unmake_move()
+                    if length is None:
+                        choice = None
+                        break
+                    if choice is None or length > choice[1]:
+                        choice = (move, length)
+            if choice is None:
+                break
+            line.append(choice[0])
+            board.make_move(choice[0])
+            plies = choice[1]
+        for _ in line:
+            board.unmake_move()
+        if choice is None:
+            return None
+        return line
+
+"""
+This function returns the moves of a line in SAN, played
+from the board's position, which is left as it was.
+"""
+def line_san(board, line):
+    names = []
+    for move in line:
+        names.append(move_to_san(board, move))
+        board.make_move(move)
+    for _ in line:
+        board.unmake_move()
+    return names
+
+"""
+This function reads a puzzle line: a FEN or EPD position,
+optionally followed by the length of its mate as "dm n" or
+after a ;. It returns the FEN and the length, or None.
+"""
+def parse_puzzle(line):
+    text, _, rest = line.partition(";")
+    tokens = text.split()
+    fields = tokens[:4]
+    index = 4
+    while index < min(len(tokens), 6) and tokens[index].isdigit():
+        fields.append(tokens[index])
+        index += 1
+    operations = tokens[index:] + rest.replace(";", " ").split()
+    length = None
+    if "dm" in operations[:-1]:
+        length = int(operations[operations.index("dm") + 1])
+    elif operations and operations[0].isdigit():
+        length = int(operations[0])
+    return " ".join(fields), length
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the shortest forced mate with proof-number search.")
+    parser.add_argument("puzzles", nargs="?", help="a file of puzzles, one FEN or EPD position per line")
+    parser.add_argument("--fen", help="solve this position")
+    parser.add_argument("--moves", type=int, default=3, help="look for a mate in at most this many moves")
+    parser.add_argument("--nodes", type=int, default=1000000, help="give up on a puzzle after searching this many positions")
+    args = parser.parse_args(argv)
+    if (args.fen is None) == (args.puzzles is None):
+        parser.error("give a puzzle file or --fen")
+    if args.fen is not None:
+        puzzles = [(1, args.fen, None)]
+    else:
+        puzzles = []
+        with open(args.puzzles) as stream:
+            for number, line in enumerate(stream, 1):
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    fen, length = parse_puzzle(line)
+                    puzzles.append((number, fen, length))
+    solver = MateSolver(args.nodes)
+    counts = {"mate": 0, "none": 0, "unknown": 0, "shorter": 0, "errors": 0}
+    solved = 0
+    nodes = 0
+    seconds = 0.0
+    for number, fen, length in puzzles:
+        board = ChessBoard()
+        try:
+            board.load_fen(fen)
+        except (ValueError, IndexError, KeyError):
+            counts["errors"] += 1
+            print("%d: cannot read FEN %s" % (number, fen))
+            continue
+        result = solver.solve(ChessGame(board), length or args.moves)
+        nodes += result.nodes
+        seconds += result.seconds
+        counts[result.status] += 1
+        if result.status == "mate":
+            solved += 1
+            if length is not None and result.moves < length:
+                counts["shorter"] += 1
+            print("%d: mate in %d: %s  (%d nodes, %.2fs)" % (number, result.moves, " ".join(line_san(board, result.line)), result.nodes, result.seconds))
+        else:
+            print("%d: %s within %d moves  (%d nodes, %.2fs)" % (number, "no mate" if result.status == "none" else "unknown", length or args.moves, result.nodes, result.seconds))
+    total = len(puzzles)
+    print("solved %d of %d (%.1f%%), %d with a shorter mate than given, %d without a mate, %d unknown, %d unreadable" % (
+        solved, total, 100.0 * solved / total if total else 0.0, counts["shorter"], counts["none"], counts["unknown"], counts["errors"]))
+    print("%d nodes in %.2fs, %.0f nodes/s" % (nodes, seconds, nodes / seconds if seconds > 0 else 0.0))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,482 @@
+"""
+This module scores positions with a small neural
+network in the style of NNUE (an efficiently updatable
+neural network). Its input is one feature for each
+piece on each square, 768 in all, seen from each
+side: a side's own pieces are features 0 to 383 and
+the enemy's 384 to 767, with the board turned over
+for black so that both sides see their pieces moving
+up the board. The first layer adds up a column of
+weights for each feature that is on, giving an
+accumulator of hidden values for each side. A move
+only turns a few features on or off, so instead of
+adding up every column again at each node of the
+search, the NNUEChessBoard class adds or takes away
+just the columns of the piece placed or removed in
+its place_piece and remove_piece, which make_move and
+unmake_move go through, so taking a move back undoes
+its change to the accumulators too. The score is the
+accumulator of the side to move followed by the
+other side's, each value clipped to between 0 and
+the network's ceiling, multiplied by the output
+weights.
+
+Every weight is an integer, the first layer's int16,
+so the score is worked out exactly the same way with
+plain Python lists or, when NumPy is installed, with
+int32 arrays that are added in place, which hold the
+sum of the columns of every piece without wrapping. The weights are
+kept in a file made by
+
+    python3 nnue.py init weights.nnue --hidden 32
+    python3 nnue.py train weights.nnue results.jsonl --epochs 20
+
+init makes a network that gives the same scores as
+evaluation.py, through the first hidden value of
+each side, with the other hidden values small and
+random and not yet used, and train fits the network
+to the scores of an analyze.py results file with
+NumPy. To search with it, play on an NNUEChessBoard
+and give the Engine this module's evaluate. Run
+
+    python3 nnue.py bench weights.nnue
+
+to count the evaluations a second with the
+accumulators kept up move by move, and with them
+added up again from every piece, in both ways.
+"""
+import argparse
+import array
+import json
+import random
+import struct
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from rules import ChessBoard, COLOR_CODES, KIND_MASK, KING, WHITE, BLACK
+from evaluation import CODE_SQUARE_TABLES
+
+# A weights file starts with MAGIC and HEADER: the number of
+# hidden values, the ceiling they are clipped to and the
+# number the output is divided by to give centipawns. Then
+# come the first layer's weights, FEATURES columns of hidden
+# int16 values, its hidden int16 biases, the 2 * hidden int32
+# output weights and the int32 output bias, all little-endian.
+MAGIC = b"CNN1"
+HEADER = struct.Struct("<4sHHi")
+FEATURES = 768
+# What a trained network's output is divided by.
+OUTPUT_DIVISOR = 1024
+
+"""
+This function returns the feature of a piece code on a square
+seen from the side perspective, WHITE or BLACK.
+"""
+def feature(perspective, code, square):
+    enemy = 0 if (code & BLACK) == perspective else 6
+    if perspective == BLACK:
+        square ^= 56
+    return (enemy + (code & KIND_MASK) - 1) * 64 + square
+
+# The feature of every piece code on every square, from each
+# side.
+FEATURE_INDEX = {perspective: [[feature(perspective, code, square) for square in range(64)] if 0 < code & KIND_MASK <= KING else None for code in range(16)]
+                 for perspective in (WHITE, BLACK)}
+
+"""
+This function returns a list of the little-endian values of
+the given array typecode read from data at offset, and the
+offset after them.
+"""
+def read_values(data, offset, typecode, count):
+    values = array.array(typecode)
+    size = values.itemsize * count
+    values.frombytes(data[offset:offset + size])
+    if sys.byteorder != "little":
+        values.byteswap()
+    if len(values) != count:
+        raise ValueError("the weights file is too short")
+    return values.tolist(), offset + size
+
+def write_values(stream, typecode, values):
+    values = array.array(typecode, values)
+    if sys.byteorder != "little":
+        values.byteswap()
+    stream.write(values.tobytes())
+
+"""
+This code defines the Network class, which holds the weights
+of a network and works out its accumulators and score. With
+use_numpy, the default when NumPy is installed, the
+accumulators of both sides are the two rows of one int32
+array, WHITE's first, and the columns of a piece on a square
+for both sides are kept stacked the same way, so adding a
+piece is one addition in place; otherwise the accumulators
+are a dictionary of a list for WHITE and BLACK. add and
+subtract change the accumulators for one piece, refresh adds
+them up from every piece of a board, and score gives the
+score of the accumulators from one side.
+"""
+class Network:
+    def __init__(self, hidden, ceiling, divisor, columns, biases, output_weights, output_bias, use_numpy=None):
+        if use_numpy is None:
+            use_numpy = np is not None
+        if use_numpy and np is None:
+            raise ImportError("the NumPy path needs NumPy, which can be installed with pip install numpy")
+        self.hidden = hidden
+        self.ceiling = ceiling
+        self.divisor = divisor
+        self.output_bias = output_bias
+        self.use_numpy = use_numpy
+        self.columns = [columns[index * hidden:(index + 1) * hidden] for index in range(FEATURES)]
+        self.biases = list(biases)
+        self.own_weights = list(output_weights[:hidden])
+        self.enemy_weights = list(output_weights[hidden:])
+        if use_numpy:
+            matrix = np.array(columns, dtype=np.int32).reshape(FEATURES, hidden)
+            self.matrix = matrix
+            self.bias_rows = np.array([biases, biases], dtype=np.int32)
+            self.pairs = [None if FEATURE_INDEX[WHITE][code] is None else
+                          [np.stack([matrix[FEATURE_INDEX[WHITE][code][square]], matrix[FEATURE_INDEX[BLACK][code][square]]]) for square in range(64)]
+                          for code in range(16)]
+            own = np.array(self.own_weights, dtype=np.int64)
+            enemy = np.array(self.enemy_weights, dtype=np.int64)
+            self.output_rows = {WHITE: np.stack([own, enemy]), BLACK: np.stack([enemy, own])}
+
+    """
+    This method reads a network from a weights file, raising
+    a ValueError if it is not one.
+    """
+    @classmethod
+    def load(cls, path, use_numpy=None):
+        with open(path, "rb") as stream:
+            data = stream.read()
+        if len(data) < HEADER.size:
+            raise ValueError("%s is not a weights file" % path)
+        magic, hidden, ceiling, divisor = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or hidden == 0 or divisor == 0:
+            raise ValueError("%s is not a weights file" % path)
+        offset = HEADER.size
+        columns, offset = read_values(data, offset, "h", FEATURES * hidden)
+        biases, offset = read_values(data, offset, "h", hidden)
+        output_weights, offset = read_values(data, offset, "i", 2 * hidden)
+        (output_bias,), offset = read_values(data, offset, "i", 1)
+        return cls(hidden, ceiling, divisor, columns, biases, output_weights, output_bias, use_numpy)
+
+    """
+    This method makes a network that scores every position
+    as evaluate in evaluation.py does, as long as the score
+    is within half the ceiling. The first hidden value of
+    each side holds half the ceiling plus the piece-square
+    score from that side, its own output weight is 1 and the
+    enemy's -1, so the output is twice the score. The other
+    hidden values get small random weights and no output
+    weight, so they change nothing until the network is
+    trained.
+    """
+    @classmethod
+    def from_evaluation(cls, hidden=32, ceiling=8191, seed=1, use_numpy=None):
+        rng = random.Random(seed)
+        columns = []
+        for index in range(FEATURES):
+            piece, square = divmod(index, 64)
+            kind = piece % 6 + 1
+            # the enemy's pieces stand on the board turned over
+            columns.append(CODE_SQUARE_TABLES[kind][square] if piece < 6 else -CODE_SQUARE_TABLES[kind][square ^ 56])
+            columns.extend(rng.randint(-8, 8) for _ in range(hidden - 1))
+        biases = [ceiling // 2] + [ceiling // 4] * (hidden - 1)
+        output_weights = [1] + [0] * (hidden - 1) + [-1] + [0] * (hidden - 1)
+        return cls(hidden, ceiling, 2, columns, biases, output_weights, 0, use_numpy)
+
+    def weights(self):
+        return [weight for column in self.columns for weight in column], list(self.biases), self.own_weights + self.enemy_weights
+
+    def save(self, path):
+        columns, biases, output_weights = self.weights()
+        with open(path, "wb") as stream:
+            stream.write(HEADER.pack(MAGIC, self.hidden, self.ceiling, self.divisor))
+            write_values(stream, "h", columns)
+            write_values(stream, "h", biases)
+            write_values(stream, "i", output_weights)
+            write_values(stream, "i", [self.output_bias])
+
+    """
+    These methods add the columns of a piece code on a square
+    to the accumulators of both sides, or take them away. The
+    NumPy array is changed in place; the lists are replaced.
+    """
+    def add(self, accumulators, code, square):
+        if self.use_numpy:
+            accumulators += self.pairs[code][square]
+            return
+        for perspective in (WHITE, BLACK):
+            column = self.columns[FEATURE_INDEX[perspective][code][square]]
+            accumulators[perspective] = [value + weight for value, weight in zip(accumulators[perspective], column)]
+
+    def subtract(self, accumulators, code, square):
+        if self.use_numpy:
+            accumulators -= self.pairs[code][square]
+            return
+        for perspective in (WHITE, BLACK):
+            column = self.columns[FEATURE_INDEX[perspective][code][square]]
+            accumulators[perspective] = [value - weight for value, weight in zip(accumulators[perspective], column)]
+
+    """
+    This method returns the accumulators of both sides added
+    up from the biases and every piece of the board.
+    """
+    def refresh(self, board):
+        squares = board.squares
+        pieces = [(squares[square], square) for side in (WHITE, BLACK) for square in board.piece_squares[side]]
+        if self.use_numpy:
+            features = [[FEATURE_INDEX[perspective][code][square] for code, square in pieces] for perspective in (WHITE, BLACK)]
+            return self.bias_rows + self.matrix[features].sum(axis=1, dtype=np.int32)
+        accumulators = {}
+        for perspective in (WHITE, BLACK):
+            values = self.biases
+            for code, square in pieces:
+                values = [value + weight for value, weight in zip(values, self.columns[FEATURE_INDEX[perspective][code][square]])]
+            accumulators[perspective] = values
+        return accumulators
+
+    """
+    This method returns the score in centipawns from the side
+    of the accumulators, WHITE or BLACK: the side's own
+    accumulator and then the other side's, clipped, times the
+    output weights.
+    """
+    def score(self, accumulators, side):
+        ceiling = self.ceiling
+        if self.use_numpy:
+            total = int(np.vdot(np.clip(accumulators, 0, ceiling), self.output_rows[side]))
+        else:
+            total = 0
+            for values, weights in ((accumulators[side], self.own_weights), (accumulators[side ^ BLACK], self.enemy_weights)):
+                for value, weight in zip(values, weights):
+                    if value > 0:
+                        total += (value if value < ceiling else ceiling) * weight
+        return (total + self.output_bias) // self.divisor
+
+# The network an NNUEChessBoard made without one uses, made
+# from the piece-square tables when it is first needed.
+default_network = None
+
+"""
+This code defines the NNUEChessBoard class, a ChessBoard that
+keeps the accumulators of its network up to date as pieces
+are placed and removed. They are added up from every piece
+when the board is populated or loaded from a FEN. With no
+network the board uses one made by Network.from_evaluation.
+"""
+class NNUEChessBoard(ChessBoard):
+    def __init__(self, network=None):
+        global default_network
+        if network is None:
+            if default_network is None:
+                default_network = Network.from_evaluation()
+            network = default_network
+        self.network = network
+        self.accumulators = None
+        ChessBoard.__init__(self)
+
+    def populate_board(self):
+        ChessBoard.populate_board(self)
+        self.load_squares()
+        self.accumulators = self.network.refresh(self)
+
+    def load_fen(self, fen):
+        ChessBoard.load_fen(self, fen)
+        self.accumulators = self.network.refresh(self)
+
+    def place_piece(self, piece, row, col):
+        ChessBoard.place_piece(self, piece, row, col)
+        self.network.add(self.accumulators, piece.code, row * 8 + col)
+
+    def remove_piece(self, row, col):
+        piece = ChessBoard.remove_piece(self, row, col)
+        self.network.subtract(self.accumulators, piece.code, row * 8 + col)
+        return piece
+
+"""
+This function returns the network's score of an
+NNUEChessBoard's position from the side to move, and can be
+given to the Engine in place of evaluation.evaluate.
+"""
+def evaluate(board):
+    return board.network.score(board.accumulators, COLOR_CODES[board.turn])
+
+"""
+This function fits the network to positions scored from the
+side to move, with NumPy in floating point, and returns a new
+network with the weights rounded back to integers. The scores
+are compared through a logistic curve, so that a few pawns
+more or less in a won position count for little, and the
+weights are moved with the Adam method one batch at a time,
+the output weights by steps a ceiling's worth smaller, since
+each multiplies a hidden value of up to the ceiling. The
+trained network divides its output by OUTPUT_DIVISOR, so that
+the output weights keep their fractions when rounded.
+"""
+def train(network, positions, epochs=10, batch_size=256, rate=0.5, log=None):
+    if np is None:
+        raise ImportError("training needs NumPy, which can be installed with pip install numpy")
+    hidden = network.hidden
+    columns, biases, output_weights = network.weights()
+    parameters = {"columns": np.array(columns, dtype=np.float64).reshape(FEATURES, hidden), "biases": np.array(biases, dtype=np.float64),
+                  "output": np.array(output_weights, dtype=np.float64), "bias": np.array([network.output_bias], dtype=np.float64)}
+    moments = {name: [np.zeros_like(value), np.zeros_like(value)] for name, value in parameters.items()}
+    # the features that are on in each position, from the side to
+    # move and the other side, as 0/1 rows
+    own = np.zeros((len(positions), FEATURES))
+    enemy = np.zeros((len(positions), FEATURES))
+    targets = np.zeros(len(positions))
+    for row, (board, score) in enumerate(positions):
+        side = COLOR_CODES[board.turn]
+        for color in (WHITE, BLACK):
+            for square in board.piece_squares[color]:
+                code = board.squares[square]
+                own[row, FEATURE_INDEX[side][code][square]] = 1
+                enemy[row, FEATURE_INDEX[side ^ BLACK][code][square]] = 1
+        targets[row] = score
+    ceiling = network.ceiling
+    divisor = network.divisor
+    step = 0
+    for epoch in range(epochs):
+        order = np.random.permutation(len(positions))
+        total_loss = 0.0
+        for start in range(0, len(positions), batch_size):
+            rows = order[start:start + batch_size]
+            p = parameters
+            own_sums = own[rows] @ p["columns"] + p["biases"]
+            enemy_sums = enemy[rows] @ p["columns"] + p["biases"]
+            own_values = np.clip(own_sums, 0, ceiling)
+            enemy_values = np.clip(enemy_sums, 0, ceiling)
+            scores = (own_values @ p["output"][:hidden] + enemy_values @ p["output"][hidden:] + p["bias"][0]) / divisor
+            predicted = 1 / (1 + np.exp(-scores / 400))
+            expected = 1 / (1 + np.exp(-targets[rows] / 400))
+            total_loss += float(((predicted - expected) ** 2).sum())
+            # the gradient of the mean squared error back through the
+            # curve, the output layer and the clipping
+            error = 2 * (predicted - expected) * predicted * (1 - predicted) / 400 / divisor / len(rows)
+            own_error = np.outer(error, p["output"][:hidden]) * ((own_sums > 0) & (own_sums < ceiling))
+            enemy_error = np.outer(error, p["output"][hidden:]) * ((enemy_sums > 0) & (enemy_sums < ceiling))
+            gradients = {"columns": own[rows].T @ own_error + enemy[rows].T @ enemy_error, "biases": own_error.sum(axis=0) + enemy_error.sum(axis=0),
+                         "output": np.concatenate([error @ own_values, error @ enemy_values]), "bias": np.array([error.sum()])}
+            step += 1
+            for name, gradient in gradients.items():
+                size = rate / ceiling if name == "output" else rate
+                first, second = moments[name]
+                first *= 0.9
+                first += 0.1 * gradient
+                second *= 0.999
+                second += 0.001 * gradient * gradient
+                parameters[name] -= size * (first / (1 - 0.9 ** step)) / (np.sqrt(second / (1 - 0.999 ** step)) + 1e-8)
+        if log is not None:
+            log("epoch %d loss %.6f" % (epoch + 1, total_loss / len(positions)))
+    limit = np.iinfo(np.int16)
+    columns = np.clip(np.rint(parameters["columns"]), limit.min, limit.max).astype(int).reshape(-1).tolist()
+    biases = np.clip(np.rint(parameters["biases"]), limit.min, limit.max).astype(int).tolist()
+    scale = OUTPUT_DIVISOR / divisor
+    output_weights = np.rint(parameters["output"] * scale).astype(int).tolist()
+    output_bias = int(round(parameters["bias"][0] * scale))
+    return Network(hidden, ceiling, OUTPUT_DIVISOR, columns, biases, output_weights, output_bias, network.use_numpy)
+
+"""
+This function reads the positions and scores of an analyze.py
+results file, leaving out positions it could not read or did
+not score, and mate scores, which are no use for training.
+"""
+def read_results(path, network):
+    positions = []
+    with open(path) as stream:
+        for line in stream:
+            record = json.loads(line)
+            if "score" not in record or abs(record["score"]) >= 10000:
+                continue
+            board = NNUEChessBoard(network)
+            board.load_fen(record["fen"])
+            positions.append((board, record["score"]))
+    return positions
+
+"""
+This function measures how many positions a second the
+network scores on boards, each reached by random moves from
+the starting position: with the accumulators kept up to date
+by every move and taken back with it, and with them added up
+again from every piece at each position. It returns the two
+rates.
+"""
+def benchmark(network, positions=200, seed=1):
+    rng = random.Random(seed)
+    boards = []
+    while len(boards) < positions:
+        board = NNUEChessBoard(network)
+        for _ in range(rng.randrange(60)):
+            moves = list(board.generate_legal_moves(board.turn))
+            if not moves:
+                break
+            board.make_move(rng.choice(moves))
+        boards.append((board, list(board.generate_legal_moves(board.turn))))
+    count = sum(len(moves) for board, moves in boards)
+    start = time.perf_counter()
+    for board, moves in boards:
+        for move in moves:
+            board.make_move(move)
+            evaluate(board)
+            board.unmake_move()
+    incremental = count / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for board, moves in boards:
+        for move in moves:
+            board.make_move(move)
+            network.score(network.refresh(board), COLOR_CODES[board.turn])
+            board.unmake_move()
+    full = count / (time.perf_counter() - start)
+    return incremental, full
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Make, train and measure the NNUE evaluation's networks.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    init = commands.add_parser("init", help="make a network that scores like evaluation.py")
+    init.add_argument("weights", help="the weights file to write")
+    init.add_argument("--hidden", type=int, default=32, help="how many hidden values each side has")
+    init.add_argument("--seed", type=int, default=1, help="seed the unused weights")
+    fit = commands.add_parser("train", help="fit a network to the scores of an analyze.py results file")
+    fit.add_argument("weights", help="the weights file to read and write back")
+    fit.add_argument("results", help="the JSON lines written by analyze.py")
+    fit.add_argument("--epochs", type=int, default=10, help="how many times to go through the positions")
+    fit.add_argument("--rate", type=float, default=0.5, help="the learning rate")
+    fit.add_argument("--output", help="write the trained network here instead")
+    bench = commands.add_parser("bench", help="count evaluations a second, kept up move by move and added up again")
+    bench.add_argument("weights", nargs="?", help="the weights file; the network of evaluation.py if not given")
+    bench.add_argument("--positions", type=int, default=200, help="how many random positions to score every move of")
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "init":
+            Network.from_evaluation(args.hidden, seed=args.seed).save(args.weights)
+            return 0
+        if args.command == "train":
+            network = Network.load(args.weights)
+            positions = read_results(args.results, network)
+            if not positions:
+                print("no scored positions in %s" % args.results, file=sys.stderr)
+                return 1
+            train(network, positions, args.epochs, rate=args.rate, log=print).save(args.output or args.weights)
+            return 0
+        ways = [("lists", False)] + ([("numpy int32", True)] if np is not None else [])
+        for name, use_numpy in ways:
+            network = Network.load(args.weights, use_numpy) if args.weights else Network.from_evaluation(use_numpy=use_numpy)
+            incremental, full = benchmark(network, args.positions)
+            print("%-12s incremental %8.0f evaluations/s  full %8.0f evaluations/s  %.1fx" % (name, incremental, full, incremental / full))
+        return 0
+    except (OSError, ValueError, ImportError) as error:
+        print(error, file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
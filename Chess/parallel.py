@@ -0,0 +1,205 @@
+"""
+This module searches with more than one processor
+core. Python runs only one thread of Python code at a
+time, so the work is shared between processes instead.
+The ParallelEngine class splits the moves of the root
+position between its worker processes, each of which
+runs the Engine from search.py with iterative
+deepening on its own share of the moves for the whole
+time limit. With fewer moves each, the workers reach
+a greater depth in the same time than one process
+searching all of them. The results are then joined
+at the deepest depth every worker finished, and the
+best move found at that depth is played. Each worker
+keeps its own Engine, and so its own transposition
+table, from one move to the next. Run it with
+
+    python3 parallel.py --workers 4 --time 2
+    python3 parallel.py --check --time 2
+
+where --check searches every position in CHECK_POSITIONS
+with one process and then with the workers for the same
+time, and exits with an error if the parallel search
+finished a shallower depth than the single one.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from rules import ChessBoard, STARTING_FEN
+from pgn import move_to_san
+from search import Engine, SearchResult, MAX_PLY, MATE_THRESHOLD
+from tablebase import Tablebases
+
+# The positions --check searches, by name.
+CHECK_POSITIONS = [
+    ("start", STARTING_FEN),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"),
+]
+
+# The Engine of a worker process, made when the process starts.
+worker_engine = None
+
+def start_worker(hash_mb, tablebase_directory):
+    global worker_engine
+    tablebases = Tablebases(tablebase_directory) if tablebase_directory else None
+    worker_engine = Engine(hash_mb, tablebases=tablebases)
+
+"""
+This function runs in a worker process. It searches the
+given root moves of the board and returns a dictionary with
+the process id, the best score and move of every depth it
+finished, and how many nodes it searched in how long. A
+worker whose time ran out before it finished depth 1 still
+finishes it without a time limit, since the results are
+joined at a depth every worker finished.
+"""
+def search_share(board, root_moves, time_limit, max_depth):
+    depths = {}
+    def record(result):
+        depths[result.depth] = (result.score, result.move, result.pv)
+    result = worker_engine.search(board, time_limit, max_depth, callback=record, root_moves=root_moves)
+    nodes, seconds = result.nodes, result.seconds
+    if not depths:
+        result = worker_engine.search(board, None, 1, callback=record, root_moves=root_moves)
+        nodes += result.nodes
+        seconds += result.seconds
+    return {"pid": os.getpid(), "moves": len(root_moves), "depths": depths, "nodes": nodes, "seconds": seconds}
+
+"""
+This class holds the result of a parallel search. It has
+everything a SearchResult has, with the nodes of all the
+workers added up, and a list of the statistics of each
+worker: its share of root moves, the deepest depth it
+finished, its nodes, its seconds and its nodes per second.
+"""
+class ParallelSearchResult(SearchResult):
+    def __init__(self, move, score, depth, nodes, seconds, pv, workers):
+        SearchResult.__init__(self, move, score, depth, nodes, seconds, pv)
+        self.workers = workers
+
+"""
+This code defines the ParallelEngine class. Its constructor
+takes the number of worker processes, which defaults to the
+number of cores, and the transposition table size in
+megabytes of each worker, an optional OpeningBook whose
+moves play_move plays without searching, and optional
+Tablebases, which each worker opens again from their
+directory. The pool of processes is started
+the first time it is needed and kept until close is called,
+so that its cost is paid only once. The search and play_move
+methods work like those of the Engine class.
+"""
+class ParallelEngine:
+    def __init__(self, workers=None, hash_mb=16, book=None, tablebases=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.hash_mb = hash_mb
+        self.tablebases = tablebases
+        self.pool = None
+        # orders the root moves, searches alone when there is one
+        # move, and looks up the book and the tablebases
+        self.order_engine = Engine(hash_mb, book=book, tablebases=tablebases)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    """
+    This method searches the position on the board for
+    time_limit seconds with all the workers and returns a
+    ParallelSearchResult. The root moves are sorted with the
+    Engine's move ordering and dealt out in turn, so that
+    every worker gets some of the likely best moves.
+    """
+    def search(self, board, time_limit=1.0, max_depth=MAX_PLY):
+        start = time.perf_counter()
+        moves = list(board.generate_legal_moves(board.turn))
+        workers = min(self.workers, len(moves))
+        if workers <= 1:
+            result = self.order_engine.search(board, time_limit, max_depth)
+            return ParallelSearchResult(result.move, result.score, result.depth, result.nodes, result.seconds, result.pv,
+                                        [{"moves": len(moves), "depth": result.depth, "nodes": result.nodes, "seconds": result.seconds, "nodes_per_second": result.nodes / result.seconds if result.seconds > 0 else 0.0}])
+        if self.pool is None:
+            directory = self.tablebases.directory if self.tablebases is not None else None
+            self.pool = ProcessPoolExecutor(self.workers, initializer=start_worker, initargs=(self.hash_mb, directory))
+        moves.sort(key=lambda move: self.order_engine.move_order_score(board, move, None, 0), reverse=True)
+        shares = [moves[i::workers] for i in range(workers)]
+        futures = [self.pool.submit(search_share, board, share, time_limit, max_depth) for share in shares]
+        reports = [future.result() for future in futures]
+        # join the workers at the deepest depth all of them finished;
+        # a worker that stopped early on a mate score has settled its
+        # moves, and its last depth stands for any deeper one
+        unsettled = [max(report["depths"]) for report in reports if abs(report["depths"][max(report["depths"])][0]) <= MATE_THRESHOLD]
+        common_depth = min(unsettled) if unsettled else max(max(report["depths"]) for report in reports)
+        best = None
+        for report in reports:
+            depth = max(depth for depth in report["depths"] if depth <= common_depth)
+            score, move, pv = report["depths"][depth]
+            if best is None or score > best[0]:
+                best = (score, move, pv)
+        worker_stats = []
+        for report in reports:
+            worker_stats.append({"pid": report["pid"], "moves": report["moves"], "depth": max(report["depths"]), "nodes": report["nodes"], "seconds": report["seconds"],
+                                 "nodes_per_second": report["nodes"] / report["seconds"] if report["seconds"] > 0 else 0.0})
+        nodes = sum(report["nodes"] for report in reports)
+        return ParallelSearchResult(best[1], best[0], common_depth, nodes, time.perf_counter() - start, best[2], worker_stats)
+
+    def play_move(self, game, time_limit=1.0, max_depth=MAX_PLY):
+        result = self.order_engine.book_result(game.board) or self.order_engine.tablebase_result(game.board)
+        if result is None:
+            result = self.search(game.board, time_limit, max_depth)
+        if result.move is not None:
+            from_row, from_col, to_row, to_col, promotion = result.move
+            game.make_move(from_row, from_col, to_row, to_col, promotion)
+        return result
+
+"""
+This function searches each position of CHECK_POSITIONS for
+time_limit seconds with a single Engine and with the
+ParallelEngine, prints the depth each finished, and returns
+True if the parallel depth was never the shallower. The time
+limit is the same wall-clock time for every worker, so the
+check is only fair with a core for each worker.
+"""
+def check_depths(engine, time_limit):
+    if engine.workers > (os.cpu_count() or 1):
+        print("note: %d workers share %d cores" % (engine.workers, os.cpu_count() or 1))
+    passed = True
+    for name, fen in CHECK_POSITIONS:
+        board = ChessBoard()
+        board.load_fen(fen)
+        depths = []
+        Engine(engine.hash_mb).search(board, time_limit, callback=lambda result: depths.append(result.depth))
+        serial_depth = max(depths, default=0)
+        parallel_depth = engine.search(board, time_limit).depth
+        ok = parallel_depth >= serial_depth
+        passed = passed and ok
+        print("%s: serial depth %d, parallel depth %d with %d workers  %s" % (name, serial_depth, parallel_depth, engine.workers, "ok" if ok else "SHALLOWER"))
+    return passed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search a position with several worker processes.")
+    parser.add_argument("--fen", default=STARTING_FEN, help="the position to search")
+    parser.add_argument("--time", type=float, default=2.0, help="seconds to search")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--check", action="store_true", help="check the parallel depth against a single process on CHECK_POSITIONS")
+    args = parser.parse_args(argv)
+    engine = ParallelEngine(args.workers)
+    try:
+        if args.check:
+            return 0 if check_depths(engine, args.time) else 1
+        board = ChessBoard()
+        board.load_fen(args.fen)
+        result = engine.search(board, args.time)
+        print("best move %s  score %d  depth %d  nodes %d  time %.2fs" % (move_to_san(board, result.move) if result.move else "none", result.score, result.depth, result.nodes, result.seconds))
+        for worker in result.workers:
+            print("  %d moves  depth %d  %d nodes  %.0f nodes/s" % (worker["moves"], worker["depth"], worker["nodes"], worker["nodes_per_second"]))
+    finally:
+        engine.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
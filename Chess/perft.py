@@ -0,0 +1,214 @@
+"""
+This module counts the positions the move generator
+reaches, which is called perft. Starting from a
+position, every legal move is played, then every
+legal reply, and so on to a given depth, and the
+positions at the last depth are counted. Since the
+counts for many positions are published, comparing
+against them shows whether the rules are right,
+including castling, promotion, en passant and pins,
+and timing the count shows how fast the rules are.
+The divide function gives the count after each first
+move separately, which helps find which move is
+wrong when a total does not match. Run it with
+
+    python3 perft.py --depth 4
+    python3 perft.py --suite
+    python3 perft.py --legality --depth 3
+    python3 perft.py --fen "<fen>" --depth 3 --divide
+
+where --suite checks every position in PERFT_SUITE
+and exits with an error if any count is wrong,
+--legality checks along the same positions that
+ChessGame.is_legal_move, which the graphical game and
+the server move through, allows exactly the moves the
+generator makes, and --bitboard uses
+BitboardChessBoard instead of the ChessBoard.
+"""
+import argparse
+import sys
+import time
+
+from rules import ChessBoard, ChessGame, COLOR_CODES, STARTING_FEN
+from bitboard import BitboardChessBoard
+
+# Positions and their published perft counts by depth, from
+# the Chess Programming Wiki "Perft Results" page.
+PERFT_SUITE = [
+    ("start position", STARTING_FEN,
+     {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("position 4 mirrored", "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     {1: 46, 2: 2079, 3: 89890, 4: 3894594}),
+]
+
+"""
+This function returns the number of positions reached
+from the board's position after depth moves. At the last
+move the legal moves are only counted, not played.
+"""
+def perft(board, depth):
+    if depth == 0:
+        return 1
+    if depth == 1:
+        count = 0
+        for move in board.generate_legal_moves(board.turn):
+            count += 1
+        return count
+    count = 0
+    for move in list(board.generate_legal_moves(board.turn)):
+        board.make_move(move)
+        count += perft(board, depth - 1)
+        board.unmake_move()
+    return count
+
+"""
+This function returns a dictionary from each legal move
+in the board's position to the perft count below it.
+"""
+def divide(board, depth):
+    counts = {}
+    for move in list(board.generate_legal_moves(board.turn)):
+        board.make_move(move)
+        counts[move] = perft(board, depth - 1)
+        board.unmake_move()
+    return counts
+
+"""
+This function writes a move tuple in coordinate notation,
+such as e2e4 or e7e8q.
+"""
+def move_name(move):
+    from_row, from_col, to_row, to_col, promotion = move
+    name = "abcdefgh"[from_col] + str(from_row + 1) + "abcdefgh"[to_col] + str(to_row + 1)
+    if promotion is not None:
+        name += "n" if promotion == "knight" else promotion[0]
+    return name
+
+"""
+This function runs perft on a board set up from fen and
+returns a tuple of the count, the seconds it took and the
+nodes per second.
+"""
+def timed_perft(board_class, fen, depth):
+    board = board_class()
+    board.load_fen(fen)
+    start = time.perf_counter()
+    nodes = perft(board, depth)
+    seconds = time.perf_counter() - start
+    return nodes, seconds, nodes / seconds if seconds > 0 else 0.0
+
+"""
+This function checks every position in PERFT_SUITE up to
+max_depth against its published counts, printing each
+result, and returns True if all of them match.
+"""
+def run_suite(board_class, max_depth):
+    all_passed = True
+    total_nodes = 0
+    total_seconds = 0.0
+    for name, fen, expected in PERFT_SUITE:
+        for depth in sorted(expected):
+            if depth > max_depth:
+                break
+            nodes, seconds, nps = timed_perft(board_class, fen, depth)
+            total_nodes += nodes
+            total_seconds += seconds
+            passed = nodes == expected[depth]
+            all_passed = all_passed and passed
+            print("%-20s depth %d  %10d  %s  %8.2fs  %9.0f nodes/s" % (name, depth, nodes, "ok" if passed else "FAIL (expected %d)" % expected[depth], seconds, nps))
+    if total_seconds > 0:
+        print("total %d nodes in %.2fs, %.0f nodes/s" % (total_nodes, total_seconds, total_nodes / total_seconds))
+    return all_passed
+
+"""
+This function asks ChessGame.is_legal_move about every pair
+of a from square holding a piece of the side to move and a
+to square, in the position of the game's board and every
+position reached from it in fewer than depth moves, and
+compares the answer with whether generate_legal_moves makes
+that move. It returns the number of pairs asked about and a
+list of (FEN, move in coordinate notation) for each that
+differs.
+"""
+def legality_mismatches(game, depth):
+    board = game.board
+    moves = list(board.generate_legal_moves(board.turn))
+    generated = {move[:4] for move in moves}
+    pairs = 0
+    mismatches = []
+    for from_square in sorted(board.piece_squares[COLOR_CODES[board.turn]]):
+        from_row, from_col = divmod(from_square, 8)
+        for to_square in range(64):
+            to_row, to_col = divmod(to_square, 8)
+            pairs += 1
+            allowed = game.is_legal_move(from_row, from_col, to_row, to_col)
+            if allowed != ((from_row, from_col, to_row, to_col) in generated):
+                mismatches.append((board.to_fen(), move_name((from_row, from_col, to_row, to_col, None))))
+    if depth > 1:
+        for move in moves:
+            board.make_move(move)
+            count, found = legality_mismatches(game, depth - 1)
+            board.unmake_move()
+            pairs += count
+            mismatches.extend(found)
+    return pairs, mismatches
+
+"""
+This function runs legality_mismatches on every position in
+PERFT_SUITE to max_depth, printing each result and the first
+few moves that differ, and returns True if none did.
+"""
+def run_legality_suite(board_class, max_depth):
+    all_passed = True
+    for name, fen, expected in PERFT_SUITE:
+        board = board_class()
+        board.load_fen(fen)
+        start = time.perf_counter()
+        pairs, mismatches = legality_mismatches(ChessGame(board), max_depth)
+        seconds = time.perf_counter() - start
+        all_passed = all_passed and not mismatches
+        print("%-20s depth %d  %9d pairs  %s  %8.2fs" % (name, max_depth, pairs, "ok" if not mismatches else "FAIL (%d differ)" % len(mismatches), seconds))
+        for fen_found, name in mismatches[:5]:
+            print("    %s in %s" % (name, fen_found))
+    return all_passed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count the positions reached by the move generator.")
+    parser.add_argument("--depth", type=int, default=3, help="how many moves deep to count")
+    parser.add_argument("--fen", default=STARTING_FEN, help="the position to start from")
+    parser.add_argument("--divide", action="store_true", help="show the count after each first move")
+    parser.add_argument("--suite", action="store_true", help="check the positions in PERFT_SUITE up to --depth")
+    parser.add_argument("--legality", action="store_true", help="check ChessGame.is_legal_move against the generator along PERFT_SUITE up to --depth")
+    parser.add_argument("--bitboard", action="store_true", help="use BitboardChessBoard")
+    args = parser.parse_args(argv)
+    board_class = BitboardChessBoard if args.bitboard else ChessBoard
+    if args.suite:
+        return 0 if run_suite(board_class, args.depth) else 1
+    if args.legality:
+        return 0 if run_legality_suite(board_class, args.depth) else 1
+    if args.divide:
+        board = board_class()
+        board.load_fen(args.fen)
+        start = time.perf_counter()
+        counts = divide(board, args.depth)
+        seconds = time.perf_counter() - start
+        for move in sorted(counts, key=move_name):
+            print("%s: %d" % (move_name(move), counts[move]))
+        nodes = sum(counts.values())
+    else:
+        nodes, seconds, nps = timed_perft(board_class, args.fen, args.depth)
+    print("nodes %d  time %.2fs  %.0f nodes/s" % (nodes, seconds, nodes / seconds if seconds > 0 else 0.0))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,356 @@
+"""
+This module reads and writes games in Portable Game
+Notation (PGN), the text format chess databases are
+kept in. A PGN file holds one game after another,
+each with tag lines such as [White "Carlsen"] and
+then its moves in Standard Algebraic Notation (SAN),
+such as e4, Nxf3, O-O or e8=Q+. The read_games
+function is a generator: it reads the file a line at
+a time and gives back each game as soon as it has
+been read, so a database of many gigabytes is read
+in the memory of one game. Each move is played
+through the rules in rules.py as it is read, which
+checks it and turns it into a move tuple, and a game
+with a move that cannot be played is given back with
+its error instead of stopping the whole file. The
+read_game_chunks function groups the games into lists
+of a given size for code that works on batches, and
+write_games writes games back out as PGN. Run it with
+
+    python3 pgn.py games.pgn
+    python3 pgn.py games.pgn --output checked.pgn
+
+to count the games, moves and errors of a file and
+optionally write the games that could be read again.
+"""
+import argparse
+import re
+import sys
+import time
+
+from rules import ChessBoard, STARTING_FEN, FEN_PIECES, FEN_LETTERS
+
+# The tags every PGN game should have, in the order they are
+# written, and what they are when a game does not give them.
+SEVEN_TAG_ROSTER = (("Event", "?"), ("Site", "?"), ("Date", "????.??.??"), ("Round", "?"), ("White", "?"), ("Black", "?"), ("Result", "*"))
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+TAG_PATTERN = re.compile(r'^\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+SAN_PATTERN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?(x)?([a-h][1-8])(?:=?([NBRQnbrq]))?$")
+# the tokens of movetext: comments, variations, NAGs, move
+# numbers and results are found so that they can be skipped
+TOKEN_PATTERN = re.compile(r"\{|\}|\(|\)|;|\$\d+|\d+\.+|[^\s{}();]+")
+LINE_LENGTH = 80
+
+"""
+This exception is raised for a move that is not valid
+SAN or is not legal in the position it is played in.
+"""
+class PGNError(ValueError):
+    pass
+
+"""
+This class holds one game: its tags in a dictionary, its
+moves as move tuples, its result, and the error that
+stopped it from being read, or None. The fen method gives
+the position the game starts from, which is the FEN tag if
+there is one.
+"""
+class Game:
+    def __init__(self, headers=None, moves=None, result="*"):
+        self.headers = dict(headers or {})
+        self.moves = list(moves or [])
+        self.result = result
+        self.error = None
+
+    def fen(self):
+        return self.headers.get("FEN", STARTING_FEN)
+
+    """
+    This method returns a board with the game's moves played
+    on it.
+    """
+    def board(self, board_class=ChessBoard):
+        board = board_class()
+        board.load_fen(self.fen())
+        for move in self.moves:
+            board.make_move(move)
+        return board
+
+"""
+This function finds the legal move written in SAN in the
+board's position and returns it as a move tuple. Check and
+annotation marks at the end are ignored, and both O-O and
+0-0 are understood for castling. A PGNError is raised if
+the SAN cannot be read or matches no legal move or more
+than one.
+"""
+def parse_san(board, san):
+    text = san.rstrip("+#!?")
+    moves = board.generate_legal_moves(board.turn)
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        columns = 2 if len(text) == 3 else -2
+        for move in moves:
+            piece = board.board[move[0]][move[1]]
+            if piece.name == "king" and move[3] - move[1] == columns:
+                return move
+        raise PGNError("illegal castling %s in %s" % (san, board.to_fen()))
+    match = SAN_PATTERN.match(text)
+    if match is None:
+        raise PGNError("cannot read move %s" % san)
+    letter, from_file, from_rank, capture, square, promotion = match.groups()
+    name = FEN_PIECES[letter.lower()] if letter else "pawn"
+    to_row, to_col = int(square[1]) - 1, ord(square[0]) - ord("a")
+    from_col = None if from_file is None else ord(from_file) - ord("a")
+    from_row = None if from_rank is None else int(from_rank) - 1
+    promotion = None if promotion is None else FEN_PIECES[promotion.lower()]
+    found = None
+    for move in moves:
+        if move[2] != to_row or move[3] != to_col or move[4] != promotion:
+            continue
+        if board.board[move[0]][move[1]].name != name:
+            continue
+        if (from_col is not None and move[1] != from_col) or (from_row is not None and move[0] != from_row):
+            continue
+        if found is not None:
+            raise PGNError("ambiguous move %s in %s" % (san, board.to_fen()))
+        found = move
+    if found is None:
+        raise PGNError("illegal move %s in %s" % (san, board.to_fen()))
+    return found
+
+"""
+This function writes a legal move of the board's position
+in SAN. The from square is given only as far as it is
+needed to tell the move from another piece of the same
+kind reaching the same square, and + or # is added when
+the move gives check or mate.
+"""
+def move_to_san(board, move):
+    from_row, from_col, to_row, to_col, promotion = move
+    piece = board.board[from_row][from_col]
+    square = "abcdefgh"[to_col] + str(to_row + 1)
+    if piece.name == "king" and abs(to_col - from_col) == 2:
+        san = "O-O" if to_col > from_col else "O-O-O"
+    elif piece.name == "pawn":
+        san = square
+        if from_col != to_col:
+            san = "abcdefgh"[from_col] + "x" + square
+        if promotion is not None:
+            san += "=" + FEN_LETTERS[promotion].upper()
+    else:
+        others = []
+        for other in board.generate_legal_moves(board.turn):
+            if other[2] == to_row and other[3] == to_col and other[:2] != move[:2] and board.board[other[0]][other[1]].name == piece.name:
+                others.append(other)
+        disambiguation = ""
+        if others:
+            if all(other[1] != from_col for other in others):
+                disambiguation = "abcdefgh"[from_col]
+            elif all(other[0] != from_row for other in others):
+                disambiguation = str(from_row + 1)
+            else:
+                disambiguation = "abcdefgh"[from_col] + str(from_row + 1)
+        capture = "x" if board.board[to_row][to_col] is not None else ""
+        san = FEN_LETTERS[piece.name].upper() + disambiguation + capture + square
+    board.make_move(move)
+    king = board.find_king(board.turn)
+    if king is not None and board.is_square_attacked(king[0], king[1], piece.color):
+        san += "+" if board.has_legal_move(board.turn) else "#"
+    board.unmake_move()
+    return san
+
+"""
+This function splits the movetext of a game into the SAN of
+its moves and its result, leaving out move numbers, NAGs,
+comments and variations. The depth of open comments and
+variations is passed in and returned, so that they can run
+over several lines.
+"""
+def movetext_tokens(line, state):
+    in_comment, variation_depth = state
+    sans = []
+    result = None
+    for token in TOKEN_PATTERN.findall(line):
+        if in_comment:
+            if token == "}":
+                in_comment = False
+        elif token == "{":
+            in_comment = True
+        elif token == ";":
+            break
+        elif token == "(":
+            variation_depth += 1
+        elif token == ")":
+            variation_depth = max(0, variation_depth - 1)
+        elif variation_depth or token.startswith("$") or token[0].isdigit() and token.endswith("."):
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            sans.append(token)
+    return sans, result, (in_comment, variation_depth)
+
+"""
+This generator reads PGN from lines, which may be an open
+file, and gives back one Game at a time. If replay is True,
+each move is played on a board as it is read; a move that
+cannot be played stops the game there, and the game is
+given back with its error and the moves before it. If
+replay is False the moves are not checked and the game
+holds their SAN instead of move tuples, which is much faster
+when only the tags are wanted.
+"""
+def read_games(lines, replay=True, board_class=ChessBoard):
+    board = board_class()
+    game = None
+    state = (False, 0)
+    in_moves = False
+    for line in lines:
+        line = line.strip()
+        if line.startswith("%"):
+            continue
+        if line.startswith("[") and not state[0] and not state[1]:
+            match = TAG_PATTERN.match(line)
+            if match is None:
+                continue
+            if game is not None and in_moves:
+                # the game before had no result at its end
+                game.result = game.headers.get("Result", "*")
+                yield game
+                game = None
+                in_moves = False
+            if game is None:
+                game = Game()
+                state = (False, 0)
+            game.headers[match.group(1)] = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+            continue
+        if not line:
+            continue
+        if game is None:
+            game = Game()
+            state = (False, 0)
+        if not in_moves:
+            in_moves = True
+            if replay:
+                try:
+                    board.load_fen(game.fen())
+                except (ValueError, IndexError, KeyError):
+                    game.error = "cannot read FEN %s" % game.fen()
+        sans, result, state = movetext_tokens(line, state)
+        for san in sans:
+            if game.error is not None:
+                break
+            if not replay:
+                game.moves.append(san)
+                continue
+            try:
+                move = parse_san(board, san)
+            except PGNError as error:
+                game.error = str(error)
+                break
+            board.make_move(move)
+            game.moves.append(move)
+        if result is not None and not state[0] and not state[1]:
+            game.result = result
+            yield game
+            game = None
+            in_moves = False
+    if game is not None:
+        if game.result == "*":
+            game.result = game.headers.get("Result", "*")
+        yield game
+
+"""
+This generator reads games like read_games and gives them
+back in lists of chunk_size games, the last one possibly
+shorter, so that only one chunk is held at a time.
+"""
+def read_game_chunks(lines, chunk_size=1000, replay=True, board_class=ChessBoard):
+    chunk = []
+    for game in read_games(lines, replay, board_class):
+        chunk.append(game)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+"""
+This generator gives back the PGN of a game a line at a
+time: the seven tag roster first, then the other tags, a
+blank line, the moves wrapped to LINE_LENGTH characters and
+another blank line. The moves may be move tuples, which are
+written in SAN, or SAN already.
+"""
+def game_lines(game, board_class=ChessBoard):
+    headers = dict(game.headers)
+    headers["Result"] = game.result
+    for name, default in SEVEN_TAG_ROSTER:
+        yield '[%s "%s"]' % (name, headers.pop(name, default).replace("\\", "\\\\").replace('"', '\\"'))
+    for name, value in headers.items():
+        yield '[%s "%s"]' % (name, value.replace("\\", "\\\\").replace('"', '\\"'))
+    yield ""
+    board = board_class()
+    board.load_fen(game.fen())
+    tokens = []
+    for move in game.moves:
+        if board.turn == "white":
+            tokens.append("%d." % board.fullmove_number)
+        elif not tokens:
+            tokens.append("%d..." % board.fullmove_number)
+        if isinstance(move, str):
+            tokens.append(move)
+            board.make_move(parse_san(board, move))
+        else:
+            tokens.append(move_to_san(board, move))
+            board.make_move(move)
+    tokens.append(game.result)
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            yield line
+            line = token
+        else:
+            line = line + " " + token if line else token
+    yield line
+    yield ""
+
+"""
+This function writes games, which may come from a generator,
+to an open file as PGN, one at a time, and returns how many
+it wrote.
+"""
+def write_games(stream, games, board_class=ChessBoard):
+    count = 0
+    for game in games:
+        for line in game_lines(game, board_class):
+            stream.write(line + "\n")
+        count += 1
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read a PGN file, checking every move.")
+    parser.add_argument("path", help="the PGN file to read")
+    parser.add_argument("--output", help="write the games that could be read to this PGN file")
+    parser.add_argument("--no-replay", action="store_true", help="read the tags and moves without checking the moves")
+    args = parser.parse_args(argv)
+    games = moves = errors = 0
+    start = time.perf_counter()
+    output = open(args.output, "w") if args.output else None
+    with open(args.path, encoding="utf-8", errors="replace") as stream:
+        for game in read_games(stream, not args.no_replay):
+            games += 1
+            moves += len(game.moves)
+            if game.error is not None:
+                errors += 1
+                print("game %d: %s" % (games, game.error), file=sys.stderr)
+            elif output is not None:
+                write_games(output, [game])
+    if output is not None:
+        output.close()
+    seconds = time.perf_counter() - start
+    print("%d games  %d moves  %d errors  %.2fs  %.0f games/s" % (games, moves, errors, seconds, games / seconds if seconds > 0 else 0.0))
+    return 0 if errors == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
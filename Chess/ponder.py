@@ -0,0 +1,167 @@
+"""
+This module lets the engine think on the player's time
+(pondering). While the graphical game waits in
+getMouse for the player to click, the processor has
+nothing to do, so the Ponderer class searches in a
+background thread meanwhile. Its guess of the
+player's move is the second move of the engine's own
+principal variation, the reply the engine expected
+when it chose its move. The guess is played on a copy
+of the board, and the engine's answer to it is
+searched until the player moves. If the player plays
+the guessed move (a ponder hit), that search simply
+goes on as the engine's real search, counting the
+time it has already had, so the engine usually
+answers at once. If the player plays anything else
+(a ponder miss), the search is stopped and a normal
+one is started, which still finds the positions the
+pondering stored in the shared transposition table.
+With no guess, the player's own position is searched,
+which stores the engine's best answers to every move
+the player can make.
+
+Python runs one thread of Python code at a time, but
+getMouse sleeps between its checks for a click, so
+the window stays responsive and the search gets
+nearly all of the processor. Chess.py ponders with
+--ponder when one color is played by the computer.
+"""
+import copy
+import threading
+import time
+
+from search import MAX_PLY
+
+"""
+This code defines the Ponderer class, which ponders with an
+Engine from search.py. start begins pondering after the
+engine's move, and play_move plays the engine's next move in
+a ChessGame, using the pondering when the player played the
+guessed move. hits and misses count how often the guess was
+right.
+"""
+class Ponderer:
+    def __init__(self, engine, max_depth=MAX_PLY):
+        self.engine = engine
+        self.max_depth = max_depth
+        self.thread = None
+        # set when pondering is to stop, which the thread checks
+        # as well as the engine, since Engine.search clears
+        # engine.stopped when it starts
+        self.halt = threading.Event()
+        self.key = None
+        self.started = None
+        self.guessed = False
+        self.hit_deadline = None
+        self.hit_half = 0.0
+        self.result = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def pondering(self):
+        return self.thread is not None
+
+    """
+    This method starts pondering on a copy of the board, whose
+    side to move is the player's. If guess is given and legal,
+    it is played on the copy and the engine's answer to it is
+    searched; otherwise the player's position is searched.
+    """
+    def start(self, board, guess=None):
+        self.stop()
+        board = copy.deepcopy(board)
+        self.guessed = guess is not None and guess in board.generate_legal_moves(board.turn)
+        if self.guessed:
+            board.make_move(guess)
+        self.key = board.zobrist_key
+        self.hit_deadline = None
+        self.result = None
+        self.halt.clear()
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, args=(board,), daemon=True)
+        self.thread.start()
+
+    def run(self, board):
+        if not self.halt.is_set():
+            self.result = self.engine.search(board, None, self.max_depth, self.record)
+
+    """
+    This method is called by the search with the result of
+    every depth it finishes. After a ponder hit it puts back
+    the deadline the hit set, in case the search only began
+    after the hit, and stops the search once half of the
+    thinking time is gone, the way Engine.search stops
+    before starting a depth it would most likely not finish.
+    """
+    def record(self, result):
+        if self.halt.is_set():
+            self.engine.stopped = True
+            return
+        deadline = self.hit_deadline
+        if deadline is not None:
+            self.engine.deadline = deadline
+            if time.perf_counter() >= deadline - self.hit_half:
+                self.engine.stopped = True
+
+    """
+    This method stops pondering and waits for the search
+    thread to end. A search that had not yet started when
+    engine.stopped was first set clears it, so it is set
+    again until the thread has ended.
+    """
+    def stop(self):
+        if self.thread is not None:
+            self.halt.set()
+            while self.thread.is_alive():
+                self.engine.stopped = True
+                self.thread.join(0.01)
+            self.thread = None
+
+    """
+    This method ends pondering once the player has moved on
+    the board. On a ponder hit the search goes on until
+    time_limit seconds have passed since pondering began,
+    from when it had more than half of them left, and its
+    SearchResult is returned. On a miss, or if nothing was
+    pondered, None is returned.
+    """
+    def finish(self, board, time_limit):
+        if self.thread is None:
+            return None
+        if not self.guessed or board.zobrist_key != self.key:
+            if self.guessed:
+                self.misses += 1
+            self.stop()
+            return None
+        self.hits += 1
+        if time_limit is not None:
+            now = time.perf_counter()
+            self.hit_half = time_limit / 2
+            self.hit_deadline = max(now, self.started + time_limit)
+            self.engine.deadline = self.hit_deadline
+            if now - self.started > time_limit / 2:
+                self.engine.stopped = True
+        self.thread.join()
+        self.thread = None
+        return self.result
+
+    """
+    This method plays the engine's move in the game the way
+    Engine.play_move does, taking a book move first, then the
+    pondered move on a ponder hit, and otherwise searching for
+    at most time_limit seconds. It returns the SearchResult.
+    """
+    def play_move(self, game, time_limit=1.0):
+        board = game.board
+        result = self.engine.book_result(board)
+        if result is None:
+            result = self.finish(board, time_limit)
+        else:
+            self.stop()
+        if result is None or result.move is None:
+            result = self.engine.search(board, time_limit)
+        if result.move is not None:
+            from_row, from_col, to_row, to_col, promotion = result.move
+            game.make_move(from_row, from_col, to_row, to_col, promotion)
+        return result
@@ -0,0 +1,1361 @@
+"""
+This module holds the rules of the Chess game
+without any dependency on the graphics library.
+It is composed of three classes: Piece, ChessBoard,
+and ChessGame. The Piece class creates chess pieces
+with the properties of name, color, position, and
+whether it has moved. The ChessBoard class creates
+an 8x8 board and populates it with chess pieces in
+their starting positions. The ChessGame class holds
+the board, whose turn it is, and the scores, and it
+includes methods for making moves, checking whether
+a move is legal, and checking for checkmate. Because
+nothing in this module opens a window, it can be
+used to validate or simulate games in batch workers
+and test runners. The graphical game in Chess.py
+wraps the ChessGame class defined here.
+"""
+import random
+
+# The squares a knight or a king can reach from its
+# position, and the directions a rook or a bishop slides
+# in, given as (row, col) offsets.
+KNIGHT_OFFSETS = ((2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2))
+KING_OFFSETS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+ROOK_DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+BISHOP_DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+# The pieces a pawn reaching the last row can become.
+PROMOTION_PIECES = ("queen", "rook", "bishop", "knight")
+# The castling rights, kept together in one number, and the
+# rights that are lost when a piece moves from or to a square.
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+CASTLING_RIGHTS_LOST = {
+    (0, 4): WHITE_KINGSIDE | WHITE_QUEENSIDE,
+    (0, 7): WHITE_KINGSIDE,
+    (0, 0): WHITE_QUEENSIDE,
+    (7, 4): BLACK_KINGSIDE | BLACK_QUEENSIDE,
+    (7, 7): BLACK_KINGSIDE,
+    (7, 0): BLACK_QUEENSIDE,
+}
+# The letters FEN uses for each piece; upper case is white.
+# Each piece is also kept as a small number, its code: the
+# kind of piece, with the BLACK bit added for a black piece.
+# An empty square is EMPTY. Codes are compared much faster
+# than names, and the squares of a board fit in 64 bytes.
+EMPTY = 0
+PAWN = 1
+KNIGHT = 2
+BISHOP = 3
+ROOK = 4
+QUEEN = 5
+KING = 6
+KIND_MASK = 7
+WHITE = 0
+BLACK = 8
+PIECE_CODES = {"pawn": PAWN, "knight": KNIGHT, "bishop": BISHOP, "rook": ROOK, "queen": QUEEN, "king": KING}
+CODE_NAMES = (None, "pawn", "knight", "bishop", "rook", "queen", "king")
+COLOR_CODES = {"white": WHITE, "black": BLACK}
+# The material value of each kind of piece in centipawns, and
+# how much each counts towards the game phase, which is
+# MAX_PHASE with every piece on the board and falls towards 0
+# as pieces are traded off.
+PIECE_MATERIAL = (0, 100, 320, 330, 500, 900, 0)
+PHASE_WEIGHTS = (0, 0, 1, 1, 2, 4, 0)
+MAX_PHASE = 24
+FEN_PIECES = {"p": "pawn", "n": "knight", "b": "bishop", "r": "rook", "q": "queen", "k": "king"}
+FEN_LETTERS = {name: letter for letter, name in FEN_PIECES.items()}
+FEN_CASTLING = {"K": WHITE_KINGSIDE, "Q": WHITE_QUEENSIDE, "k": BLACK_KINGSIDE, "q": BLACK_QUEENSIDE}
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# The random 64-bit numbers that make up a position's Zobrist
+# key: one for each piece on each square, one that is added
+# when white is to move, one for each castling right and one
+# for each column a pawn can be captured en passant on. The
+# generator is seeded so that keys are the same in every run.
+zobrist_random = random.Random(20230124)
+ZOBRIST_PIECE_KEYS = {color: {name: [zobrist_random.getrandbits(64) for _ in range(64)] for name in ("pawn", "knight", "bishop", "rook", "queen", "king")} for color in ("white", "black")}
+ZOBRIST_WHITE_TO_MOVE = zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING_KEYS = [zobrist_random.getrandbits(64) for _ in range(4)]
+# the key of every combination of castling rights
+ZOBRIST_CASTLING = [0] * 16
+for rights in range(16):
+    for i in range(4):
+        if rights & (1 << i):
+            ZOBRIST_CASTLING[rights] ^= ZOBRIST_CASTLING_KEYS[i]
+ZOBRIST_EN_PASSANT = [zobrist_random.getrandbits(64) for _ in range(8)]
+# the piece keys again, indexed by piece code
+ZOBRIST_CODE_KEYS = [None] * 16
+for name, kind in PIECE_CODES.items():
+    ZOBRIST_CODE_KEYS[kind | WHITE] = ZOBRIST_PIECE_KEYS["white"][name]
+    ZOBRIST_CODE_KEYS[kind | BLACK] = ZOBRIST_PIECE_KEYS["black"][name]
+
+"""
+These functions return, for a square numbered row * 8 + col,
+the squares reached by the given (row, col) offsets, and the
+squares along each of the given directions from the nearest
+outward, all staying on the board.
+"""
+def square_targets(square, offsets):
+    row, col = divmod(square, 8)
+    return tuple((row + d_row) * 8 + col + d_col for d_row, d_col in offsets if 0 <= row + d_row < 8 and 0 <= col + d_col < 8)
+
+def square_lines(square, directions):
+    row, col = divmod(square, 8)
+    lines = []
+    for d_row, d_col in directions:
+        line = []
+        r, c = row + d_row, col + d_col
+        while 0 <= r < 8 and 0 <= c < 8:
+            line.append(r * 8 + c)
+            r += d_row
+            c += d_col
+        if line:
+            lines.append(tuple(line))
+    return tuple(lines)
+
+# The squares a knight or king on each square reaches, the
+# squares a pawn of each color attacks a square from, and the
+# lines a rook or bishop on each square slides along, built
+# once so that is_square_attacked only looks squares up.
+KNIGHT_TARGETS = [square_targets(square, KNIGHT_OFFSETS) for square in range(64)]
+KING_TARGETS = [square_targets(square, KING_OFFSETS) for square in range(64)]
+PAWN_ATTACKERS = {
+    WHITE: [square_targets(square, ((-1, -1), (-1, 1))) for square in range(64)],
+    BLACK: [square_targets(square, ((1, -1), (1, 1))) for square in range(64)],
+}
+ROOK_LINES = [square_lines(square, ROOK_DIRECTIONS) for square in range(64)]
+BISHOP_LINES = [square_lines(square, BISHOP_DIRECTIONS) for square in range(64)]
+
+"""
+This function returns the color of the other player.
+"""
+def opposite_color(color):
+    if color == "white":
+        return "black"
+    return "white"
+
+"""
+This code defines the Piece class in Python.
+The class has a constructor method (__init__)
+that takes in three arguments: name, color, and
+position. The name and color are kept together in
+self.code, the piece code, and can still be read and
+set as self.name and self.color. The constructor
+also sets self.position and self.has_moved. The
+self.has_moved variable is set to False by
+default, indicating that the piece has not moved
+yet. The attributes are listed in __slots__, so a
+piece has no __dict__ and takes far less memory.
+"""
+class Piece:
+    __slots__ = ("code", "position", "has_moved")
+
+    def __init__(self, name, color, position):
+        self.code = PIECE_CODES[name] | COLOR_CODES[color]
+        self.position = position
+        self.has_moved = False
+
+    @property
+    def name(self):
+        return CODE_NAMES[self.code & KIND_MASK]
+
+    @name.setter
+    def name(self, name):
+        self.code = (self.code & BLACK) | PIECE_CODES[name]
+
+    @property
+    def color(self):
+        return "black" if self.code & BLACK else "white"
+
+    @color.setter
+    def color(self, color):
+        self.code = (self.code & KIND_MASK) | COLOR_CODES[color]
+
+"""
+This code defines the ChessBoard class in Python.
+The class has a constructor method (__init__) that
+initializes an 8x8 board with all elements set to
+None, then calls the populate_board method. The
+populate_board method populates the board with
+chess pieces in their starting positions, with
+rooks in the corners, knights and bishops next
+to them, queen and king in the middle, and pawns
+in the second and seventh row. The class also
+defines a get_piece_at_position method which takes
+in a row and col and returns the piece at that
+position on the board. The move_piece method
+takes in the coordinates of a piece's current
+position and the coordinates of its destination
+and moves the piece to the destination,
+updating the piece's position and marking it
+as having moved. The is_square_attacked method
+tells whether a square is attacked by a color,
+generate_pseudo_legal_moves lists the moves each
+piece of a color can make by its own movement rules,
+and generate_legal_moves keeps only those that do
+not leave the mover's king in check. A move is a
+tuple (from_row, from_col, to_row, to_col, promotion)
+where promotion names the piece a pawn becomes on
+the last row and is None for every other move.
+Castling is written as the king moving two columns.
+The make_move method plays a move on the board,
+including castling, en passant and promotion, and
+records what it changed on the undo_stack, so that
+unmake_move can take it back exactly. The board
+also keeps whose turn it is, the castling rights
+and the square a pawn may be captured en passant on.
+Every position also has a 64-bit Zobrist key in
+self.zobrist_key, the exclusive or of the random
+numbers for each piece on its square, the side to
+move, the castling rights and the en passant column.
+It is updated as pieces are placed and removed, so a
+move changes only a few numbers, and self.history
+lists the keys of every position since the board was
+set up, ending with the current one. The board
+counts the halfmoves since the last capture or pawn
+move in self.halfmove_clock and the moves of the game
+in self.fullmove_number, as FEN does. The load_fen
+method sets up any position from its FEN, and the
+to_fen method writes the position as FEN. Next to
+the 8x8 list of Piece objects, self.squares is a
+bytearray of the 64 piece codes indexed by
+row * 8 + col, which the move generator and attack
+tests read, so that they compare small numbers
+instead of names and colors. The board also keeps,
+for WHITE and BLACK, the set of squares its pieces
+stand on in self.piece_squares, the square of its
+king in self.king_squares and the value of its
+pieces in self.material, and the game phase of both
+sides together in self.phase. They are updated as
+pieces are placed and removed, so finding the king
+or the pieces of a color does not scan the board.
+"""
+class ChessBoard:
+    def __init__(self):
+        self.board = [[None for _ in range(8)] for _ in range(8)]
+        self.turn = "white"
+        self.castling_rights = WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE
+        self.en_passant = None
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.undo_stack = []
+        self.populate_board()
+        self.load_squares()
+        self.zobrist_key = self.compute_zobrist_key()
+        self.history = [self.zobrist_key]
+
+    def populate_board(self):
+        self.board[0][0] = Piece("rook", "white", (0, 0))
+        self.board[0][1] = Piece("knight", "white", (0, 1))
+        self.board[0][2] = Piece("bishop", "white", (0, 2))
+        self.board[0][3] = Piece("queen", "white", (0, 3))
+        self.board[0][4] = Piece("king", "white", (0, 4))
+        self.board[0][5] = Piece("bishop", "white", (0, 5))
+        self.board[0][6] = Piece("knight", "white", (0, 6))
+        self.board[0][7] = Piece("rook", "white", (0, 7))
+
+        self.board[7][0] = Piece("rook", "black", (7, 0))
+        self.board[7][1] = Piece("knight", "black", (7, 1))
+        self.board[7][2] = Piece("bishop", "black", (7, 2))
+        self.board[7][3] = Piece("queen", "black", (7, 3))
+        self.board[7][4] = Piece("king", "black", (7, 4))
+        self.board[7][5] = Piece("bishop", "black", (7, 5))
+        self.board[7][6] = Piece("knight", "black", (7, 6))
+        self.board[7][7] = Piece("rook", "black", (7, 7))
+
+        for i in range(8):
+            self.board[1][i] = Piece("pawn", "white", (1, i))
+            self.board[6][i] = Piece("pawn", "black", (6, i))
+
+    """
+    This method sets the board up from a position written in
+    Forsyth-Edwards Notation, such as STARTING_FEN. The pieces
+    are read rank by rank from the eighth, followed by the
+    side to move, the castling rights, the en passant square,
+    and the halfmove clock and fullmove number, which may be
+    left out. Kings and rooks are marked as having moved unless
+    a castling right says otherwise, and pawns unless they are
+    on their starting row. The undo stack and history start
+    over from the new position.
+    """
+    def load_fen(self, fen):
+        fields = fen.split()
+        self.board = [[None for _ in range(8)] for _ in range(8)]
+        for i, rank in enumerate(fields[0].split("/")):
+            row = 7 - i
+            col = 0
+            for char in rank:
+                if char.isdigit():
+                    col += int(char)
+                else:
+                    color = "white" if char.isupper() else "black"
+                    self.board[row][col] = Piece(FEN_PIECES[char.lower()], color, (row, col))
+                    col += 1
+        self.turn = "white" if fields[1] == "w" else "black"
+        self.castling_rights = 0
+        for char in fields[2]:
+            self.castling_rights |= FEN_CASTLING.get(char, 0)
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece is None:
+                    continue
+                if piece.name == "pawn":
+                    piece.has_moved = row != (1 if piece.color == "white" else 6)
+                elif piece.name in ("king", "rook"):
+                    piece.has_moved = (row, col) not in CASTLING_RIGHTS_LOST or not self.castling_rights & CASTLING_RIGHTS_LOST[(row, col)]
+        self.en_passant = None
+        if fields[3] != "-":
+            row, col = int(fields[3][1]) - 1, ord(fields[3][0]) - ord("a")
+            # keep the square only if a pawn could capture there
+            pawn_row = 4 if row == 5 else 3
+            for pawn_col in (col - 1, col + 1):
+                if 0 <= pawn_col < 8:
+                    pawn = self.board[pawn_row][pawn_col]
+                    if pawn is not None and pawn.name == "pawn" and pawn.color == self.turn:
+                        self.en_passant = (row, col)
+        self.halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        self.fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        self.undo_stack = []
+        self.load_squares()
+        self.zobrist_key = self.compute_zobrist_key()
+        self.history = [self.zobrist_key]
+
+    """
+    This method returns the board's position in Forsyth-Edwards
+    Notation, the way load_fen reads it. The en passant square
+    is written only when a pawn could capture there.
+    """
+    def to_fen(self):
+        ranks = []
+        for row in range(7, -1, -1):
+            rank = ""
+            empty = 0
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                letter = FEN_LETTERS[piece.name]
+                rank += letter.upper() if piece.color == "white" else letter
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        castling = "".join(char for char in "KQkq" if self.castling_rights & FEN_CASTLING[char]) or "-"
+        if self.en_passant is None:
+            en_passant = "-"
+        else:
+            en_passant = "abcdefgh"[self.en_passant[1]] + str(self.en_passant[0] + 1)
+        return "%s %s %s %s %d %d" % ("/".join(ranks), "w" if self.turn == "white" else "b", castling, en_passant, self.halfmove_clock, self.fullmove_number)
+
+    def get_piece_at_position(self, row, col):
+        return self.board[row][col]
+
+    """
+    This method fills self.squares with the codes of the
+    pieces on the 8x8 board, after it has been set up, and
+    counts up the piece squares, king squares, material and
+    phase from them.
+    """
+    def load_squares(self):
+        self.squares = bytearray(64)
+        self.piece_squares = {WHITE: set(), BLACK: set()}
+        self.king_squares = {WHITE: None, BLACK: None}
+        self.material = {WHITE: 0, BLACK: 0}
+        self.phase = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece is not None:
+                    self.add_piece_square(piece.code, row * 8 + col)
+
+    """
+    This method adds the piece with the given code on the
+    square to the squares array, the piece squares, the king
+    squares, the material and the phase. The place_piece and
+    remove_piece methods do the same work inline, since they
+    are called for every move.
+    """
+    def add_piece_square(self, code, square):
+        side = code & BLACK
+        kind = code & KIND_MASK
+        self.squares[square] = code
+        self.piece_squares[side].add(square)
+        if kind == KING:
+            self.king_squares[side] = square
+        self.material[side] += PIECE_MATERIAL[kind]
+        self.phase += PHASE_WEIGHTS[kind]
+
+    """
+    The place_piece and remove_piece methods are the only
+    places where a piece is put on or taken off a square once
+    the board is populated. A board that keeps more about the
+    position than the 8x8 list, like BitboardChessBoard in
+    bitboard.py, only has to extend these two methods.
+    """
+    def place_piece(self, piece, row, col):
+        code = piece.code
+        square = row * 8 + col
+        self.board[row][col] = piece
+        piece.position = (row, col)
+        self.squares[square] = code
+        side = code & BLACK
+        self.piece_squares[side].add(square)
+        kind = code & KIND_MASK
+        if kind == KING:
+            self.king_squares[side] = square
+        elif kind != PAWN:
+            self.phase += PHASE_WEIGHTS[kind]
+        self.material[side] += PIECE_MATERIAL[kind]
+        self.zobrist_key ^= ZOBRIST_CODE_KEYS[code][square]
+
+    def remove_piece(self, row, col):
+        piece = self.board[row][col]
+        code = piece.code
+        square = row * 8 + col
+        self.board[row][col] = None
+        self.squares[square] = EMPTY
+        side = code & BLACK
+        self.piece_squares[side].discard(square)
+        kind = code & KIND_MASK
+        if kind == KING:
+            if self.king_squares[side] == square:
+                self.king_squares[side] = None
+        elif kind != PAWN:
+            self.phase -= PHASE_WEIGHTS[kind]
+        self.material[side] -= PIECE_MATERIAL[kind]
+        self.zobrist_key ^= ZOBRIST_CODE_KEYS[code][square]
+        return piece
+
+    """
+    This method computes the Zobrist key of the position
+    from scratch. It is used when the board is set up; after
+    that the key is kept up to date move by move.
+    """
+    def compute_zobrist_key(self):
+        key = 0
+        for square, code in enumerate(self.squares):
+            if code:
+                key ^= ZOBRIST_CODE_KEYS[code][square]
+        if self.turn == "white":
+            key ^= ZOBRIST_WHITE_TO_MOVE
+        key ^= ZOBRIST_CASTLING[self.castling_rights]
+        if self.en_passant is not None:
+            key ^= ZOBRIST_EN_PASSANT[self.en_passant[1]]
+        return key
+
+    def move_piece(self, from_row, from_col, to_row, to_col):
+        piece = self.remove_piece(from_row, from_col)
+        if self.board[to_row][to_col] is not None:
+            self.remove_piece(to_row, to_col)
+        self.place_piece(piece, to_row, to_col)
+        piece.has_moved = True
+        return
+
+    """
+    This method plays a move on the board. It handles the
+    rook of a castle move, removes the pawn taken en passant,
+    and turns a promoted pawn into its new piece. It then
+    updates the castling rights, the en passant square and
+    whose turn it is. The en passant square is only set when
+    an enemy pawn stands beside the pawn that moved two
+    squares, so that it is part of the position only when it
+    could matter. Before changing anything it pushes an
+    undo record onto the undo_stack holding the move, whether
+    the piece had moved before, the captured piece and its
+    square, and the previous castling rights, en passant
+    square, turn, Zobrist key and halfmove clock. Nothing else is copied, so
+    legality checks and searches can play and take back moves
+    on one board. The Zobrist key is updated for the pieces by
+    place_piece and remove_piece and here for the rest, and
+    the new key is added to the history. The captured piece
+    is returned, or None.
+    """
+    def make_move(self, move):
+        from_row, from_col, to_row, to_col, promotion = move
+        piece = self.board[from_row][from_col]
+        captured = self.board[to_row][to_col]
+        captured_row = to_row
+        zobrist_key = self.zobrist_key
+        kind = piece.code & KIND_MASK
+        if kind == PAWN and captured is None and from_col != to_col:
+            # en passant, the captured pawn is beside the moving pawn
+            captured_row = from_row
+            captured = self.remove_piece(from_row, to_col)
+        self.undo_stack.append((move, piece.has_moved, captured, captured_row, self.castling_rights, self.en_passant, self.turn, zobrist_key, self.halfmove_clock))
+        if kind == PAWN or captured is not None:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if piece.code & BLACK:
+            self.fullmove_number += 1
+        self.move_piece(from_row, from_col, to_row, to_col)
+        if kind == KING and abs(to_col - from_col) == 2:
+            if to_col > from_col:
+                self.move_piece(from_row, 7, from_row, 5)
+            else:
+                self.move_piece(from_row, 0, from_row, 3)
+        if promotion is not None:
+            self.remove_piece(to_row, to_col)
+            piece.code = (piece.code & BLACK) | PIECE_CODES[promotion]
+            self.place_piece(piece, to_row, to_col)
+        key = self.zobrist_key
+        if self.en_passant is not None:
+            key ^= ZOBRIST_EN_PASSANT[self.en_passant[1]]
+            self.en_passant = None
+        if kind == PAWN and abs(to_row - from_row) == 2:
+            enemy_pawn = PAWN | ((piece.code & BLACK) ^ BLACK)
+            for col in (to_col - 1, to_col + 1):
+                if 0 <= col < 8:
+                    if self.squares[to_row * 8 + col] == enemy_pawn:
+                        self.en_passant = ((from_row + to_row) // 2, from_col)
+                        key ^= ZOBRIST_EN_PASSANT[from_col]
+                        break
+        lost = CASTLING_RIGHTS_LOST.get((from_row, from_col), 0) | CASTLING_RIGHTS_LOST.get((to_row, to_col), 0)
+        if lost and self.castling_rights & lost:
+            key ^= ZOBRIST_CASTLING[self.castling_rights]
+            self.castling_rights &= ~lost
+            key ^= ZOBRIST_CASTLING[self.castling_rights]
+        next_turn = "white" if piece.code & BLACK else "black"
+        if self.turn != next_turn:
+            key ^= ZOBRIST_WHITE_TO_MOVE
+        self.turn = next_turn
+        self.zobrist_key = key
+        self.history.append(key)
+        return captured
+
+    """
+    This method takes back the last move played by make_move,
+    using the record on top of the undo_stack to put the
+    pieces, the castling rights, the en passant square, the
+    turn, the Zobrist key and the move counters back as they were, and removes
+    the last key from the history. It returns the move.
+    """
+    def unmake_move(self):
+        move, has_moved, captured, captured_row, castling_rights, en_passant, turn, zobrist_key, halfmove_clock = self.undo_stack.pop()
+        from_row, from_col, to_row, to_col, promotion = move
+        piece = self.board[to_row][to_col]
+        if promotion is not None:
+            self.remove_piece(to_row, to_col)
+            piece.code = (piece.code & BLACK) | PAWN
+            self.place_piece(piece, to_row, to_col)
+        if (piece.code & KIND_MASK) == KING and abs(to_col - from_col) == 2:
+            if to_col > from_col:
+                self.move_piece(from_row, 5, from_row, 7)
+                self.board[from_row][7].has_moved = False
+            else:
+                self.move_piece(from_row, 3, from_row, 0)
+                self.board[from_row][0].has_moved = False
+        self.move_piece(to_row, to_col, from_row, from_col)
+        piece.has_moved = has_moved
+        if captured is not None:
+            self.place_piece(captured, captured_row, to_col)
+        self.castling_rights = castling_rights
+        self.en_passant = en_passant
+        self.turn = turn
+        self.zobrist_key = zobrist_key
+        self.halfmove_clock = halfmove_clock
+        if piece.code & BLACK:
+            self.fullmove_number -= 1
+        self.history.pop()
+        return move
+
+    """
+    This method checks whether the square at row, col is
+    attacked by any piece of the given color. Instead of
+    asking every piece of that color whether it could move
+    to the square, it looks outward from the square itself:
+    one step diagonally for pawns and kings, the eight knight
+    jumps, and along the four straight and four diagonal rays
+    until the first piece is met, which attacks the square if
+    it is a rook or queen on a straight ray, or a bishop or
+    queen on a diagonal one. No move is simulated, so the cost
+    does not depend on how many pieces are on the board.
+    """
+    def is_square_attacked(self, row, col, by_color):
+        squares = self.squares
+        square = row * 8 + col
+        side = COLOR_CODES[by_color]
+        pawn = side | PAWN
+        for target in PAWN_ATTACKERS[side][square]:
+            if squares[target] == pawn:
+                return True
+        knight = side | KNIGHT
+        for target in KNIGHT_TARGETS[square]:
+            if squares[target] == knight:
+                return True
+        king = side | KING
+        for target in KING_TARGETS[square]:
+            if squares[target] == king:
+                return True
+        queen = side | QUEEN
+        for lines, slider in ((ROOK_LINES, side | ROOK), (BISHOP_LINES, side | BISHOP)):
+            for line in lines[square]:
+                for target in line:
+                    code = squares[target]
+                    if code:
+                        if code == slider or code == queen:
+                            return True
+                        break
+        return False
+
+    """
+    This method returns the position of the king of the
+    given color, or None if that king is not on the board.
+    """
+    def find_king(self, color):
+        square = self.king_squares[COLOR_CODES[color]]
+        if square is None:
+            return None
+        return divmod(square, 8)
+
+    """
+    This method checks that a position, such as one read from
+    a FEN, could be reached in a game: each side has exactly
+    one king, and the side not to move is not in check, which
+    would mean its king could be taken. The search and the
+    rules assume both.
+    """
+    def is_legal_position(self):
+        for side in (WHITE, BLACK):
+            if self.squares.count(side | KING) != 1:
+                return False
+        king = self.find_king(opposite_color(self.turn))
+        return not self.is_square_attacked(king[0], king[1], self.turn)
+
+    """
+    This method returns a list of every move the pieces of
+    the given color can make according to how each piece
+    moves, without checking whether the move leaves the
+    king in check. Pawns push one square, or two from their
+    starting row, and capture diagonally, with one move for
+    each promotion piece when they reach the last row.
+    Knights and kings step to the squares in KNIGHT_OFFSETS
+    and KING_OFFSETS, rooks, bishops and queens slide along
+    their rays until they hit a piece, and a king that has
+    not moved may castle with a rook that has not moved when
+    the squares between them are empty and the king does not
+    start in, pass through, or land on an attacked square.
+    """
+    def generate_pseudo_legal_moves(self, color):
+        moves = []
+        board = self.board
+        for square in sorted(self.piece_squares[COLOR_CODES[color]]):
+            row, col = divmod(square, 8)
+            self.add_piece_moves(board[row][col], row, col, moves)
+        return moves
+
+    """
+    This method appends the pseudo-legal moves of the piece
+    standing at row, col to the moves list.
+    """
+    def add_piece_moves(self, piece, row, col, moves):
+        kind = piece.code & KIND_MASK
+        if kind == PAWN:
+            self.add_pawn_moves(piece, row, col, moves)
+        elif kind == KNIGHT:
+            self.add_step_moves(piece, row, col, KNIGHT_OFFSETS, moves)
+        elif kind == BISHOP:
+            self.add_slide_moves(piece, row, col, BISHOP_DIRECTIONS, moves)
+        elif kind == ROOK:
+            self.add_slide_moves(piece, row, col, ROOK_DIRECTIONS, moves)
+        elif kind == QUEEN:
+            self.add_slide_moves(piece, row, col, ROOK_DIRECTIONS, moves)
+            self.add_slide_moves(piece, row, col, BISHOP_DIRECTIONS, moves)
+        elif kind == KING:
+            self.add_step_moves(piece, row, col, KING_OFFSETS, moves)
+            self.add_castling_moves(piece, row, col, moves)
+
+    def add_pawn_moves(self, piece, row, col, moves):
+        squares = self.squares
+        side = piece.code & BLACK
+        if side == WHITE:
+            direction, start_row, last_row, en_passant_row = 1, 1, 7, 5
+        else:
+            direction, start_row, last_row, en_passant_row = -1, 6, 0, 2
+        to_row = row + direction
+        if not 0 <= to_row < 8:
+            return
+        targets = []
+        if not squares[to_row * 8 + col]:
+            targets.append(col)
+            if row == start_row and not squares[(to_row + direction) * 8 + col]:
+                moves.append((row, col, to_row + direction, col, None))
+        for to_col in (col - 1, col + 1):
+            if 0 <= to_col < 8:
+                target = squares[to_row * 8 + to_col]
+                if target and (target & BLACK) != side:
+                    targets.append(to_col)
+                elif to_row == en_passant_row and self.en_passant == (to_row, to_col):
+                    moves.append((row, col, to_row, to_col, None))
+        for to_col in targets:
+            if to_row == last_row:
+                for promotion in PROMOTION_PIECES:
+                    moves.append((row, col, to_row, to_col, promotion))
+            else:
+                moves.append((row, col, to_row, to_col, None))
+
+    def add_step_moves(self, piece, row, col, offsets, moves):
+        squares = self.squares
+        side = piece.code & BLACK
+        for d_row, d_col in offsets:
+            r, c = row + d_row, col + d_col
+            if 0 <= r < 8 and 0 <= c < 8:
+                target = squares[r * 8 + c]
+                if not target or (target & BLACK) != side:
+                    moves.append((row, col, r, c, None))
+
+    def add_slide_moves(self, piece, row, col, directions, moves):
+        squares = self.squares
+        side = piece.code & BLACK
+        for d_row, d_col in directions:
+            r, c = row + d_row, col + d_col
+            while 0 <= r < 8 and 0 <= c < 8:
+                target = squares[r * 8 + c]
+                if not target:
+                    moves.append((row, col, r, c, None))
+                elif (target & BLACK) != side:
+                    moves.append((row, col, r, c, None))
+                    break
+                else:
+                    break
+                r += d_row
+                c += d_col
+
+    def add_castling_moves(self, piece, row, col, moves):
+        side = piece.code & BLACK
+        if side == WHITE:
+            home_row, kingside, queenside, enemy_color = 0, WHITE_KINGSIDE, WHITE_QUEENSIDE, "black"
+        else:
+            home_row, kingside, queenside, enemy_color = 7, BLACK_KINGSIDE, BLACK_QUEENSIDE, "white"
+        if row != home_row or col != 4 or not self.castling_rights & (kingside | queenside):
+            return
+        if self.is_square_attacked(row, col, enemy_color):
+            return
+        squares = self.squares
+        for right, rook_col, empty_cols, king_path in ((kingside, 7, (5, 6), (5, 6)), (queenside, 0, (1, 2, 3), (3, 2))):
+            if not self.castling_rights & right or squares[row * 8 + rook_col] != side | ROOK:
+                continue
+            if any(squares[row * 8 + c] for c in empty_cols):
+                continue
+            if any(self.is_square_attacked(row, c, enemy_color) for c in king_path):
+                continue
+            moves.append((row, col, row, king_path[1], None))
+
+    """
+    This method checks whether making the given move would
+    leave the king of the moving piece's color attacked. It
+    plays the move with make_move, asks is_square_attacked
+    about the king's square, and takes the move back with
+    unmake_move, so the board is unchanged when it returns.
+    """
+    def leaves_king_in_check(self, move):
+        code = self.squares[move[0] * 8 + move[1]]
+        if code & BLACK:
+            color, enemy_color = "black", "white"
+        else:
+            color, enemy_color = "white", "black"
+        self.make_move(move)
+        king_position = self.find_king(color)
+        in_check = king_position is not None and self.is_square_attacked(king_position[0], king_position[1], enemy_color)
+        self.unmake_move()
+        return in_check
+
+    """
+    This method yields the legal moves of the given color,
+    that is the pseudo-legal moves that do not leave its own
+    king in check. The moves are produced one at a time, so
+    asking only whether a legal move exists stops at the first
+    one found.
+    """
+    def generate_legal_moves(self, color):
+        for move in self.generate_pseudo_legal_moves(color):
+            if not self.leaves_king_in_check(move):
+                yield move
+
+    """
+    This method returns True if the given color has at
+    least one legal move.
+    """
+    def has_legal_move(self, color):
+        for move in self.generate_legal_moves(color):
+            return True
+        return False
+
+    """
+    This method returns how many times the current position
+    has appeared in the history, counting itself. A position
+    can only be the same as one with the same side to move
+    since the last capture or pawn move, so only those keys
+    are compared.
+    """
+    def repetition_count(self):
+        history = self.history
+        key = history[-1]
+        count = 1
+        for i in range(len(history) - 3, max(-1, len(history) - 2 - self.halfmove_clock), -2):
+            if history[i] == key:
+                count += 1
+        return count
+
+    """
+    This method returns True if neither side has enough
+    material left to checkmate: only kings, knights and
+    bishops, with at most one knight or bishop on the board,
+    or only bishops that all stand on squares of one color.
+    It stops at the first pawn, rook or queen it finds.
+    """
+    def has_insufficient_material(self):
+        squares = self.squares
+        minors = []
+        for side in (WHITE, BLACK):
+            for square in self.piece_squares[side]:
+                kind = squares[square] & KIND_MASK
+                if kind == KING:
+                    continue
+                if kind != KNIGHT and kind != BISHOP:
+                    return False
+                minors.append((kind, square))
+        if len(minors) <= 1:
+            return True
+        if any(kind != BISHOP for kind, square in minors):
+            return False
+        return len(set((square // 8 + square % 8) % 2 for kind, square in minors)) == 1
+
+
+"""
+This code defines the headless ChessGame class
+in Python. The class has a constructor method
+(__init__) that creates an instance of the
+ChessBoard class and initializes several instance
+variables like self.selected_piece, self.white_score,
+self.black_score, and self.turn. Another board with
+the same methods, like BitboardChessBoard from
+bitboard.py, can be passed in instead. The make_move method
+moves a piece of the side to move from one square to
+another and passes the turn, is_legal_move asks
+whether such a move would be allowed, and game_status
+reports whether the game is still going or how it
+ended, which result gives as a PGN result. None of these
+methods draw anything, so the class can be used on its
+own or wrapped by a graphical front-end.
+"""
+class ChessGame:
+    def __init__(self, board=None):
+        if board is None:
+            board = ChessBoard()
+        self.board = board
+        self.selected_piece = None
+        self.white_score = 0
+        self.black_score = 0
+        self.status = None
+        self.status_key = None
+        # Tablebases from tablebase.py, if the game should know
+        # how positions with few pieces end
+        self.tablebases = None
+
+    """
+    Whose turn it is, "white" or "black", is kept by the
+    board so that it is passed when a move is made there.
+    """
+    @property
+    def turn(self):
+        return self.board.turn
+
+    @turn.setter
+    def turn(self, color):
+        self.board.turn = color
+
+    """
+    This method moves the piece on the from square to the
+    to square if it belongs to the side to move and the move
+    is legal. The promotion parameter names the piece a pawn
+    reaching the last row becomes; when it is None the
+    choose_promotion method is asked instead. If the move is
+    made the turn is passed to the other player and True is
+    returned, otherwise the game is left unchanged and False
+    is returned.
+    """
+    def make_move(self, from_row, from_col, to_row, to_col, promotion=None):
+        piece = self.board.get_piece_at_position(from_row, from_col)
+        if piece is None or piece.color != self.turn:
+            return False
+        self.selected_piece = piece
+        if self.move_selected_piece(to_row, to_col, promotion):
+            self.selected_piece = None
+            return True
+        self.selected_piece = None
+        return False
+
+    """
+    This method checks, without changing the game, whether
+    the piece on the from square belongs to the side to move
+    and may legally move to the to square.
+    """
+    def is_legal_move(self, from_row, from_col, to_row, to_col):
+        piece = self.board.get_piece_at_position(from_row, from_col)
+        if piece is None or piece.color != self.turn:
+            return False
+        return self.is_valid_move(piece, to_row, to_col)
+
+    """
+    This method passes the turn to the other player.
+    """
+    def switch_turn(self):
+        self.turn = opposite_color(self.turn)
+
+    """
+    This method reports the status of the game. It returns
+    "checkmate" if the side to move has been checkmated,
+    "stalemate" if it has no legal move but is not in check,
+    "insufficient material" if neither side can mate,
+    "fifty-move rule" after fifty moves by each side without
+    a capture or pawn move, "threefold repetition" when the
+    position has appeared three times, and "ongoing"
+    otherwise. Only the side to move is asked, and its legal
+    moves are looked for only until one is found. The status
+    is worked out once after each move and kept with the
+    position's history length and Zobrist key, so asking
+    again before the next move does not look at the board.
+    """
+    def game_status(self):
+        key = (len(self.board.history), self.board.zobrist_key)
+        if key != self.status_key:
+            self.status = self.compute_status()
+            self.status_key = key
+        return self.status
+
+    def compute_status(self):
+        board = self.board
+        if not board.has_legal_move(board.turn):
+            if self.is_in_check(board.turn):
+                return "checkmate"
+            return "stalemate"
+        if board.has_insufficient_material():
+            return "insufficient material"
+        if board.halfmove_clock >= 100:
+            return "fifty-move rule"
+        if board.halfmove_clock >= 8 and board.repetition_count() >= 3:
+            return "threefold repetition"
+        return "ongoing"
+
+    """
+    This method returns the result of the game as PGN writes
+    it: "1-0" or "0-1" when a side has been checkmated,
+    "1/2-1/2" for a draw and "*" while the game goes on.
+    """
+    def result(self):
+        status = self.game_status()
+        if status == "ongoing":
+            return "*"
+        if status == "checkmate":
+            return "0-1" if self.turn == "white" else "1-0"
+        return "1/2-1/2"
+
+    """
+    This method returns the result the game will have with
+    perfect play from the position, "1-0", "0-1" or "1/2-1/2",
+    when self.tablebases has the position, and None otherwise.
+    """
+    def tablebase_result(self):
+        if self.tablebases is None:
+            return None
+        found = self.tablebases.probe(self.board)
+        if found is None:
+            return None
+        if found[0] == "draw":
+            return "1/2-1/2"
+        white_wins = (found[0] == "win") == (self.turn == "white")
+        return "1-0" if white_wins else "0-1"
+
+    """
+    This method decides which piece a pawn that reaches the
+    last row is promoted to when make_move was not told. The
+    headless game always promotes to a queen; the graphical
+    game asks the player instead.
+    """
+    def choose_promotion(self):
+        return "queen"
+
+    """
+    This method updates the score of the game, by checking if a
+    piece is captured, and if so, incrementing the score of the
+    opposing player by 1. The captured piece's color is compared
+    to the selected piece's color to determine which player's score
+    should be incremented. The return statement at the end is not
+    necessary as the function has a void return type.
+    Note: In actual chess the points for capturing a piece depend
+    on the type of piece captured, but this is simplified for the
+    sake of creating a basic implementation of the game
+    """
+    def update_score(self, row, col):
+        captured_piece = self.board.get_piece_at_position(row, col)
+        if captured_piece is not None and captured_piece.color != self.selected_piece.color:
+            if self.selected_piece.color == "white":
+                self.white_score += 1
+            else:
+                self.black_score += 1
+        return
+
+    """
+    The move_selected_piece function is responsible for moving
+    the selected piece to a new position on the chess board.
+    It first checks if a piece is actually selected, and if so
+    it checks if the move is valid using the is_valid_move function.
+    If the move is valid it will play it with the board's make_move
+    method, which also passes the turn,
+    if the piece is a pawn and it reaches the other side of the board,
+    it will promote it to the given piece, or to the piece returned by
+    choose_promotion when none is given. If the
+    move is not valid, it will return False. It also checks if the move
+    is a castle move, where the king moves two columns or is moved
+    onto its own rook, in which case make_move moves the rook too.
+    If a piece is captured, including en passant, it will update
+    the score.
+    """
+    def move_selected_piece(self, row, col, promotion=None):
+        if self.selected_piece is not None:
+            curr_row, curr_col = self.selected_piece.position
+            # clicking the rook a king may castle with is a castle move
+            if self.selected_piece.name == "king" and self.selected_piece.has_moved == False and row == curr_row and curr_col == 4 and (col == 0 or col == 7):
+                rook = self.board.get_piece_at_position(row, col)
+                if rook is not None and rook.name == "rook" and rook.color == self.selected_piece.color:
+                    if col == 7:
+                        col = 6
+                    else:
+                        col = 2
+            if self.is_valid_move(self.selected_piece, row, col):
+                if (self.selected_piece.name == "pawn"):
+                    if ((self.selected_piece.color == "white" and row == 7) or (self.selected_piece.color == "black" and row == 0)):
+                        if promotion is None:
+                            promotion = self.choose_promotion()
+                        if not (((promotion=="queen") or(promotion=="knight")) or ((promotion=="rook") or (promotion=="bishop"))):
+                            promotion = None
+                else:
+                    promotion = None
+                captured_piece = self.board.make_move((curr_row, curr_col, row, col, promotion))
+                if captured_piece is not None:
+                    if captured_piece.color == "white":
+                        self.black_score += 1
+                    else:
+                        self.white_score += 1
+                self.selected_piece = None
+                self.game_status()
+                return True
+            else:
+                return False
+        else:
+            return False
+
+    """
+    This method is checking whether a move for a certain chess
+    piece is valid or not. It first checks the type of piece
+    (pawn, rook, knight, bishop, queen, king) and calls the
+    corresponding function to check if the move is valid. If
+    the move is valid it then plays the move on the board with
+    make_move, checks if the move will put the king in check or
+    not, and takes it back with unmake_move. It returns true if
+    the move is valid and doesn't put king in check, returns
+    false otherwise.
+    """
+    def is_valid_move(self, piece, row, col):
+        valid = False
+        kind = piece.code & KIND_MASK
+        if kind == PAWN:
+            valid = self.is_valid_pawn_move(piece, row, col)
+        elif kind == ROOK:
+            valid = self.is_valid_rook_move(piece, row, col)
+        elif kind == KNIGHT:
+            valid = self.is_valid_knight_move(piece, row, col)
+        elif kind == BISHOP:
+            valid = self.is_valid_bishop_move(piece, row, col)
+        elif kind == QUEEN:
+            valid = self.is_valid_queen_move(piece, row, col)
+        elif kind == KING:
+            valid = self.is_valid_king_move(piece, row, col)
+        if valid:
+            currRow = piece.position[0]
+            currCol = piece.position[1]
+            promotion = None
+            if kind == PAWN and (row == 7 or row == 0):
+                promotion = "queen"
+            self.board.make_move((currRow, currCol, row, col, promotion))
+            valid = not self.is_in_check(piece.color)
+            self.board.unmake_move()
+            if valid:
+                return True
+        return False
+
+    """
+    This code is a method for checking if a move made by a
+    pawn piece is valid. It checks the color of the piece,
+    the position of the piece, and the destination of the
+    move to determine if it is a valid move. It also checks
+    if the destination square is occupied by an opposing
+    color piece, and if so, it is a valid move. A diagonal
+    move onto the board's en passant square, just behind a
+    pawn that has moved two squares, is valid too. If the move
+    is valid, it returns True, otherwise, it returns False.
+    """
+    def is_valid_pawn_move(self, piece, row, col):
+        if self.board.en_passant == (row, col) and abs(col - piece.position[1]) == 1:
+            if (piece.color == "white" and row == 5 and piece.position[0] == 4) or (piece.color == "black" and row == 2 and piece.position[0] == 3):
+                return True
+        if piece.color == "white":
+            if piece.position[0] == 1:
+                if (row == piece.position[0] + 2 and col == piece.position[1] and self.board.get_piece_at_position(row-1, col) == None and self.board.get_piece_at_position(row, col) == None):
+                    return True
+                elif (row == piece.position[0] + 1 and col == piece.position[1] and self.board.get_piece_at_position(row, col) == None):
+                    return True
+                elif (row == piece.position[0] + 1 and abs(col - piece.position[1]) == 1 and self.board.get_piece_at_position(row, col) != None and self.board.get_piece_at_position(row, col).color == "black"):
+                    return True
+            elif (row == piece.position[0] + 1 and col == piece.position[1] and self.board.get_piece_at_position(row, col) == None):
+                return True
+            elif (row == piece.position[0] + 1 and abs(col - piece.position[1]) == 1 and self.board.get_piece_at_position(row, col) != None and self.board.get_piece_at_position(row, col).color == "black"):
+                return True
+            else:
+                return False
+        else:
+            if piece.position[0] == 6:
+                if (row == piece.position[0] - 2 and col == piece.position[1] and self.board.get_piece_at_position(row+1, col) == None and self.board.get_piece_at_position(row, col) == None):
+                    return True
+                elif (row == piece.position[0] - 1 and col == piece.position[1] and self.board.get_piece_at_position(row, col) == None):
+                    return True
+                elif (row == piece.position[0] - 1 and abs(col - piece.position[1]) == 1 and self.board.get_piece_at_position(row, col) != None and self.board.get_piece_at_position(row, col).color == "white"):
+                    return True
+            elif (row == piece.position[0] - 1 and col == piece.position[1] and self.board.get_piece_at_position(row, col) == None):
+                return True
+            elif (row == piece.position[0] - 1 and abs(col - piece.position[1]) == 1 and self.board.get_piece_at_position(row, col) != None and self.board.get_piece_at_position(row, col).color == "white"):
+                return True
+            else:
+                return False
+
+    """
+    This is a method that checks if the move of a
+    rook piece is valid. It first checks if the
+    destination is occupied by a piece of the same
+    color. If it is, the move is considered invalid.
+    Then it checks if the move is being made horizontally
+    or vertically. If it is being made diagonally, it is
+    considered invalid. Finally, it checks if there are
+    any other pieces in the way of the move, if there
+    are the move is considered invalid. If all of these
+    checks pass, the move is considered valid.
+    """
+    def is_valid_rook_move(self, piece, row, col):
+        if piece.color == "white":
+            if self.board.get_piece_at_position(row,col) and self.board.get_piece_at_position(row,col).color == "white":
+                return False
+        else:
+            if self.board.get_piece_at_position(row,col) and self.board.get_piece_at_position(row,col).color == "black":
+                return False
+        if piece.position[0] != row and piece.position[1] != col:
+            return False
+        if piece.position[0] == row:
+            start_col = min(piece.position[1],col)
+            end_col = max(piece.position[1],col)
+            for i in range(start_col+1,end_col):
+                if self.board.get_piece_at_position(row,i):
+                    return False
+        elif piece.position[1] == col:
+            start_row = min(piece.position[0],row)
+            end_row = max(piece.position[0],row)
+            for i in range(start_row+1,end_row):
+                if self.board.get_piece_at_position(i,col):
+                    return False
+        return True
+
+    """
+    This code is a method that checks whether a
+    move made by a knight is valid. It takes in the
+    piece being moved (a knight), the target row and
+    column of the move, and checks if the move is a
+    valid L-shaped movement (2 spaces in one direction,
+    1 space in another direction). It also checks if
+    the target space is unoccupied or if it is occupied
+    by an opposing colored piece. If the move is valid,
+    it returns True, otherwise it returns False.
+    """
+    def is_valid_knight_move(self, piece, row, col):
+        if piece.color == "white":
+            if (row == piece.position[0]-2 and col == piece.position[1]-1) or (row == piece.position[0]-2 and col == piece.position[1]+1) or (row == piece.position[0]-1 and col == piece.position[1]-2) or (row == piece.position[0]-1 and col == piece.position[1]+2) or (row == piece.position[0]+1 and col == piece.position[1]-2) or (row == piece.position[0]+1 and col == piece.position[1]+2) or (row == piece.position[0]+2 and col == piece.position[1]-1) or (row == piece.position[0]+2 and col == piece.position[1]+1):
+                if self.board.get_piece_at_position(row,col) is None or self.board.get_piece_at_position(row,col).color == 'black':
+                    return True
+        elif piece.color == "black":
+            if (row == piece.position[0]-2 and col == piece.position[1]-1) or (row == piece.position[0]-2 and col == piece.position[1]+1) or (row == piece.position[0]-1 and col == piece.position[1]-2) or (row == piece.position[0]-1 and col == piece.position[1]+2) or (row == piece.position[0]+1 and col == piece.position[1]-2) or (row == piece.position[0]+1 and col == piece.position[1]+2) or (row == piece.position[0]+2 and col == piece.position[1]-1) or (row == piece.position[0]+2 and col == piece.position[1]+1):
+                if self.board.get_piece_at_position(row,col) is None or self.board.get_piece_at_position(row,col).color == 'white':
+                    return True
+        return False
+
+    """
+    This function checks if a move from the current
+    position of a chess piece (passed as the piece
+    parameter) to a new position on the board (specified
+    by the row and col parameters) is a valid move for
+    a bishop. It first checks if the move is diagonal
+    and if the destination square is occupied by a
+    piece of the same color. If these conditions are
+    met, it then checks if there are any pieces in the
+    path of the move by iterating through each square
+    on the diagonal path between the current position
+    and the destination square. If there is a piece on
+    any of these squares, the function returns False,
+    indicating that the move is not valid. If the move
+    is valid, it returns True.
+    """
+    def is_valid_bishop_move(self, piece, row, col):
+        from_row, from_col = piece.position
+        if abs(row - from_row) != abs(col - from_col):
+            return False
+        if self.board.get_piece_at_position(row, col) is not None:
+            if self.board.get_piece_at_position(row, col).color == piece.color:
+                return False
+        if from_row < row and from_col < col:
+            for i in range(1, row - from_row):
+                if self.board.get_piece_at_position(from_row + i, from_col + i) is not None:
+                    return False
+        elif from_row < row and from_col > col:
+            for i in range(1, row - from_row):
+                if self.board.get_piece_at_position(from_row + i, from_col - i) is not None:
+                    return False
+        elif from_row > row and from_col < col:
+            for i in range(1, from_row - row):
+                if self.board.get_piece_at_position(from_row - i, from_col + i) is not None:
+                    return False
+        elif from_row > row and from_col > col:
+            for i in range(1, from_row - row):
+                if self.board.get_piece_at_position(from_row - i, from_col - i) is not None:
+                    return False
+        return True
+
+    """
+    This method checks if a move made by a queen
+    piece is valid. It first checks if the move
+    is a valid rook move by calling the is_valid_rook_move
+    function and passing the piece, row, and col as
+    arguments. If the move is not a valid rook move,
+    it then checks if the move is a valid bishop move
+    by calling the is_valid_bishop_move function and
+    passing the piece, row, and col as arguments. If
+    either of these conditions are true, the move is
+    considered valid and the function returns True.
+    Otherwise, the move is considered invalid and the
+    function returns False.
+    """
+    def is_valid_queen_move(self, piece, row, col):
+        curr_row, curr_col = piece.position
+        if (self.is_valid_rook_move(piece, row, col)) or (self.is_valid_bishop_move(piece, row, col)):
+            return True
+        else:
+            return False
+
+    """
+    The method is_valid_king_move checks if a given move
+    for the king piece is valid according to the rules
+    of chess. It first checks if the move is only 1 space
+    in any direction (horizontally or vertically) using
+    the curr_row and curr_col variables which represent
+    the current position of the king piece. If the move is
+    one space in any direction, it then checks if the
+    destination space is empty or occupied by an opposing
+    piece's color. If the destination space is occupied
+    by an opposing piece's color the move is valid and
+    the function returns True. Next it checks if the king
+    has moved before, if it has not moved, it checks if
+    the move is a castling move, two columns towards a rook,
+    and asks the board's add_castling_moves whether the
+    conditions for castling are met (the king and rook have
+    not moved, the spaces between them are empty, and the
+    king does not start in, pass through or land on an
+    attacked square). If all the conditions are met the
+    function returns true, if not the function returns false.
+    """
+    def is_valid_king_move(self, piece, row, col):
+        curr_row, curr_col = piece.position
+        if (abs(curr_row - row) <= 1 and abs(curr_col - col) <= 1):
+            if self.board.get_piece_at_position(row, col) is not None:
+                if piece.color == "white":
+                    if self.board.get_piece_at_position(row, col).color == "black":
+                        return True
+                elif piece.color == "black":
+                    if self.board.get_piece_at_position(row, col).color == "white":
+                        return True
+            else:
+                return True
+            return False
+        elif piece.has_moved == False and row == curr_row and abs(col - curr_col) == 2:
+            castling_moves = []
+            self.board.add_castling_moves(piece, curr_row, curr_col, castling_moves)
+            for move in castling_moves:
+                if move[3] == col:
+                    return True
+        return False
+
+    """
+    This method checks if the king of the given color is in
+    check. It finds the king with find_king and asks the board
+    whether the king's square is attacked by the other color.
+    If there is no king of that color it returns False.
+    """
+    def is_in_check(self, color):
+        king_position = self.find_king(color)
+        if king_position is None:
+            return False
+        if color == "white":
+            enemy_color = "black"
+        else:
+            enemy_color = "white"
+        return self.board.is_square_attacked(king_position[0], king_position[1], enemy_color)
+
+    """
+    This code is checking if a given color is checkmated.
+    The function takes in a parameter "color" which
+    represents the color of the king that needs to be
+    checked for checkmate. The king is checkmated when it
+    is in check and the board's legal move generator has
+    no move at all for that color.
+    """
+    def is_checkmate(self, color):
+        return self.is_in_check(color) and not self.board.has_legal_move(color)
+
+    """
+    This code is checking if a given color is stalemated,
+    which means it is not in check but has no legal move.
+    """
+    def is_stalemate(self, color):
+        return not self.is_in_check(color) and not self.board.has_legal_move(color)
+
+    """
+    This method returns the squares the piece at row, col
+    can legally move to, which the graphical game shows as
+    hints once a piece is selected. It returns an empty list
+    if the square is empty or the piece cannot move.
+    """
+    def legal_destinations(self, row, col):
+        piece = self.board.get_piece_at_position(row, col)
+        if piece is None:
+            return []
+        moves = []
+        self.board.add_piece_moves(piece, row, col, moves)
+        destinations = []
+        for move in moves:
+            if (move[2], move[3]) not in destinations and not self.board.leaves_king_in_check(move):
+                destinations.append((move[2], move[3]))
+        return destinations
+
+    """
+    This method is used to locate the position of the king on
+    the chess board. It takes in a parameter "color" which can
+    be either "white" or "black" and it represents the color of
+    the king to be located. It asks the board's find_king method,
+    which returns a tuple containing the row and column of the
+    king, or None if the king is not found.
+    """
+    def find_king(self, color):
+        return self.board.find_king(color)
@@ -0,0 +1,455 @@
+"""
+This module lets the computer play. The Engine class
+searches the moves of a position with negamax alpha-
+beta search, which looks at the moves of both sides
+in turn and stops looking at a move as soon as it is
+clear the opponent would not allow it. It searches
+one move deep, then two, and so on (iterative
+deepening) until its time runs out, and then plays
+the best move of the deepest search it finished. At
+the end of each search it keeps looking at captures
+only (quiescence search), so that a position is not
+scored in the middle of an exchange. Moves are tried
+in the order most likely to be best: the move the
+transposition table remembers, then captures of the
+most valuable piece by the least valuable attacker
+(MVV-LVA), then quiet moves that caused a cutoff at
+the same depth before (killer moves), and then the
+quiet moves with the best history of cutoffs.
+"""
+import time
+
+from rules import opposite_color, KIND_MASK, PAWN
+from evaluation import evaluate, PIECE_VALUES, CODE_VALUES
+from transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from tablebase import DRAW, LOSS
+
+# A checkmate scores MATE_SCORE less the number of moves
+# it takes, so that nearer mates score higher. Any score
+# past MATE_THRESHOLD is a mate.
+MATE_SCORE = 30000
+MATE_THRESHOLD = MATE_SCORE - 1000
+INFINITY = MATE_SCORE + 1
+MAX_PLY = 64
+# how many nodes are searched between looks at the clock
+CLOCK_CHECK_NODES = 128
+
+"""
+This exception is raised inside the search when the time
+runs out, to unwind it back to the root.
+"""
+class SearchTimeout(Exception):
+    pass
+
+"""
+This class holds the result of a search: the best move,
+its score in centipawns from the side to move, the depth
+reached, the nodes searched, the seconds taken and the
+principal variation, the line of best play that follows.
+"""
+class SearchResult:
+    def __init__(self, move, score, depth, nodes, seconds, pv):
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.seconds = seconds
+        self.pv = pv
+
+"""
+These functions move mate scores between the two ways of
+counting them: from the root in the search, and from the
+position itself in the transposition table, so that a mate
+found through one path is scored right when reached by
+another.
+"""
+def score_to_table(score, ply):
+    if score > MATE_THRESHOLD:
+        return score + ply
+    if score < -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+def score_from_table(score, ply):
+    if score > MATE_THRESHOLD:
+        return score - ply
+    if score < -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+"""
+This function turns a tablebase value, which counts the
+plies to mate from the position, into a score for a
+position ply plies from the root: a mate found there scores
+as if the search had reached it, and a draw scores 0.
+"""
+def tablebase_score(value, ply):
+    if value == DRAW:
+        return 0
+    if value >= LOSS:
+        return -MATE_SCORE + ply + value - LOSS
+    return MATE_SCORE - ply - value
+
+"""
+This code defines the Engine class. Its constructor takes
+the size of the transposition table in megabytes, the
+evaluation function, an optional OpeningBook from book.py
+and optional Tablebases from tablebase.py, and sets up the
+killer moves and the history table. The search method
+finds the best move on a board within a time limit and
+play_move plays it in a ChessGame, or plays a book move
+without searching if the book has one. Positions in the
+tablebases are scored exactly instead of being searched,
+and at the root the tablebase move is played at once.
+Setting self.stopped to True from elsewhere stops a
+running search as if its time had run out.
+"""
+class Engine:
+    def __init__(self, hash_mb=16, evaluate=evaluate, book=None, tablebases=None):
+        self.tt = TranspositionTable(hash_mb)
+        self.evaluate = evaluate
+        self.book = book
+        self.tablebases = tablebases
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.history = [[0] * 64 for _ in range(64)]
+        self.nodes = 0
+        self.deadline = None
+        self.stopped = False
+
+    """
+    This method searches the position on the board with
+    iterative deepening until max_depth is reached, a mate is
+    found, or time_limit seconds have passed, and returns a
+    SearchResult. When the time runs out in the middle of a
+    depth the result of the last finished depth is used,
+    unless the unfinished depth already found a move that
+    beats the best move of the last one. A new depth is not
+    started once half the time is gone, since it would most
+    likely not finish. If time_limit is None the search only
+    stops at max_depth. The callback, if given, is called with
+    the SearchResult of every finished depth. If root_moves is
+    given, only those moves are searched at the root, which is
+    how ParallelEngine in parallel.py shares out the work. The
+    board is left as it was.
+    """
+    def search(self, board, time_limit=1.0, max_depth=MAX_PLY, callback=None, root_moves=None):
+        start = time.perf_counter()
+        self.deadline = None if time_limit is None else start + time_limit
+        self.stopped = False
+        self.nodes = 0
+        self.tt.new_search()
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        for row in self.history:
+            for i in range(64):
+                row[i] //= 2
+        moves = list(board.generate_legal_moves(board.turn))
+        if not moves:
+            king = board.find_king(board.turn)
+            in_check = king is not None and board.is_square_attacked(king[0], king[1], opposite_color(board.turn))
+            return SearchResult(None, -MATE_SCORE if in_check else 0, 0, 0, 0.0, [])
+        # with one legal reply there is nothing to choose, but a
+        # share of root moves with one move still has to be
+        # searched deeply to be compared with the other shares
+        single_reply = len(moves) == 1
+        if root_moves is None:
+            result = self.tablebase_result(board)
+            if result is not None:
+                return result
+        else:
+            moves = [move for move in moves if move in root_moves] or moves
+        result = SearchResult(moves[0], 0, 0, 0, 0.0, [moves[0]])
+        undo_depth = len(board.undo_stack)
+        for depth in range(1, max_depth + 1):
+            self.root_best = None
+            try:
+                score, move = self.search_root(board, moves, depth)
+            except SearchTimeout:
+                while len(board.undo_stack) > undo_depth:
+                    board.unmake_move()
+                if self.root_best is not None:
+                    result = SearchResult(self.root_best[1], self.root_best[0], depth, self.nodes, time.perf_counter() - start, [self.root_best[1]])
+                break
+            seconds = time.perf_counter() - start
+            result = SearchResult(move, score, depth, self.nodes, seconds, self.principal_variation(board, move, depth))
+            if callback is not None:
+                callback(result)
+            if abs(score) > MATE_THRESHOLD or single_reply:
+                break
+            if time_limit is not None and seconds > time_limit / 2:
+                break
+        result.nodes = self.nodes
+        result.seconds = time.perf_counter() - start
+        return result
+
+    """
+    This method searches every root move to the given depth
+    and returns the best score and move. The best move of the
+    last depth is searched first.
+    """
+    def search_root(self, board, moves, depth):
+        entry = self.tt.probe(board.zobrist_key)
+        tt_move = entry[3] if entry is not None else None
+        moves.sort(key=lambda move: self.move_order_score(board, move, tt_move, 0), reverse=True)
+        alpha = -INFINITY
+        best_move = moves[0]
+        for move in moves:
+            board.make_move(move)
+            score = -self.negamax(board, depth - 1, -INFINITY, -alpha, 1)
+            board.unmake_move()
+            if score > alpha:
+                alpha = score
+                best_move = move
+                if move is not moves[0]:
+                    # a move has beaten the best move of the last depth
+                    self.root_best = (score, move)
+        self.tt.store(board.zobrist_key, depth, score_to_table(alpha, 0), EXACT, best_move)
+        return alpha, best_move
+
+    """
+    This method raises SearchTimeout when the time is up or
+    the search has been stopped. It only looks at the clock
+    every CLOCK_CHECK_NODES nodes.
+    """
+    def check_clock(self):
+        if self.nodes % CLOCK_CHECK_NODES == 0:
+            if self.stopped or (self.deadline is not None and time.perf_counter() >= self.deadline):
+                self.stopped = True
+                raise SearchTimeout()
+
+    """
+    This method returns True if the position on the board
+    appeared before in its history with the same side to move
+    since the last capture or pawn move, or if fifty moves by
+    each side have passed without one, in which case the
+    search scores it as a draw.
+    """
+    def is_repetition(self, board):
+        if board.halfmove_clock >= 100:
+            return True
+        history = board.history
+        key = history[-1]
+        for i in range(len(history) - 3, max(-1, len(history) - 2 - board.halfmove_clock), -2):
+            if history[i] == key:
+                return True
+        return False
+
+    """
+    This method is the alpha-beta search. It returns the score
+    of the position for the side to move, searched depth moves
+    deep, as long as it lies between alpha and beta; otherwise
+    it returns a bound. A side in check is searched one move
+    deeper. Results are stored in the transposition table and
+    used again when the same position is reached.
+    """
+    def negamax(self, board, depth, alpha, beta, ply):
+        self.nodes += 1
+        self.check_clock()
+        if self.is_repetition(board):
+            return 0
+        if self.tablebases is not None:
+            value = self.tablebases.probe_value(board)
+            if value is not None:
+                return tablebase_score(value, ply)
+        color = board.turn
+        enemy_color = opposite_color(color)
+        king = board.find_king(color)
+        in_check = board.is_square_attacked(king[0], king[1], enemy_color)
+        if in_check:
+            depth += 1
+        if depth <= 0 or ply >= MAX_PLY:
+            return self.quiescence(board, alpha, beta, ply)
+        key = board.zobrist_key
+        tt_move = None
+        entry = self.tt.probe(key)
+        if entry is not None:
+            entry_depth, entry_score, bound, tt_move = entry
+            if entry_depth >= depth:
+                entry_score = score_from_table(entry_score, ply)
+                if bound == EXACT:
+                    return entry_score
+                if bound == LOWER_BOUND and entry_score >= beta:
+                    return entry_score
+                if bound == UPPER_BOUND and entry_score <= alpha:
+                    return entry_score
+        moves = board.generate_pseudo_legal_moves(color)
+        moves.sort(key=lambda move: self.move_order_score(board, move, tt_move, ply), reverse=True)
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        legal_moves = 0
+        for move in moves:
+            quiet = not self.is_capture(board, move) and move[4] is None
+            board.make_move(move)
+            king = board.find_king(color)
+            if board.is_square_attacked(king[0], king[1], enemy_color):
+                board.unmake_move()
+                continue
+            legal_moves += 1
+            score = -self.negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            board.unmake_move()
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if quiet:
+                            self.remember_cutoff(move, depth, ply)
+                        break
+        if legal_moves == 0:
+            if in_check:
+                return -MATE_SCORE + ply
+            return 0
+        if best_score <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.tt.store(key, depth, score_to_table(best_score, ply), bound, best_move)
+        return best_score
+
+    """
+    This method searches only captures and promotions, so that
+    positions are scored once they are quiet. The side to move
+    may also stand pat, that is keep the score of the position
+    as it is, since it does not have to capture.
+    """
+    def quiescence(self, board, alpha, beta, ply):
+        self.nodes += 1
+        self.check_clock()
+        if self.tablebases is not None:
+            value = self.tablebases.probe_value(board)
+            if value is not None:
+                return tablebase_score(value, ply)
+        stand_pat = self.evaluate(board)
+        if stand_pat >= beta or ply >= MAX_PLY:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        color = board.turn
+        enemy_color = opposite_color(color)
+        captures = [move for move in board.generate_pseudo_legal_moves(color) if move[4] is not None or self.is_capture(board, move)]
+        captures.sort(key=lambda move: self.capture_score(board, move), reverse=True)
+        for move in captures:
+            board.make_move(move)
+            king = board.find_king(color)
+            if board.is_square_attacked(king[0], king[1], enemy_color):
+                board.unmake_move()
+                continue
+            score = -self.quiescence(board, -beta, -alpha, ply + 1)
+            board.unmake_move()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def is_capture(self, board, move):
+        if board.squares[move[2] * 8 + move[3]]:
+            return True
+        # a pawn moving diagonally onto an empty square takes en passant
+        return move[1] != move[3] and (board.squares[move[0] * 8 + move[1]] & KIND_MASK) == PAWN
+
+    """
+    This method scores a capture by MVV-LVA: the value of the
+    piece taken counts most, and the value of the piece taking
+    it breaks ties, so that a pawn taking a queen comes before
+    a queen taking a pawn.
+    """
+    def capture_score(self, board, move):
+        attacker = board.squares[move[0] * 8 + move[1]]
+        victim = board.squares[move[2] * 8 + move[3]]
+        victim_value = CODE_VALUES[victim] if victim else PIECE_VALUES["pawn"]
+        score = victim_value * 10 - CODE_VALUES[attacker] // 10
+        if move[4] is not None:
+            score += PIECE_VALUES[move[4]] * 10
+        return score
+
+    def move_order_score(self, board, move, tt_move, ply):
+        if move == tt_move:
+            return 10000000
+        if move[4] is not None or self.is_capture(board, move):
+            return 1000000 + self.capture_score(board, move)
+        killers = self.killers[ply]
+        if move == killers[0]:
+            return 900000
+        if move == killers[1]:
+            return 800000
+        return self.history[move[0] * 8 + move[1]][move[2] * 8 + move[3]]
+
+    """
+    This method remembers a quiet move that caused a cutoff as
+    a killer move for its ply and adds to its history score,
+    more for deeper searches.
+    """
+    def remember_cutoff(self, move, depth, ply):
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        history = self.history[move[0] * 8 + move[1]]
+        history[move[2] * 8 + move[3]] = min(history[move[2] * 8 + move[3]] + depth * depth, 700000)
+
+    """
+    This method follows the best moves stored in the
+    transposition table from the root to build the principal
+    variation, checking that each one is legal.
+    """
+    def principal_variation(self, board, first_move, depth):
+        pv = [first_move]
+        board.make_move(first_move)
+        while len(pv) < depth:
+            entry = self.tt.probe(board.zobrist_key)
+            if entry is None or entry[3] is None or self.is_repetition(board):
+                break
+            if entry[3] not in board.generate_legal_moves(board.turn):
+                break
+            pv.append(entry[3])
+            board.make_move(entry[3])
+        for _ in pv:
+            board.unmake_move()
+        return pv
+
+    """
+    This method returns a SearchResult of depth 0 with a move
+    the opening book gives for the position, or None if there
+    is no book or the position is not in it.
+    """
+    def book_result(self, board):
+        if self.book is None:
+            return None
+        move = self.book.choose(board)
+        if move is None:
+            return None
+        return SearchResult(move, 0, 0, 0, 0.0, [move])
+
+    """
+    This method returns a SearchResult of depth 0 with the
+    move the tablebases give for the position and its exact
+    score, or None if the position is not in them.
+    """
+    def tablebase_result(self, board):
+        if self.tablebases is None:
+            return None
+        found = self.tablebases.best_move(board)
+        if found is None:
+            return None
+        move, value = found
+        return SearchResult(move, tablebase_score(value, 0), 0, 0, 0.0, [move])
+
+    """
+    This method searches the position of a ChessGame for at
+    most time_limit seconds and makes the best move in the
+    game. It returns the SearchResult, whose move is None if
+    the side to move has no legal move. A move from the book
+    is played at once, with a result of depth 0.
+    """
+    def play_move(self, game, time_limit=1.0, max_depth=MAX_PLY):
+        result = self.book_result(game.board)
+        if result is None:
+            result = self.search(game.board, time_limit, max_depth)
+        if result.move is not None:
+            from_row, from_col, to_row, to_col, promotion = result.move
+            game.make_move(from_row, from_col, to_row, to_col, promotion)
+        return result
@@ -0,0 +1,333 @@
+"""
+This module runs a game server that hosts many games
+at once for clients over TCP. It is built on asyncio,
+so one process serves thousands of connections
+without a thread for each: the event loop only reads
+requests and writes replies, while the work that
+takes time is handed to executors. Checking and
+making a move and working out whether the game is
+over run in a pool of threads, and engine moves run
+in a pool of processes, each with its own Engine, so
+a long search never holds up the other games. Each
+game is a headless ChessGame from rules.py with a
+lock of its own, so requests for one game are
+handled one at a time while other games go on.
+
+The protocol is one JSON object per line each way.
+A request has an "op" and, optionally, an "id" that
+is sent back with its reply:
+
+    {"op": "new", "fen": "...", "engine": "black", "depth": 3}
+    {"op": "move", "game": 1, "move": "e2e4", "legal": true}
+    {"op": "engine", "game": 1}
+    {"op": "state", "game": 1, "legal": true}
+    {"op": "close", "game": 1}
+    {"op": "stats"}
+
+fen, engine, depth and movetime are optional in
+"new"; a game with an engine color gets the engine's
+reply to every move, in "engine_move". Moves are
+written in coordinate notation, such as e2e4 or
+e7e8q, or in SAN. Every game reply has the game id,
+its FEN, the side to move, its status and result as
+ChessGame gives them, and the number of moves played,
+with the legal moves when "legal" is true. A request
+that cannot be served gets {"error": "..."}. A
+connection can only use the games it made, and they
+are closed when it closes. Run it with
+
+    python3 server.py --port 8765 --workers 4
+
+and measure it with loadgen.py.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from rules import ChessGame, ChessBoard, STARTING_FEN
+from search import Engine
+from pgn import parse_san, PGNError
+from perft import move_name
+
+# The Engine of a worker process, made when the process starts.
+worker_engine = None
+
+def start_worker(hash_mb):
+    global worker_engine
+    worker_engine = Engine(hash_mb)
+
+"""
+This function runs in a worker process. It searches the
+board and returns the best move, or None if there is none.
+"""
+def engine_search(board, time_limit, max_depth):
+    return worker_engine.search(board, time_limit, max_depth).move
+
+"""
+This exception is raised for a request that cannot be
+served, and its message is sent back to the client.
+"""
+class ProtocolError(ValueError):
+    pass
+
+"""
+This class holds one hosted game: the ChessGame, the color
+its engine plays or None, how deep and how long the engine
+searches, the coordinate names of the moves played, and the
+lock that keeps two requests from changing it at once.
+"""
+class GameSession:
+    def __init__(self, game_id, game, engine_color=None, depth=3, movetime=None):
+        self.id = game_id
+        self.game = game
+        self.engine_color = engine_color
+        self.depth = depth
+        self.movetime = movetime
+        self.moves = []
+        self.lock = asyncio.Lock()
+
+    def state(self, legal=False):
+        board = self.game.board
+        state = {"game": self.id, "fen": board.to_fen(), "turn": board.turn, "status": self.game.game_status(),
+                 "result": self.game.result(), "moves": len(self.moves)}
+        if legal:
+            state["legal"] = [move_name(move) for move in board.generate_legal_moves(board.turn)]
+        return state
+
+    def engine_to_move(self, state):
+        return state["turn"] == self.engine_color and state["status"] == "ongoing"
+
+    """
+    This method finds the legal move written as text, in
+    coordinate notation or SAN, and raises a ProtocolError if
+    there is none.
+    """
+    def find_move(self, text):
+        board = self.game.board
+        for move in board.generate_legal_moves(board.turn):
+            if move_name(move) == text:
+                return move
+        try:
+            return parse_san(board, text)
+        except PGNError:
+            raise ProtocolError("illegal move %s" % text)
+
+    """
+    This method plays a move in the game and returns its
+    state. It is run in a thread of the server's rules pool,
+    since checking the move and the game status takes time.
+    """
+    def play(self, move, legal=False):
+        if self.game.game_status() != "ongoing":
+            raise ProtocolError("game %d is over" % self.id)
+        if isinstance(move, str):
+            move = self.find_move(move)
+        from_row, from_col, to_row, to_col, promotion = move
+        if not self.game.make_move(from_row, from_col, to_row, to_col, promotion):
+            raise ProtocolError("illegal move %s" % move_name(move))
+        self.moves.append(move_name(move))
+        return self.state(legal)
+
+"""
+This code defines the GameServer class. Its constructor takes
+the number of engine processes and rules threads, which both
+default to the number of cores, and the transposition table
+size of each engine process. The process pool is only started
+when an engine first has to move. serve listens on a host and
+port until it is cancelled.
+"""
+class GameServer:
+    def __init__(self, workers=None, threads=None, hash_mb=16):
+        self.workers = workers or os.cpu_count() or 1
+        self.hash_mb = hash_mb
+        self.rules_pool = ThreadPoolExecutor(threads or os.cpu_count() or 1)
+        self.engine_pool = None
+        self.games = {}
+        self.ids = itertools.count(1)
+        self.started = time.perf_counter()
+        self.counts = {"connections": 0, "requests": 0, "games": 0, "moves": 0, "engine_moves": 0, "errors": 0}
+
+    def close(self):
+        self.rules_pool.shutdown()
+        if self.engine_pool is not None:
+            self.engine_pool.shutdown()
+            self.engine_pool = None
+
+    async def run_rules(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.rules_pool, function, *args)
+
+    """
+    This method has the engine of a session choose a move in
+    the process pool and plays it, returning its name.
+    """
+    async def engine_move(self, session):
+        if self.engine_pool is None:
+            self.engine_pool = ProcessPoolExecutor(self.workers, initializer=start_worker, initargs=(self.hash_mb,))
+        loop = asyncio.get_running_loop()
+        move = await loop.run_in_executor(self.engine_pool, engine_search, session.game.board, session.movetime, session.depth)
+        if move is None:
+            return None
+        await self.run_rules(session.play, move)
+        self.counts["engine_moves"] += 1
+        return move_name(move)
+
+    """
+    This method returns the session of the game a request names,
+    which must be one of the games owned by the connection, so
+    that a client cannot play in or close another's game.
+    """
+    def session(self, request, owned):
+        try:
+            game_id = int(request["game"])
+        except KeyError:
+            raise ProtocolError("no game %s" % request.get("game"))
+        except (TypeError, ValueError):
+            raise ProtocolError("bad game id %r" % request.get("game"))
+        if game_id not in owned or game_id not in self.games:
+            raise ProtocolError("no game %s" % game_id)
+        return self.games[game_id]
+
+    """
+    This method serves one request and returns its reply. The
+    ids of the games it makes are added to owned, so that they
+    are closed with the connection.
+    """
+    async def dispatch(self, request, owned):
+        op = request.get("op")
+        legal = bool(request.get("legal"))
+        if op == "new":
+            engine_color = request.get("engine")
+            if engine_color not in (None, "white", "black"):
+                raise ProtocolError("engine must be white or black")
+            fen = request.get("fen") or STARTING_FEN
+            if not isinstance(fen, str):
+                raise ProtocolError("fen must be a string")
+            board = ChessBoard()
+            try:
+                board.load_fen(fen)
+            except (ValueError, IndexError, KeyError):
+                raise ProtocolError("cannot read FEN %s" % fen)
+            if not board.is_legal_position():
+                raise ProtocolError("illegal position %s" % fen)
+            movetime = request.get("movetime")
+            session = GameSession(next(self.ids), ChessGame(board), engine_color, int(request.get("depth", 3)), None if movetime is None else float(movetime))
+            self.games[session.id] = session
+            owned.add(session.id)
+            self.counts["games"] += 1
+            async with session.lock:
+                reply = await self.run_rules(session.state, legal)
+                if session.engine_to_move(reply):
+                    reply["engine_move"] = await self.engine_move(session)
+                    reply.update(await self.run_rules(session.state, legal))
+            return reply
+        if op == "move":
+            session = self.session(request, owned)
+            if not isinstance(request.get("move"), str):
+                raise ProtocolError("missing move")
+            async with session.lock:
+                reply = await self.run_rules(session.play, request["move"], legal)
+                self.counts["moves"] += 1
+                if session.engine_to_move(reply):
+                    reply["engine_move"] = await self.engine_move(session)
+                    reply.update(await self.run_rules(session.state, legal))
+            return reply
+        if op == "engine":
+            session = self.session(request, owned)
+            async with session.lock:
+                if await self.run_rules(session.game.game_status) != "ongoing":
+                    raise ProtocolError("game %d is over" % session.id)
+                move = await self.engine_move(session)
+                reply = await self.run_rules(session.state, legal)
+            reply["engine_move"] = move
+            return reply
+        if op == "state":
+            session = self.session(request, owned)
+            async with session.lock:
+                return await self.run_rules(session.state, legal)
+        if op == "close":
+            session = self.session(request, owned)
+            # wait for a move of the game that is still running
+            async with session.lock:
+                self.games.pop(session.id, None)
+                owned.discard(session.id)
+            return {"game": session.id, "closed": True}
+        if op == "stats":
+            stats = dict(self.counts)
+            stats["open_games"] = len(self.games)
+            stats["seconds"] = time.perf_counter() - self.started
+            return stats
+        raise ProtocolError("unknown op %r" % op)
+
+    """
+    This method serves one connection, a request at a time in
+    the order they arrive, until the client closes it.
+    """
+    async def handle_client(self, reader, writer):
+        self.counts["connections"] += 1
+        owned = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.counts["requests"] += 1
+                request = {}
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ProtocolError("a request must be a JSON object")
+                    reply = await self.dispatch(request, owned)
+                except (ValueError, TypeError) as error:
+                    # ProtocolError, json's errors for bad JSON, and
+                    # values of the wrong type in a request
+                    self.counts["errors"] += 1
+                    reply = {"error": str(error)}
+                except Exception as error:
+                    # a request the checks above missed must not end
+                    # the connection and close the client's games
+                    self.counts["errors"] += 1
+                    print("error serving %r: %r" % (request, error), file=sys.stderr)
+                    reply = {"error": "cannot serve request: %s" % type(error).__name__}
+                if "id" in request:
+                    reply["id"] = request["id"]
+                writer.write((json.dumps(reply) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for game_id in owned:
+                self.games.pop(game_id, None)
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765, ready=None):
+        server = await asyncio.start_server(self.handle_client, host, port, limit=1 << 20)
+        if ready is not None:
+            ready(server)
+        async with server:
+            await server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Host chess games for clients over TCP with a JSON protocol.")
+    parser.add_argument("--host", default="127.0.0.1", help="the address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="the port to listen on")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes for engine moves")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="threads for checking moves")
+    parser.add_argument("--hash", type=int, default=16, help="transposition table megabytes per engine process")
+    args = parser.parse_args(argv)
+    server = GameServer(args.workers, args.threads, args.hash)
+    ready = lambda listening: print("listening on %s port %d" % (args.host, args.port), file=sys.stderr)
+    try:
+        asyncio.run(server.serve(args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,763 @@
+"""
+This module builds and reads endgame tablebases:
+files that hold the result of perfect play from every
+position with a few pieces, such as king and queen
+against king (KQK). A table is built by retrograde
+analysis. Every position of its material is set out,
+the checkmates are found, and the results are worked
+backwards one ply at a time: a position from which a
+move reaches a position lost for the opponent is won
+one ply later, and a position whose every move
+reaches a position won for the opponent is lost one
+ply later, until nothing changes. What is left is
+drawn. Moves that capture or promote change the
+material, so their results are looked up in the
+smaller tables, which are built first. Each position
+is kept in one byte holding whether the side to move
+wins, draws or loses and how many plies the mate
+takes (the distance to mate, DTM). Positions are
+numbered so that mirror images share one entry: the
+white king is moved into the a1-d1-d4 triangle by
+turning and flipping the board, or onto the a-d files
+when there are pawns, which only allow a mirror from
+left to right. The Tablebases class maps the files of
+a directory into memory and looks positions up in
+place, so the search and the game status can ask
+them at any time. Tables are built and read with
+
+    python3 tablebase.py build KQK KRK KPK --dir tables
+    python3 tablebase.py probe --fen "<fen>" --dir tables
+
+The moves are generated here from the move tables of
+rules.py, on squares only, since setting out millions
+of positions on a ChessBoard would take far too long.
+Castling and en passant are never possible in these
+positions, and a board that has either is not looked up.
+"""
+import argparse
+import itertools
+import mmap
+import os
+import sys
+import time
+
+from rules import (ChessBoard, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, KIND_MASK, WHITE, BLACK,
+                   KNIGHT_TARGETS, KING_TARGETS, PAWN_ATTACKERS, ROOK_LINES, BISHOP_LINES)
+from perft import move_name
+
+# A table file starts with MAGIC and its signature, padded to
+# HEADER_SIZE bytes, and then has one byte per position:
+# DRAW, a win in 1 to 127 plies, LOSS plus the plies to be
+# mated in, or INVALID for positions that cannot happen or
+# are stored under a mirror image.
+MAGIC = b"CTB1"
+HEADER_SIZE = 16
+DRAW = 0
+LOSS = 128
+INVALID = 255
+MAX_PIECES = 4
+TABLE_SUFFIX = ".ctb"
+PIECE_LETTERS = {"K": KING, "Q": QUEEN, "R": ROOK, "B": BISHOP, "N": KNIGHT, "P": PAWN}
+# the letters of a signature are written strongest first
+LETTER_ORDER = "KQRBNP"
+CODE_LETTERS = " PNBRQK"
+PROMOTION_KINDS = (QUEEN, ROOK, BISHOP, KNIGHT)
+
+# The squares a pawn of each color on a square captures on,
+# the queen's lines, and for every pair of squares on one
+# line the kind of piece that slides along it with the
+# squares in between, so that an attack is a lookup.
+PAWN_CAPTURES = {WHITE: PAWN_ATTACKERS[BLACK], BLACK: PAWN_ATTACKERS[WHITE]}
+PAWN_CAPTURE_SETS = {side: [frozenset(targets) for targets in PAWN_CAPTURES[side]] for side in (WHITE, BLACK)}
+KNIGHT_SETS = [frozenset(targets) for targets in KNIGHT_TARGETS]
+KING_SETS = [frozenset(targets) for targets in KING_TARGETS]
+QUEEN_LINES = [ROOK_LINES[square] + BISHOP_LINES[square] for square in range(64)]
+BETWEEN = [[None] * 64 for _ in range(64)]
+for square in range(64):
+    for lines, kind in ((ROOK_LINES, ROOK), (BISHOP_LINES, BISHOP)):
+        for line in lines[square]:
+            for i, target in enumerate(line):
+                BETWEEN[square][target] = (kind, line[:i])
+
+"""
+The eight ways of turning and flipping the board, each as
+a list of where every square goes. The first two, leaving
+the board alone and mirroring it left to right, are the
+only ones that keep pawns moving the same way.
+"""
+def transform_square(square, flip_col, flip_row, swap):
+    row, col = divmod(square, 8)
+    if swap:
+        row, col = col, row
+    if flip_row:
+        row = 7 - row
+    if flip_col:
+        col = 7 - col
+    return row * 8 + col
+
+TRANSFORMS = [tuple(transform_square(square, flip_col, flip_row, swap) for square in range(64))
+              for swap in (False, True) for flip_row in (False, True) for flip_col in (False, True)]
+
+def part_strength(part):
+    return (len(part), [-LETTER_ORDER.index(letter) for letter in part])
+
+"""
+This function returns a material signature, such as "kbnk"
+or "KNBK", written the way tables are named: white's pieces
+and then black's, each starting with the king and strongest
+first, with the stronger side written as white. A ValueError
+is raised for a signature that is not two kings and other
+pieces, or has more than MAX_PIECES pieces.
+"""
+def normalize_signature(signature):
+    text = signature.upper()
+    if not text.startswith("K") or text.count("K") != 2 or any(letter not in PIECE_LETTERS for letter in text) or len(text) > MAX_PIECES:
+        raise ValueError("bad material signature %s" % signature)
+    split = text.index("K", 1)
+    white = "".join(sorted(text[:split], key=LETTER_ORDER.index))
+    black = "".join(sorted(text[split:], key=LETTER_ORDER.index))
+    if part_strength(black) > part_strength(white):
+        white, black = black, white
+    return white + black
+
+"""
+This function returns the signature of a list of piece
+codes and whether the colors have to be swapped to look
+the position up, which is when black is the stronger side.
+"""
+def material_signature(codes):
+    white = "".join(sorted((CODE_LETTERS[code & KIND_MASK] for code in codes if not code & BLACK), key=LETTER_ORDER.index))
+    black = "".join(sorted((CODE_LETTERS[code & KIND_MASK] for code in codes if code & BLACK), key=LETTER_ORDER.index))
+    if part_strength(black) > part_strength(white):
+        return black + white, True
+    return white + black, False
+
+"""
+This function tells whether a signature is a draw whatever
+the position, as the rules decide for insufficient material:
+two kings with at most one knight or bishop. Such material
+has no table.
+"""
+def is_drawn_material(signature):
+    others = signature.replace("K", "")
+    return others in ("", "B", "N")
+
+"""
+This function returns the signatures a table needs looked up
+while it is built: those reached by capturing one piece or
+promoting a pawn, other than drawn material.
+"""
+def table_dependencies(signature):
+    found = set()
+    for i, letter in enumerate(signature):
+        if letter == "K":
+            continue
+        found.add(signature[:i] + signature[i + 1:])
+        if letter == "P":
+            for promotion in "QRBN":
+                found.add(signature[:i] + promotion + signature[i + 1:])
+    found = set(normalize_signature(text) for text in found)
+    return sorted(text for text in found if not is_drawn_material(text))
+
+"""
+This function returns True if the square is attacked by a
+piece of side, given the codes and squares of every piece.
+"""
+def is_attacked(target, side, codes, squares):
+    occupied = None
+    for code, square in zip(codes, squares):
+        if code & BLACK != side:
+            continue
+        kind = code & KIND_MASK
+        if kind == KNIGHT:
+            if target in KNIGHT_SETS[square]:
+                return True
+        elif kind == KING:
+            if target in KING_SETS[square]:
+                return True
+        elif kind == PAWN:
+            if target in PAWN_CAPTURE_SETS[side][square]:
+                return True
+        else:
+            line = BETWEEN[square][target]
+            if line is not None and (kind == QUEEN or kind == line[0]):
+                if occupied is None:
+                    occupied = set(squares)
+                for between in line[1]:
+                    if between in occupied:
+                        break
+                else:
+                    return True
+    return False
+
+"""
+This function returns the squares the piece on square can
+move to, given a dictionary of the occupied squares. The
+squares of its own pieces are included and left for the
+caller to skip, and a pawn's captures are only included
+when something stands there.
+"""
+def piece_targets(code, square, occupied):
+    kind = code & KIND_MASK
+    if kind == KNIGHT:
+        return KNIGHT_TARGETS[square]
+    if kind == KING:
+        return KING_TARGETS[square]
+    targets = []
+    if kind == PAWN:
+        step = -8 if code & BLACK else 8
+        ahead = square + step
+        if ahead not in occupied:
+            targets.append(ahead)
+            if square // 8 == (6 if code & BLACK else 1) and ahead + step not in occupied:
+                targets.append(ahead + step)
+        for target in PAWN_CAPTURES[code & BLACK][square]:
+            if target in occupied:
+                targets.append(target)
+        return targets
+    lines = ROOK_LINES[square] if kind == ROOK else BISHOP_LINES[square] if kind == BISHOP else QUEEN_LINES[square]
+    for line in lines:
+        for target in line:
+            targets.append(target)
+            if target in occupied:
+                break
+    return targets
+
+"""
+This function returns the empty squares the piece on square
+could have come from by a move that captured nothing: the
+squares it moves to itself, or for a pawn the one or two
+squares behind it.
+"""
+def piece_origins(code, square, occupied):
+    if code & KIND_MASK != PAWN:
+        return [target for target in piece_targets(code, square, occupied) if target not in occupied]
+    step = 8 if code & BLACK else -8
+    behind = square + step
+    origins = []
+    if 8 <= behind < 56 and behind not in occupied:
+        origins.append(behind)
+        if square // 8 == (4 if code & BLACK else 3) and behind + step not in occupied:
+            origins.append(behind + step)
+    return origins
+
+"""
+This code defines the TableLayout class, which numbers the
+positions of one signature. A position is a list of squares,
+one for each piece in the order of the signature, and the
+side to move, 0 for white and 1 for black. The canonical
+method turns a position into the one mirror image that is
+stored, with the white king in one of the slots and pieces
+of the same kind in order, and index gives its number: the
+side to move, then the white king's slot, then each other
+square, as digits. position turns a number back.
+"""
+class TableLayout:
+    def __init__(self, signature):
+        self.signature = normalize_signature(signature)
+        split = self.signature.index("K", 1)
+        self.codes = tuple(WHITE | PIECE_LETTERS[letter] for letter in self.signature[:split]) + \
+            tuple(BLACK | PIECE_LETTERS[letter] for letter in self.signature[split:])
+        self.count = len(self.codes)
+        self.kings = {WHITE: 0, BLACK: split}
+        self.pawns = [i for i, code in enumerate(self.codes) if code & KIND_MASK == PAWN]
+        self.transforms = TRANSFORMS[:2] if self.pawns else TRANSFORMS
+        self.slots = tuple(square for square in range(64) if square % 8 < 4 and (self.pawns or square // 8 <= square % 8))
+        self.slot_index = {square: i for i, square in enumerate(self.slots)}
+        self.side_size = len(self.slots) * 64 ** (self.count - 1)
+        self.size = 2 * self.side_size
+        # runs of pieces of the same kind, whose squares are sorted
+        self.groups = []
+        start = 0
+        for i in range(1, self.count + 1):
+            if i == self.count or self.codes[i] != self.codes[start]:
+                if i - start > 1:
+                    self.groups.append((start, i))
+                start = i
+
+    def canonical(self, squares):
+        best = None
+        for transform in self.transforms:
+            if transform[squares[0]] not in self.slot_index:
+                continue
+            mapped = [transform[square] for square in squares]
+            for start, end in self.groups:
+                mapped[start:end] = sorted(mapped[start:end])
+            if best is None or mapped < best:
+                best = mapped
+        return best
+
+    def index(self, squares, stm):
+        squares = self.canonical(squares)
+        index = self.slot_index[squares[0]]
+        for square in squares[1:]:
+            index = index * 64 + square
+        return stm * self.side_size + index
+
+    def position(self, index):
+        stm, index = divmod(index, self.side_size)
+        squares = []
+        for _ in range(self.count - 1):
+            index, square = divmod(index, 64)
+            squares.append(square)
+        squares.append(self.slots[index])
+        squares.reverse()
+        return squares, stm
+
+    """
+    This method puts the squares of pieces given in any order
+    into the order of the signature. The codes must be the
+    signature's pieces.
+    """
+    def order(self, codes, squares):
+        by_code = {}
+        for code, square in zip(codes, squares):
+            by_code.setdefault(code, []).append(square)
+        return [by_code[code].pop() for code in self.codes]
+
+    """
+    This method tells whether a position in canonical order
+    can happen and is the one stored of its mirror images:
+    no two pieces on one square, no pawn on the first or last
+    row, and the side that is not to move not in check.
+    """
+    def is_valid(self, squares, stm):
+        if len(set(squares)) != self.count:
+            return False
+        for i in self.pawns:
+            if not 8 <= squares[i] < 56:
+                return False
+        if self.canonical(squares) != squares:
+            return False
+        waiting = BLACK if stm == 0 else WHITE
+        return not is_attacked(squares[self.kings[waiting]], waiting ^ BLACK, self.codes, squares)
+
+"""
+This code defines the TablebaseGenerator class, which builds
+the table of one signature in memory. The tablebases it is
+given must hold every table in table_dependencies, since
+captures and promotions are looked up there. generate works
+out every position and write saves the table to a file.
+"""
+class TablebaseGenerator:
+    def __init__(self, signature, tablebases):
+        self.layout = TableLayout(signature)
+        self.tablebases = tablebases
+        self.values = bytearray(self.layout.size)
+        self.exits = bool(table_dependencies(self.layout.signature))
+
+    """
+    This generator gives back the (codes, squares) of every
+    position the side to move reaches with a legal move. The
+    codes are the layout's own tuple unless the move captured
+    or promoted.
+    """
+    def successors(self, squares, stm):
+        codes = self.layout.codes
+        side = BLACK if stm else WHITE
+        enemy = side ^ BLACK
+        king = self.layout.kings[side]
+        occupied = {square: i for i, square in enumerate(squares)}
+        for i, code in enumerate(codes):
+            if code & BLACK != side:
+                continue
+            for target in piece_targets(code, squares[i], occupied):
+                captured = occupied.get(target)
+                if captured is not None and codes[captured] & BLACK == side:
+                    continue
+                new_squares = list(squares)
+                new_squares[i] = target
+                new_codes = codes
+                moved = i
+                if captured is not None:
+                    del new_squares[captured]
+                    new_codes = codes[:captured] + codes[captured + 1:]
+                    if captured < i:
+                        moved -= 1
+                king_square = target if i == king else squares[king]
+                if is_attacked(king_square, enemy, new_codes, new_squares):
+                    continue
+                if code & KIND_MASK == PAWN and target // 8 in (0, 7):
+                    for kind in PROMOTION_KINDS:
+                        yield new_codes[:moved] + (side | kind,) + new_codes[moved + 1:], new_squares
+                else:
+                    yield new_codes, new_squares
+
+    """
+    This generator gives back the value of every position the
+    side to move reaches, seen by the opponent, who moves
+    there.
+    """
+    def successor_values(self, squares, stm):
+        layout = self.layout
+        for codes, new_squares in self.successors(squares, stm):
+            if codes is layout.codes:
+                yield self.values[layout.index(new_squares, 1 - stm)]
+            else:
+                yield self.tablebases.lookup(codes, new_squares, 1 - stm)
+
+    """
+    This generator gives back the index of every position with
+    the same material from which a move reaches this one.
+    """
+    def predecessors(self, squares, stm):
+        layout = self.layout
+        mover = 1 - stm
+        side = BLACK if mover else WHITE
+        occupied = {square: i for i, square in enumerate(squares)}
+        for i, code in enumerate(layout.codes):
+            if code & BLACK != side:
+                continue
+            for origin in piece_origins(code, squares[i], occupied):
+                new_squares = list(squares)
+                new_squares[i] = origin
+                yield layout.index(new_squares, mover)
+
+    """
+    This method returns in how many plies the side to move is
+    mated if every move reaches a position won for the
+    opponent, or None if a move does not, or there is none.
+    """
+    def loss_distance(self, squares, stm):
+        worst = 0
+        moves = 0
+        for value in self.successor_values(squares, stm):
+            if value == DRAW or value >= LOSS:
+                return None
+            moves += 1
+            if value > worst:
+                worst = value
+        return worst + 1 if moves else None
+
+    """
+    This method returns the value of a position from the moves
+    that change the material only, as the ply it should be
+    settled at, or None: the fastest win through a capture or
+    promotion, or the slowest loss if every move is one.
+    """
+    def exit_level(self, squares, stm):
+        win = None
+        worst = 0
+        all_lost = True
+        for codes, new_squares in self.successors(squares, stm):
+            if codes is self.layout.codes:
+                all_lost = False
+                continue
+            value = self.tablebases.lookup(codes, new_squares, 1 - stm)
+            if value >= LOSS:
+                if win is None or value - LOSS + 1 < win:
+                    win = value - LOSS + 1
+            elif value == DRAW:
+                all_lost = False
+            else:
+                worst = max(worst, value + 1)
+        if win is not None:
+            return win
+        if all_lost and worst:
+            return worst
+        return None
+
+    """
+    This method builds the table. It marks the positions that
+    cannot happen and finds the checkmates, then settles the
+    positions one ply at a time: at an odd ply every position
+    that moves into a loss settled at the ply before is won,
+    and at an even ply every position that moves into a win
+    settled at the ply before is lost if all its moves are
+    wins for the opponent. Captures and promotions come from
+    other tables with their own distances, so such a position
+    waits in pending until the ply its value belongs to. The
+    progress function, if given, is called with the ply and
+    the number of positions settled at it. It returns the
+    values.
+    """
+    def generate(self, progress=None):
+        layout = self.layout
+        values = self.values
+        pending = {}
+        current = []
+        index = 0
+        for stm in (0, 1):
+            side = BLACK if stm else WHITE
+            for slot in layout.slots:
+                for others in itertools.product(range(64), repeat=layout.count - 1):
+                    squares = [slot]
+                    squares.extend(others)
+                    if not layout.is_valid(squares, stm):
+                        values[index] = INVALID
+                    else:
+                        level = self.exit_level(squares, stm) if self.exits else None
+                        if level is not None:
+                            pending.setdefault(level, []).append(index)
+                        elif is_attacked(squares[layout.kings[side]], side ^ BLACK, layout.codes, squares):
+                            if next(self.successors(squares, stm), None) is None:
+                                values[index] = LOSS
+                                current.append(index)
+                    index += 1
+        if progress is not None:
+            progress(0, len(current))
+        level = 1
+        while current or any(waiting >= level for waiting in pending):
+            if level >= LOSS - 1:
+                raise ValueError("%s has a mate longer than a table can hold" % layout.signature)
+            candidates = set(pending.pop(level, ()))
+            for index in current:
+                squares, stm = layout.position(index)
+                for before in self.predecessors(squares, stm):
+                    if values[before] == DRAW:
+                        candidates.add(before)
+            current = []
+            for index in candidates:
+                if values[index] != DRAW:
+                    continue
+                if level % 2:
+                    values[index] = level
+                    current.append(index)
+                    continue
+                squares, stm = layout.position(index)
+                distance = self.loss_distance(squares, stm)
+                if distance == level:
+                    values[index] = LOSS + level
+                    current.append(index)
+                elif distance is not None and distance > level:
+                    pending.setdefault(distance, []).append(index)
+            if progress is not None:
+                progress(level, len(current))
+            level += 1
+        return values
+
+    """
+    This method writes the table to path, first to a temporary
+    file that then replaces it, so that a reader never sees
+    half a table.
+    """
+    def write(self, path):
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as stream:
+            stream.write(MAGIC + self.layout.signature.encode("ascii").ljust(HEADER_SIZE - len(MAGIC)))
+            stream.write(self.values)
+        os.replace(temporary, path)
+
+"""
+This code defines the Tablebase class, which reads one table
+file. The file is mapped into memory and each lookup reads
+one byte of it.
+"""
+class Tablebase:
+    def __init__(self, path):
+        self.path = path
+        self.stream = open(path, "rb")
+        self.data = mmap.mmap(self.stream.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("%s is not a tablebase" % path)
+        self.layout = TableLayout(self.data[len(MAGIC):HEADER_SIZE].decode("ascii").strip())
+        if len(self.data) != HEADER_SIZE + self.layout.size:
+            self.close()
+            raise ValueError("%s is not the size of a %s table" % (path, self.layout.signature))
+
+    def close(self):
+        self.data.close()
+        self.stream.close()
+
+    def value(self, squares, stm):
+        return self.data[HEADER_SIZE + self.layout.index(squares, stm)]
+
+"""
+This function turns a value into ("win", "draw" or "loss",
+plies to mate) for the side to move. A draw has 0 plies.
+"""
+def describe_value(value):
+    if value == DRAW:
+        return "draw", 0
+    if value >= LOSS:
+        return "loss", value - LOSS
+    return "win", value
+
+"""
+This code defines the Tablebases class, which looks positions
+up in the tables of a directory. Tables are opened the first
+time they are needed and stay open until close is called.
+lookup works on piece codes and squares; probe, probe_value
+and best_move work on a board, and return None when the
+position has more pieces than the largest table, has no
+table, or may still castle or take en passant.
+"""
+class Tablebases:
+    def __init__(self, directory):
+        self.directory = directory
+        self.tables = {}
+        self.max_pieces = 0
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.endswith(TABLE_SUFFIX):
+                    self.max_pieces = max(self.max_pieces, len(name) - len(TABLE_SUFFIX))
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table.close()
+        self.tables = {}
+
+    def path(self, signature):
+        return os.path.join(self.directory, signature + TABLE_SUFFIX)
+
+    def table(self, signature):
+        if signature not in self.tables:
+            path = self.path(signature)
+            self.tables[signature] = Tablebase(path) if os.path.exists(path) else None
+            if self.tables[signature] is not None:
+                self.max_pieces = max(self.max_pieces, len(signature))
+        return self.tables[signature]
+
+    """
+    This method returns the value of the position of the
+    pieces with the given codes on the given squares, with
+    side stm to move, or None if there is no table for it.
+    Colors are swapped when black is the stronger side.
+    """
+    def lookup(self, codes, squares, stm):
+        signature, flipped = material_signature(codes)
+        if is_drawn_material(signature):
+            return DRAW
+        table = self.table(signature)
+        if table is None:
+            return None
+        if flipped:
+            codes = [code ^ BLACK for code in codes]
+            squares = [square ^ 56 for square in squares]
+            stm = 1 - stm
+        return table.value(table.layout.order(codes, squares), stm)
+
+    """
+    This method returns the value of the board's position for
+    the side to move, or None. Boards with more pieces than the
+    largest table are turned away before anything else is
+    looked at, so the search can ask at every node.
+    """
+    def probe_value(self, board):
+        if len(board.piece_squares[WHITE]) + len(board.piece_squares[BLACK]) > self.max_pieces:
+            return None
+        if board.castling_rights or board.en_passant is not None:
+            return None
+        squares = list(board.piece_squares[WHITE]) + list(board.piece_squares[BLACK])
+        codes = [board.squares[square] for square in squares]
+        value = self.lookup(codes, squares, 0 if board.turn == "white" else 1)
+        return None if value == INVALID else value
+
+    """
+    This method returns ("win", "draw" or "loss", plies to
+    mate) for the side to move on the board, or None.
+    """
+    def probe(self, board):
+        value = self.probe_value(board)
+        if value is None:
+            return None
+        return describe_value(value)
+
+    """
+    This method returns the move that keeps the best result
+    for the side to move, with the value of the position: the
+    fastest mate in a won position, a move that holds the draw
+    in a drawn one, and the slowest loss in a lost one. It
+    returns None if the position or one of the positions after
+    its moves cannot be looked up, or there is no legal move.
+    """
+    def best_move(self, board):
+        value = self.probe_value(board)
+        if value is None:
+            return None
+        best = None
+        for move in board.generate_legal_moves(board.turn):
+            board.make_move(move)
+            reply = self.probe_value(board)
+            board.unmake_move()
+            if reply is None:
+                return None
+            if reply >= LOSS:
+                rank = (2, -(reply - LOSS))
+            elif reply == DRAW:
+                rank = (1, 0)
+            else:
+                rank = (0, reply)
+            if best is None or rank > best[0]:
+                best = (rank, move)
+        if best is None:
+            return None
+        return best[1], value
+
+"""
+This function builds the tables of the signatures in the
+directory, first building any table they need that is not
+there yet, and returns the signatures it built. Tables that
+are already there are not built again unless rebuild is True.
+"""
+def build_tables(signatures, directory, rebuild=False, log=None):
+    os.makedirs(directory, exist_ok=True)
+    tablebases = Tablebases(directory)
+    built = []
+    def build(signature, requested):
+        path = tablebases.path(signature)
+        if os.path.exists(path) and not (rebuild and requested):
+            return
+        for dependency in table_dependencies(signature):
+            build(dependency, False)
+        start = time.perf_counter()
+        generator = TablebaseGenerator(signature, tablebases)
+        progress = None
+        if log is not None:
+            progress = lambda level, count: log("%s ply %d: %d positions" % (signature, level, count))
+        values = generator.generate(progress)
+        generator.write(path)
+        tablebases.tables.pop(signature, None)
+        built.append(signature)
+        if log is not None:
+            wins = sum(1 for value in values if 0 < value < LOSS)
+            losses = sum(1 for value in values if LOSS <= value < INVALID)
+            draws = sum(1 for value in values if value == DRAW)
+            longest = max([value for value in values if 0 < value < LOSS] or [0])
+            log("%s: %d wins, %d draws, %d losses, longest mate %d plies, %.1fs" % (signature, wins, draws, losses, longest, time.perf_counter() - start))
+    try:
+        for signature in signatures:
+            build(normalize_signature(signature), True)
+    finally:
+        tablebases.close()
+    return built
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or look up endgame tablebases.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build the tables of some signatures, such as KQK or KBNK")
+    build.add_argument("signatures", nargs="+", help="the material signatures to build")
+    build.add_argument("--dir", default="tables", help="the directory of table files")
+    build.add_argument("--rebuild", action="store_true", help="build the tables again if they are there")
+    probe = commands.add_parser("probe", help="look up a position")
+    probe.add_argument("--fen", required=True, help="the position to look up")
+    probe.add_argument("--dir", default="tables", help="the directory of table files")
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        try:
+            build_tables(args.signatures, args.dir, args.rebuild, log=lambda text: print(text, file=sys.stderr))
+        except ValueError as error:
+            print(error, file=sys.stderr)
+            return 1
+        return 0
+    tablebases = Tablebases(args.dir)
+    board = ChessBoard()
+    board.load_fen(args.fen)
+    found = tablebases.best_move(board)
+    if found is None:
+        print("not in the tables")
+        tablebases.close()
+        return 1
+    move, value = found
+    result, plies = describe_value(value)
+    if result == "draw":
+        print("draw  best move %s" % move_name(move))
+    else:
+        print("%s in %d plies  best move %s" % (result, plies, move_name(move)))
+    tablebases.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
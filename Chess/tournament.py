@@ -0,0 +1,474 @@
+"""
+This module plays matches between two engine
+configurations to tell whether a change made the
+engine stronger. The games are played by headless
+ChessGame objects in a pool of worker processes, each
+keeping one Engine per configuration from game to
+game. Every game starts from a position of an opening
+list, and each opening is played twice with the colors
+swapped, so neither side is helped by the openings.
+Moves are made under a time control of a base time
+and an increment per move, or a fixed time or depth
+per move. A game ends as the rules end it, by mate or
+a draw, and can also be decided early (adjudicated):
+when both engines agree for some moves that one side
+is far ahead, when the score has stayed near zero for
+a long time, when the tablebases know the result, or
+after a number of moves. A side whose clock runs out
+loses.
+
+The result of the match is given as the first
+configuration's score, its Elo difference with a 95%
+error bar, and the likelihood that it is stronger.
+With --sprt the match is a sequential probability
+ratio test (SPRT), which stops as soon as the games
+show that the Elo difference is more likely elo1 than
+elo0, or the other way round, so that a clear result
+takes few games. Every game is written to a PGN file
+as it ends, and a summary, with the games per hour
+played, is printed and can be saved as JSON. Run it
+with
+
+    python3 tournament.py --engine name=new,depth=3 --engine name=old,depth=2 --games 200 --tc 10+0.1 --pgn match.pgn
+    python3 tournament.py --engine name=bitboard,board=bitboard --engine name=mailbox --movetime 0.05 --sprt --elo0 0 --elo1 10
+
+An engine is written as comma-separated key=value
+pairs: name, hash (megabytes), depth, board (mailbox
+or bitboard), book (an opening book file) and
+tablebases (a directory of tables).
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from rules import ChessGame, ChessBoard, STARTING_FEN
+from bitboard import BitboardChessBoard
+from search import Engine, MAX_PLY, MATE_THRESHOLD
+from book import OpeningBook
+from tablebase import Tablebases
+from pgn import Game, parse_san, write_games
+
+# The openings played when no file is given, in SAN from the
+# starting position.
+OPENINGS = (
+    "e4 e5 Nf3 Nc6 Bb5 a6",
+    "e4 e5 Nf3 Nc6 Bc4 Bc5",
+    "e4 c5 Nf3 d6 d4 cxd4 Nxd4 Nf6 Nc3",
+    "e4 c5 Nc3 Nc6 g3",
+    "e4 e6 d4 d5 Nc3 Bb4",
+    "e4 c6 d4 d5 e5 Bf5",
+    "e4 d5 exd5 Qxd5 Nc3 Qa5",
+    "d4 d5 c4 e6 Nc3 Nf6 Bg5",
+    "d4 d5 c4 c6 Nf3 Nf6 Nc3",
+    "d4 Nf6 c4 g6 Nc3 Bg7 e4 d6",
+    "d4 Nf6 c4 e6 Nc3 Bb4",
+    "d4 f5 g3 Nf6 Bg2 g6",
+    "c4 e5 Nc3 Nf6 g3",
+    "Nf3 d5 g3 Nf6 Bg2 c6",
+    "e4 e5 f4 exf4 Nf3",
+    "e4 Nf6 e5 Nd5 d4 d6",
+)
+ENGINE_KEYS = ("name", "hash", "depth", "board", "book", "tablebases")
+BOARD_CLASSES = {"mailbox": ChessBoard, "bitboard": BitboardChessBoard}
+
+"""
+This function reads an engine written as key=value pairs into
+a dictionary with every key, raising a ValueError for a key it
+does not know.
+"""
+def parse_engine(text, number):
+    config = {"name": "engine%d" % number, "hash": 16, "depth": MAX_PLY, "board": "mailbox", "book": None, "tablebases": None}
+    for pair in text.split(","):
+        if not pair.strip():
+            continue
+        key, _, value = pair.partition("=")
+        key = key.strip()
+        if key not in ENGINE_KEYS:
+            raise ValueError("unknown engine key %s, expected one of %s" % (key, ", ".join(ENGINE_KEYS)))
+        config[key] = int(value) if key in ("hash", "depth") else value.strip()
+    if config["board"] not in BOARD_CLASSES:
+        raise ValueError("board must be %s" % " or ".join(BOARD_CLASSES))
+    return config
+
+"""
+This function reads a time control written as base+increment
+in seconds, such as 10+0.1, or just a base.
+"""
+def parse_time_control(text):
+    base, _, increment = text.partition("+")
+    return float(base), float(increment or 0)
+
+"""
+This function turns a list of SAN moves from the starting
+position into a FEN.
+"""
+def opening_fen(sans):
+    board = ChessBoard()
+    for san in sans.split():
+        board.make_move(parse_san(board, san))
+    return board.to_fen()
+
+"""
+This function reads an opening file, one FEN or EPD position
+per line, leaving out blank lines, lines starting with # and
+anything after a ;.
+"""
+def read_openings(path):
+    openings = []
+    with open(path) as stream:
+        for line in stream:
+            fen = line.split(";")[0].strip()
+            if fen and not fen.startswith("#"):
+                openings.append(fen)
+    return openings
+
+# The engines of a worker process, by configuration name.
+worker_engines = {}
+
+def worker_engine(config):
+    engine = worker_engines.get(config["name"])
+    if engine is None:
+        book = OpeningBook(config["book"]) if config["book"] else None
+        tablebases = Tablebases(config["tablebases"]) if config["tablebases"] else None
+        engine = worker_engines[config["name"]] = Engine(config["hash"], book=book, tablebases=tablebases)
+    return engine
+
+"""
+This function returns the seconds the side to move may think,
+given its clock and the increment: a share of what is left,
+assuming about thirty more moves, and most of the increment,
+but never more than nine tenths of the clock.
+"""
+def allotted_time(clock, increment):
+    return max(0.001, min(clock * 0.9, clock / 30.0 + increment * 0.8))
+
+"""
+This function runs in a worker process and plays one game. The
+job gives the game's number, the opening FEN, the white and
+black engine configurations, and the match settings. It
+returns a dictionary with the moves, the result, why the game
+ended, and for each color the nodes searched and seconds
+thought. The game is played on a ChessBoard, and each engine
+searches a board of its own configured class, on which every
+move of the game is played as well.
+"""
+def play_game(job):
+    settings = job["settings"]
+    configs = {"white": job["white"], "black": job["black"]}
+    board = ChessBoard()
+    board.load_fen(job["fen"])
+    game = ChessGame(board)
+    search_boards = {}
+    for color in configs:
+        search_boards[color] = BOARD_CLASSES[configs[color]["board"]]()
+        search_boards[color].load_fen(job["fen"])
+    if settings["tablebases"]:
+        game.tablebases = Tablebases(settings["tablebases"])
+    clocks = {"white": settings["base"], "black": settings["base"]}
+    stats = {"white": [0, 0.0], "black": [0, 0.0]}
+    scores = []
+    moves = []
+    result = None
+    reason = None
+    while result is None:
+        status = game.game_status()
+        if status != "ongoing":
+            result = game.result()
+            reason = status
+            break
+        tablebase_result = game.tablebase_result() if settings["tablebases"] else None
+        if tablebase_result is not None:
+            result, reason = tablebase_result, "tablebases"
+            break
+        if len(moves) >= settings["max_plies"]:
+            result, reason = "1/2-1/2", "move limit"
+            break
+        color = game.turn
+        engine = worker_engine(configs[color])
+        if settings["movetime"] is not None or settings["base"] is None:
+            time_limit = settings["movetime"]
+        else:
+            time_limit = allotted_time(clocks[color], settings["increment"])
+        start = time.perf_counter()
+        search_board = search_boards[color]
+        search = engine.book_result(search_board) or engine.search(search_board, time_limit, configs[color]["depth"])
+        seconds = time.perf_counter() - start
+        stats[color][0] += search.nodes
+        stats[color][1] += seconds
+        if settings["base"] is not None:
+            clocks[color] -= seconds
+            if clocks[color] < 0:
+                result, reason = ("0-1" if color == "white" else "1-0"), "time forfeit"
+                break
+            clocks[color] += settings["increment"]
+        from_row, from_col, to_row, to_col, promotion = search.move
+        game.make_move(from_row, from_col, to_row, to_col, promotion)
+        for search_board in search_boards.values():
+            search_board.make_move(search.move)
+        moves.append(search.move)
+        if search.depth > 0:
+            scores.append(search.score if color == "white" else -search.score)
+        result, reason = adjudicate(scores, len(moves), settings)
+    if game.tablebases is not None:
+        game.tablebases.close()
+    return {"index": job["index"], "fen": job["fen"], "white": job["white"]["name"], "black": job["black"]["name"], "moves": moves,
+            "result": result, "reason": reason, "nodes": {color: stats[color][0] for color in stats}, "seconds": {color: stats[color][1] for color in stats}}
+
+"""
+This function decides a game early from the engines' scores,
+each from white's side: a win for the side both engines have
+put ahead by resign_score for resign_moves moves each, or a
+draw once draw_moves moves each have scored within draw_score
+of zero after the first draw_after moves. Mate scores always
+count as far ahead. It returns (result, reason), or (None,
+None) to play on.
+"""
+def adjudicate(scores, plies, settings):
+    count = 2 * settings["resign_moves"]
+    if settings["resign_score"] and len(scores) >= count:
+        recent = scores[-count:]
+        if all(score >= settings["resign_score"] for score in recent):
+            return "1-0", "adjudicated win"
+        if all(score <= -settings["resign_score"] for score in recent):
+            return "0-1", "adjudicated win"
+    count = 2 * settings["draw_moves"]
+    if settings["draw_moves"] and plies >= 2 * settings["draw_after"] and len(scores) >= count:
+        if all(abs(score) <= settings["draw_score"] and abs(score) < MATE_THRESHOLD for score in scores[-count:]):
+            return "1/2-1/2", "adjudicated draw"
+    return None, None
+
+"""
+These functions turn a match into statistics. elo returns the
+Elo difference for a score fraction, and match_statistics the
+score of the first engine, its Elo difference with the half
+width of a 95% interval, and the likelihood of superiority
+(LOS), the chance that it is the stronger engine, from its
+wins, draws and losses.
+"""
+def elo(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return 400.0 * math.log10(score / (1.0 - score))
+
+def match_statistics(wins, draws, losses):
+    games = wins + draws + losses
+    if games == 0:
+        return {"score": 0.5, "elo": 0.0, "error": 0.0, "los": 0.5}
+    score = (wins + 0.5 * draws) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    deviation = math.sqrt(variance / games)
+    error = (elo(score + 1.96 * deviation) - elo(score - 1.96 * deviation)) / 2 if deviation > 0 else 0.0
+    los = 0.5 * (1 + math.erf((wins - losses) / math.sqrt(2.0 * (wins + losses)))) if wins + losses else 0.5
+    return {"score": score, "elo": elo(score), "error": error, "los": los}
+
+"""
+This function returns the log-likelihood ratio (LLR) of the
+SPRT between the hypotheses that the Elo difference is elo0
+and that it is elo1, by the usual normal approximation from
+the mean and variance of the game scores. The test accepts
+elo1 when the LLR reaches log((1 - beta) / alpha) and elo0
+when it falls to log(beta / (1 - alpha)).
+"""
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    games = wins + draws + losses
+    if games == 0 or wins + losses == 0:
+        return 0.0
+    score = (wins + 0.5 * draws) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance <= 0:
+        return 0.0
+    score0 = 1.0 / (1.0 + 10 ** (-elo0 / 400.0))
+    score1 = 1.0 / (1.0 + 10 ** (-elo1 / 400.0))
+    return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+def sprt_bounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+"""
+This code defines the Match class, which keeps the tally of a
+match between engines a and b: the results from a's side, how
+the games ended, and the nodes and seconds of each engine.
+"""
+class Match:
+    def __init__(self, a, b):
+        self.a = a
+        self.b = b
+        self.wins = self.draws = self.losses = 0
+        self.reasons = {}
+        self.plies = 0
+        self.nodes = {a: 0, b: 0}
+        self.seconds = {a: 0.0, b: 0.0}
+
+    @property
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def add(self, record):
+        if record["result"] == "1/2-1/2":
+            self.draws += 1
+        elif (record["result"] == "1-0") == (record["white"] == self.a):
+            self.wins += 1
+        else:
+            self.losses += 1
+        self.reasons[record["reason"]] = self.reasons.get(record["reason"], 0) + 1
+        self.plies += len(record["moves"])
+        for color in ("white", "black"):
+            self.nodes[record[color]] += record["nodes"][color]
+            self.seconds[record[color]] += record["seconds"][color]
+
+    def summary(self, seconds, sprt=None):
+        report = {"engines": [self.a, self.b], "games": self.games, "wins": self.wins, "draws": self.draws, "losses": self.losses,
+                  "seconds": seconds, "games_per_hour": 3600.0 * self.games / seconds if seconds > 0 else 0.0,
+                  "average_plies": self.plies / self.games if self.games else 0.0, "reasons": self.reasons,
+                  "nodes_per_second": {name: self.nodes[name] / self.seconds[name] if self.seconds[name] > 0 else 0.0 for name in (self.a, self.b)}}
+        report.update(match_statistics(self.wins, self.draws, self.losses))
+        if sprt is not None:
+            elo0, elo1, alpha, beta = sprt
+            lower, upper = sprt_bounds(alpha, beta)
+            llr = sprt_llr(self.wins, self.draws, self.losses, elo0, elo1)
+            decision = "accept elo1 (H1)" if llr >= upper else "accept elo0 (H0)" if llr <= lower else "continue"
+            report["sprt"] = {"elo0": elo0, "elo1": elo1, "alpha": alpha, "beta": beta, "llr": llr, "lower": lower, "upper": upper, "decision": decision}
+        return report
+
+def summary_lines(report):
+    a, b = report["engines"]
+    lines = ["%s vs %s: %d games, +%d =%d -%d, score %.1f%%" % (a, b, report["games"], report["wins"], report["draws"], report["losses"], 100 * report["score"]),
+             "Elo difference %+.1f +/- %.1f, LOS %.1f%%" % (report["elo"], report["error"], 100 * report["los"])]
+    if "sprt" in report:
+        sprt = report["sprt"]
+        lines.append("SPRT elo0=%g elo1=%g: LLR %.2f (%.2f, %.2f) %s" % (sprt["elo0"], sprt["elo1"], sprt["llr"], sprt["lower"], sprt["upper"], sprt["decision"]))
+    lines.append("%.0f games/hour, %.1f plies per game, %s" % (report["games_per_hour"], report["average_plies"],
+                 ", ".join("%s %d" % item for item in sorted(report["reasons"].items()))))
+    lines.append("nodes/s: %s" % ", ".join("%s %.0f" % (name, report["nodes_per_second"][name]) for name in report["engines"]))
+    return lines
+
+"""
+This function turns a finished game into a pgn.Game with the
+match's tags.
+"""
+def pgn_game(record, event, time_control):
+    headers = {"Event": event, "Site": "tournament.py", "Date": time.strftime("%Y.%m.%d"), "Round": str(record["index"] + 1),
+               "White": record["white"], "Black": record["black"], "Termination": record["reason"], "TimeControl": time_control}
+    if record["fen"] != STARTING_FEN:
+        headers["FEN"] = record["fen"]
+        headers["SetUp"] = "1"
+    return Game(headers, record["moves"], record["result"])
+
+"""
+This generator gives the jobs of the match: each opening in
+turn, played once with each engine as white, until games
+jobs have been given.
+"""
+def match_jobs(engines, openings, games, settings):
+    for index in range(games):
+        pair, color = divmod(index, 2)
+        white, black = (engines[0], engines[1]) if color == 0 else (engines[1], engines[0])
+        yield {"index": index, "fen": openings[pair % len(openings)], "white": white, "black": black, "settings": settings}
+
+"""
+This function plays the match with a pool of workers, keeping
+at most two games per worker waiting, and calls on_game with
+each finished game's record and the Match. It stops early when
+stop, given the Match, returns True. It returns the Match.
+"""
+def run_match(engines, openings, games, settings, workers, on_game=None, stop=None):
+    match = Match(engines[0]["name"], engines[1]["name"])
+    jobs = match_jobs(engines, openings, games, settings)
+    with ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        finished = False
+        while not finished:
+            while len(pending) < 2 * workers:
+                job = next(jobs, None)
+                if job is None:
+                    break
+                pending.add(pool.submit(play_game, job))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                match.add(record)
+                if on_game is not None:
+                    on_game(record, match)
+                if stop is not None and stop(match):
+                    finished = True
+        for future in pending:
+            future.cancel()
+    return match
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play a match between two engine configurations.")
+    parser.add_argument("--engine", action="append", default=[], help="an engine as key=value pairs; give it twice")
+    parser.add_argument("--games", type=int, default=100, help="how many games to play at most")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="how many games to play at once")
+    parser.add_argument("--openings", help="a file of opening positions, one FEN per line")
+    parser.add_argument("--tc", help="the time control of each side as base+increment seconds, such as 10+0.1")
+    parser.add_argument("--movetime", type=float, help="a fixed number of seconds per move instead of a time control")
+    parser.add_argument("--max-plies", type=int, default=300, help="call the game a draw after this many moves")
+    parser.add_argument("--resign-score", type=int, default=800, help="adjudicate a win when both engines score one side this far ahead (0 to turn off)")
+    parser.add_argument("--resign-moves", type=int, default=4, help="for this many moves each")
+    parser.add_argument("--draw-score", type=int, default=10, help="adjudicate a draw when the score stays within this of zero")
+    parser.add_argument("--draw-moves", type=int, default=8, help="for this many moves each (0 to turn off)")
+    parser.add_argument("--draw-after", type=int, default=40, help="but not before this many moves each")
+    parser.add_argument("--tablebases", help="adjudicate with the tablebases in this directory")
+    parser.add_argument("--sprt", action="store_true", help="stop as soon as the SPRT accepts elo0 or elo1")
+    parser.add_argument("--elo0", type=float, default=0.0, help="the Elo difference of the SPRT's null hypothesis")
+    parser.add_argument("--elo1", type=float, default=5.0, help="the Elo difference of the SPRT's alternative hypothesis")
+    parser.add_argument("--alpha", type=float, default=0.05, help="the SPRT's false positive rate")
+    parser.add_argument("--beta", type=float, default=0.05, help="the SPRT's false negative rate")
+    parser.add_argument("--pgn", help="write every game to this PGN file")
+    parser.add_argument("--report", help="write the summary to this file as JSON")
+    parser.add_argument("--quiet", action="store_true", help="do not print a line for every game")
+    args = parser.parse_args(argv)
+    try:
+        if len(args.engine) != 2:
+            raise ValueError("give exactly two --engine options")
+        engines = [parse_engine(text, number) for number, text in enumerate(args.engine, 1)]
+        if engines[0]["name"] == engines[1]["name"]:
+            raise ValueError("the engines need different names")
+        base, increment = parse_time_control(args.tc) if args.tc else (None, 0.0)
+    except ValueError as error:
+        parser.error(str(error))
+    if base is None and args.movetime is None and engines[0]["depth"] == MAX_PLY and engines[1]["depth"] == MAX_PLY:
+        parser.error("give --tc, --movetime or a depth for both engines")
+    openings = read_openings(args.openings) if args.openings else [opening_fen(sans) for sans in OPENINGS]
+    settings = {"base": base, "increment": increment, "movetime": args.movetime, "max_plies": args.max_plies, "resign_score": args.resign_score,
+                "resign_moves": args.resign_moves, "draw_score": args.draw_score, "draw_moves": args.draw_moves, "draw_after": args.draw_after,
+                "tablebases": args.tablebases}
+    sprt = (args.elo0, args.elo1, args.alpha, args.beta) if args.sprt else None
+    time_control = args.tc or ("%g/move" % args.movetime if args.movetime else "-")
+    event = "%s vs %s" % (engines[0]["name"], engines[1]["name"])
+    output = open(args.pgn, "w") if args.pgn else None
+    start = time.perf_counter()
+    def on_game(record, match):
+        if output is not None:
+            write_games(output, [pgn_game(record, event, time_control)])
+            output.flush()
+        if not args.quiet:
+            stats = match_statistics(match.wins, match.draws, match.losses)
+            print("game %d %s-%s %s (%s)  +%d =%d -%d  Elo %+.1f +/- %.1f" % (record["index"] + 1, record["white"], record["black"], record["result"], record["reason"],
+                                                                           match.wins, match.draws, match.losses, stats["elo"], stats["error"]), file=sys.stderr)
+    def stop(match):
+        if sprt is None:
+            return False
+        lower, upper = sprt_bounds(args.alpha, args.beta)
+        llr = sprt_llr(match.wins, match.draws, match.losses, args.elo0, args.elo1)
+        return llr <= lower or llr >= upper
+    try:
+        match = run_match(engines, openings, args.games, settings, args.workers, on_game, stop)
+    finally:
+        if output is not None:
+            output.close()
+    report = match.summary(time.perf_counter() - start, sprt)
+    print("\n".join(summary_lines(report)))
+    if args.report:
+        with open(args.report, "w") as stream:
+            json.dump(report, stream, indent=1)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+This module defines the TranspositionTable class, a
+fixed-size store of what a search has learned about
+positions, looked up by their Zobrist key. For each
+position it keeps the depth that was searched, the
+score found, whether that score is exact or only a
+lower or upper bound, and the best move. The table
+is given a memory budget in megabytes when it is
+created and never grows past it: all its entries are
+allocated up front in two arrays of 64-bit numbers,
+one for the keys and one for the packed data, so
+memory stays flat however long the game or session.
+Entries are grouped in buckets of two. The first
+slot of a bucket keeps the deepest result, unless it
+was left by an older search, and the second slot is
+always overwritten by whatever does not go in the
+first. Calling new_search starts a new generation,
+which is how results from earlier searches age out.
+"""
+from array import array
+
+from rules import PROMOTION_PIECES
+
+# The kinds of score an entry can hold. EMPTY marks a slot
+# that has never been written.
+EMPTY = 0
+EXACT = 1
+LOWER_BOUND = 2
+UPPER_BOUND = 3
+
+# Each slot uses one 8-byte key and one 8-byte data word.
+SLOT_BYTES = 16
+SLOTS_PER_BUCKET = 2
+# How many bytes of the table clear zeroes at once.
+CLEAR_BYTES = 1 << 16
+# The data word holds, from the lowest bit up, the move in 15
+# bits, the score in 20 bits, the depth in 8 bits, the bound
+# in 2 bits and the generation in 8 bits.
+MOVE_BITS = 15
+SCORE_BITS = 20
+DEPTH_BITS = 8
+BOUND_BITS = 2
+GENERATION_BITS = 8
+SCORE_SHIFT = MOVE_BITS
+DEPTH_SHIFT = SCORE_SHIFT + SCORE_BITS
+BOUND_SHIFT = DEPTH_SHIFT + DEPTH_BITS
+GENERATION_SHIFT = BOUND_SHIFT + BOUND_BITS
+SCORE_OFFSET = 1 << (SCORE_BITS - 1)
+MAX_DEPTH = (1 << DEPTH_BITS) - 1
+
+"""
+These two functions turn a move tuple into a 15-bit number
+and back: six bits for the from square, six for the to
+square and three for the promotion piece. No move is 0.
+"""
+def encode_move(move):
+    if move is None:
+        return 0
+    from_row, from_col, to_row, to_col, promotion = move
+    code = (from_row * 8 + from_col) | ((to_row * 8 + to_col) << 6)
+    if promotion is not None:
+        code |= (PROMOTION_PIECES.index(promotion) + 1) << 12
+    return code
+
+def decode_move(code):
+    if code == 0:
+        return None
+    from_row, from_col = divmod(code & 63, 8)
+    to_row, to_col = divmod((code >> 6) & 63, 8)
+    promotion = code >> 12
+    if promotion:
+        return (from_row, from_col, to_row, to_col, PROMOTION_PIECES[promotion - 1])
+    return (from_row, from_col, to_row, to_col, None)
+
+"""
+This code defines the TranspositionTable class. Its
+constructor takes the memory budget in megabytes and
+allocates the largest power-of-two number of buckets that
+fits in it. The store method records a search result and
+probe looks one up, returning a tuple (depth, score, bound,
+move) or None. The hits, probes and stores counters and the
+hashfull method tell how well the table is being used.
+"""
+class TranspositionTable:
+    def __init__(self, size_mb=16):
+        buckets = max(1, int(size_mb * 1024 * 1024) // (SLOT_BYTES * SLOTS_PER_BUCKET))
+        self.bucket_count = 1 << (buckets.bit_length() - 1)
+        self.mask = self.bucket_count - 1
+        size = self.bucket_count * SLOTS_PER_BUCKET
+        self.keys = array("Q", bytes(8 * size))
+        self.data = array("Q", bytes(8 * size))
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    """
+    This method starts a new search. Entries written before
+    it are now older than any written after, and the depth
+    they hold no longer protects them from being replaced.
+    """
+    def new_search(self):
+        self.generation = (self.generation + 1) & ((1 << GENERATION_BITS) - 1)
+
+    """
+    This method empties the table without giving back its
+    memory or taking more: the arrays are zeroed in place, a
+    block of CLEAR_BYTES at a time.
+    """
+    def clear(self):
+        zeros = bytes(CLEAR_BYTES)
+        for values in (self.keys, self.data):
+            view = memoryview(values).cast("B")
+            for start in range(0, len(view), CLEAR_BYTES):
+                end = min(start + CLEAR_BYTES, len(view))
+                view[start:end] = zeros[:end - start]
+            view.release()
+        self.generation = 0
+
+    """
+    This method looks up the position with the given key. If
+    either slot of its bucket holds that key it returns a
+    tuple (depth, score, bound, move), and otherwise None.
+    """
+    def probe(self, key):
+        self.probes += 1
+        slot = (key & self.mask) * SLOTS_PER_BUCKET
+        for index in (slot, slot + 1):
+            if self.keys[index] == key:
+                data = self.data[index]
+                bound = (data >> BOUND_SHIFT) & 3
+                if bound == EMPTY:
+                    return None
+                self.hits += 1
+                return ((data >> DEPTH_SHIFT) & MAX_DEPTH,
+                        ((data >> SCORE_SHIFT) & ((1 << SCORE_BITS) - 1)) - SCORE_OFFSET,
+                        bound,
+                        decode_move(data & ((1 << MOVE_BITS) - 1)))
+        return None
+
+    """
+    This method records the result of searching the position
+    with the given key. The first slot of the bucket is used
+    if it is empty, already holds this position, was written
+    by an earlier search, or holds a result no deeper than
+    this one. Otherwise the second slot is overwritten. When
+    the position is already stored and no move is given, the
+    move stored before is kept.
+    """
+    def store(self, key, depth, score, bound, move):
+        self.stores += 1
+        slot = (key & self.mask) * SLOTS_PER_BUCKET
+        depth = min(max(depth, 0), MAX_DEPTH)
+        first = self.data[slot]
+        if (self.keys[slot] == key
+                or (first >> BOUND_SHIFT) & 3 == EMPTY
+                or (first >> GENERATION_SHIFT) != self.generation
+                or (first >> DEPTH_SHIFT) & MAX_DEPTH <= depth):
+            index = slot
+        else:
+            index = slot + 1
+        move_code = encode_move(move)
+        if move_code == 0 and self.keys[index] == key:
+            move_code = self.data[index] & ((1 << MOVE_BITS) - 1)
+        score = min(max(score, -SCORE_OFFSET), SCORE_OFFSET - 1)
+        self.keys[index] = key
+        self.data[index] = (move_code
+                            | ((score + SCORE_OFFSET) << SCORE_SHIFT)
+                            | (depth << DEPTH_SHIFT)
+                            | (bound << BOUND_SHIFT)
+                            | (self.generation << GENERATION_SHIFT))
+
+    """
+    This method estimates, in parts per thousand, how much of
+    the table holds entries from the current search by looking
+    at the first thousand slots.
+    """
+    def hashfull(self):
+        sample = min(1000, len(self.data))
+        used = 0
+        for index in range(sample):
+            data = self.data[index]
+            if (data >> BOUND_SHIFT) & 3 != EMPTY and (data >> GENERATION_SHIFT) == self.generation:
+                used += 1
+        return used * 1000 // sample